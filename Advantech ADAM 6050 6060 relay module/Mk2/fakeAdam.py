@@ -0,0 +1,211 @@
+'''A stand-in Advantech ADAM 6050 / 6060 (Modbus TCP) for exercising this recipe's pipelined transactions.'''
+
+# Runs under CPython (2.7 or 3), e.g.
+#
+#   python fakeAdam.py --port 5020 --delay 0.2 --drop 0.1 --fragment --toggle 2
+#
+# then point the node at it (the recipe always uses port 502, so either run this as root on 502 or
+# temporarily change 'TCP_PORT'). Supports read coils (1), read holding registers (3) and force single
+# coil (5) over 32 coils and 32 registers; anything else gets an 'illegal function' exception.
+#
+# To shake out the transaction handling:
+#   --delay     each response is held back for up to this many secs, so pipelined responses come back
+#               out of order
+#   --drop      this fraction of requests is never answered (the recipe should retry them on their own)
+#   --fragment  responses are written in random pieces, sometimes several in one write
+#   --toggle    an input coil (0 to 11) is flipped every this many secs
+
+import argparse
+import random
+import struct
+import threading
+import time
+
+try:
+  import socketserver
+except ImportError:
+  import SocketServer as socketserver
+
+COILS = 32
+REGISTERS = 32
+
+READ_COILS = 1
+READ_REGISTERS = 3
+FORCE_COIL = 5
+
+class Device:
+  def __init__(self):
+    self.coils = [False] * COILS
+    self.registers = [0] * REGISTERS
+    self.lock = threading.Lock()
+    self.stats = {'requests': 0, 'dropped': 0, 'exceptions': 0, 'writes': 0, 'most pending': 0}
+
+  def handle(self, func, data):
+    '''Returns the response PDU (function code onwards) for a request PDU'''
+    with self.lock:
+      if func == READ_COILS:
+        addr, count = struct.unpack('>HH', data[:4])
+        if addr + count > COILS:
+          return self.exception(func, 2)
+
+        packed = bytearray((count + 7) // 8)
+        for i in range(count):
+          if self.coils[addr + i]:
+            packed[i // 8] |= 1 << (i % 8)
+        return bytearray([func, len(packed)]) + packed
+
+      elif func == READ_REGISTERS:
+        addr, count = struct.unpack('>HH', data[:4])
+        if addr + count > REGISTERS:
+          return self.exception(func, 2)
+
+        return bytearray([func, count * 2]) + bytearray(struct.pack('>%sH' % count, *self.registers[addr:addr + count]))
+
+      elif func == FORCE_COIL:
+        addr, value = struct.unpack('>HH', data[:4])
+        if addr >= COILS:
+          return self.exception(func, 2)
+
+        self.coils[addr] = value == 0xff00
+        self.stats['writes'] += 1
+        print('coil %s %s' % (addr, 'on' if self.coils[addr] else 'off'))
+        return bytearray([func]) + data[:4] # (echoes the request)
+
+      else:
+        return self.exception(func, 1)
+
+  def exception(self, func, code):
+    self.stats['exceptions'] += 1
+    return bytearray([func | 0x80, code])
+
+  def toggle(self, interval):
+    while True:
+      time.sleep(interval)
+      with self.lock:
+        addr = random.randint(0, 11)
+        self.coils[addr] = not self.coils[addr]
+        self.registers[addr] = (self.registers[addr] + 1) & 0xffff
+
+class Handler(socketserver.BaseRequestHandler):
+  def handle(self):
+    print('connected %s:%s' % self.client_address)
+
+    server = self.server
+    device = server.device
+
+    self.sendLock = threading.Lock()
+    self.pending = []
+    self.pendingLock = threading.Lock()
+    self.pendingReady = threading.Condition(self.pendingLock)
+
+    writer = threading.Thread(target=self.writeResponses)
+    writer.daemon = True
+    writer.start()
+
+    buf = bytearray()
+    while True:
+      try:
+        data = self.request.recv(1024)
+      except (IOError, OSError):
+        break
+
+      if not data:
+        break
+
+      buf += bytearray(data)
+
+      # MBAP header: tid(2) protocol(2) length(2) unit(1), then the PDU
+      while len(buf) >= 7:
+        tid, protocol, length = struct.unpack('>HHH', bytes(buf[:6]))
+        if len(buf) < 6 + length:
+          break
+
+        unit = buf[6]
+        pdu = buf[7:6 + length]
+        del buf[:6 + length]
+
+        device.stats['requests'] += 1
+
+        if random.random() < server.drop:
+          device.stats['dropped'] += 1
+          continue
+
+        resp = device.handle(pdu[0], pdu[1:])
+        packet = bytearray(struct.pack('>HHHB', tid, protocol, len(resp) + 1, unit)) + resp
+
+        with self.pendingLock:
+          self.pending.append((time.time() + random.uniform(0, server.delay), packet))
+          device.stats['most pending'] = max(device.stats['most pending'], len(self.pending))
+          self.pendingReady.notify()
+
+    with self.pendingLock:
+      self.pending = None
+      self.pendingReady.notify()
+
+  def writeResponses(self):
+    # (responses go out as they fall due, not in the order they were requested)
+    while True:
+      with self.pendingLock:
+        while self.pending == []:
+          self.pendingReady.wait()
+
+        if self.pending == None:
+          return
+
+        now = time.time()
+        due = [p for p in self.pending if p[0] <= now]
+        self.pending = [p for p in self.pending if p[0] > now]
+
+      if len(due) > 0:
+        self.write(bytearray().join([packet for (at, packet) in sorted(due, key=lambda p: p[0])]))
+
+      time.sleep(0.005)
+
+  def write(self, data):
+    try:
+      if not self.server.fragment:
+        self.request.sendall(bytes(data))
+        return
+
+      while len(data) > 0:
+        n = random.randint(1, len(data))
+        self.request.sendall(bytes(data[:n]))
+        data = data[n:]
+        time.sleep(0.002)
+    except (IOError, OSError):
+      pass
+
+class Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+  allow_reuse_address = True
+  daemon_threads = True
+
+def main():
+  parser = argparse.ArgumentParser(description='Fake Advantech ADAM Modbus TCP device')
+  parser.add_argument('--port', type=int, default=502)
+  parser.add_argument('--delay', type=float, default=0, help='most secs a response is held back')
+  parser.add_argument('--drop', type=float, default=0, help='fraction of requests never answered')
+  parser.add_argument('--fragment', action='store_true', help='write responses in random pieces')
+  parser.add_argument('--toggle', type=float, default=0, help='secs between input coil flips (0 for none)')
+  args = parser.parse_args()
+
+  server = Server(('', args.port), Handler)
+  server.device = Device()
+  server.delay = args.delay
+  server.drop = args.drop
+  server.fragment = args.fragment
+
+  if args.toggle > 0:
+    thread = threading.Thread(target=server.device.toggle, args=(args.toggle,))
+    thread.daemon = True
+    thread.start()
+
+  print('Listening on TCP port %s' % args.port)
+
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    print(server.device.stats)
+    print('coils %s' % ''.join(['1' if c else '0' for c in server.device.coils]))
+
+if __name__ == '__main__':
+  main()
@@ -1,6 +1,12 @@
 '''Lightweight modbus control.'''
 
 # REVISION HISTORY
+# 16-Oct-2026
+#   Banks are merged into the fewest reads and polled adaptively (fast while changing, backing off while idle)
+#
+#   Pipelined transactions: several requests are kept in flight and matched by TID; timed out transactions
+#   are retried or failed individually instead of dropping the connection
+#
 # 21-Jan-2018 
 #   Support for read-only unsigned 16-bit MODBUS registers (use Custom)
 #
@@ -11,8 +17,12 @@
 
 TCP_PORT = 502
 
+from frameScanner import * # (for the length-delimited binary protocol)
+
 DEFAULT_BOUNCE = 1.2 # the default bounce time (1200 ms)
 
+DEFAULT_IDLE_POLL_GAP = 0.5 # (secs) the poll gap for inputs that have been idle for a while
+
 param_ipAddress = Parameter({ "title":"IP address", "order": next_seq(), "schema": { "type":"string" },
                               "desc": "The IP address of the unit."})
 
@@ -50,6 +60,12 @@ param_registerBanks = Parameter({ 'title': 'Custom register banks', 'order': nex
           'readOnly': {'type': 'boolean', 'title': '(RESERVED) Read-only? (only read-only for now)', 'order': next_seq()}
     } } } })
 
+param_idlePollGap = Parameter({'title': 'Idle poll gap (secs)', 'order': next_seq(), 'schema': {'type': 'number', 'hint': '%s' % DEFAULT_IDLE_POLL_GAP},
+                               'desc': 'Inputs are polled quickly while they are changing, backing off to this gap while they are idle.'})
+
+param_pollMergeGap = Parameter({'title': 'Poll merge gap', 'order': next_seq(), 'schema': {'type': 'integer', 'hint': '0'},
+                                'desc': 'Banks of the same kind are merged into single reads when their addresses are contiguous. Use this to also merge banks separated by up to this many unused addresses.'})
+
 local_event_SyncErrors = LocalEvent({'title': 'Sync errors', 'group': 'Status', 'schema': {'type': 'object', 'title': 'Details', 'properties': {
         'count': {'type': 'integer', 'title': 'Count', 'order': 1},
 		'last': {'type': 'string', 'title': 'Last occurrence', 'order': 2}
@@ -57,8 +73,8 @@ local_event_SyncErrors = LocalEvent({'title': 'Sync errors', 'group': 'Status',
 
 local_event_ShowLog = LocalEvent({'title': 'Show log', 'order': 9998, 'group': 'Debug', 'schema': {'type': 'boolean'}})
 
-# hold the list of poller functions
-pollers = list()
+# holds the planned poll ranges
+pollRanges = list()
 
 def main(arg = None):
   tcp.setDest('%s:%s'% (param_ipAddress, TCP_PORT))
@@ -80,6 +96,11 @@ def main(arg = None):
     
     for info in param_registerBanks or []:
       bindRegisterBank(info)
+      
+  pollRanges.extend(planPolls(pollBanks, param_pollMergeGap or 0))
+  
+  for r in pollRanges:
+    console.info('Polling %s %s to %s' % (r.kind, r.startAddr, r.end()-1))
     
 def bindCoilBank(info):
   startAddr = info['startAddr']
@@ -93,25 +114,12 @@ def bindCoilBank(info):
     (event, configEvent) = bindCoil(prefix, i+1, startAddr+i, readOnly)
     coilEvents.append((event, configEvent))
     
-  pollGap = 0.08 if readOnly else 2.0
-
-  def onBankResponse(seqNum, values):
+  def onBankValues(values):
     for (es, v) in zip(coilEvents, values):
       invert = safeGet(es[1].getArg(), 'invert', False)
       es[0].emitIfDifferent(v if not invert else not v)
     
-    call_safe(lambda: readBank(seqNum), pollGap)
-    
-  def readBank(seqNum):
-    # chain next call (instead of locked timer)
-    if seqNum != sequence[0]:
-      # stop this chain
-      print '(connection %s ended)' % seqNum
-      return
-    
-    modbus_readCoils(startAddr, count, lambda values: onBankResponse(seqNum, values))
-    
-  pollers.append(readBank)
+  addPollBank(COILS, startAddr, count, readOnly, onBankValues)
   
 def bindCoil(prefix, index, addr, readOnly):
   event = Event('%s %s State' % (prefix, index), {'group': '"%s" coils\' states' % prefix, 'order': next_seq(), 'schema': {'type': 'boolean'}})
@@ -174,24 +182,11 @@ def bindRegisterBank(info):
     (event, configEvent) = bindRegister(prefix, i+1, startAddr+i, readOnly)
     registerEvents.append((event, configEvent))
     
-  pollGap = 0.08 if readOnly else 2.0
-
-  def onRegisterResponse(seqNum, values):
+  def onBankValues(values):
     for (es, v) in zip(registerEvents, values):
       es[0].emitIfDifferent(v)
     
-    call_safe(lambda: readRegister(seqNum), pollGap)
-    
-  def readRegister(seqNum):
-    # chain next call (instead of locked timer)
-    if seqNum != sequence[0]:
-      # stop this chain
-      print '(connection %s ended)' % seqNum
-      return
-    
-    modbus_readRegisters(startAddr, count, lambda values: onRegisterResponse(seqNum, values))
-    
-  pollers.append(readRegister)
+  addPollBank(REGISTERS, startAddr, count, readOnly, onBankValues)
 
 def bindRegister(prefix, index, addr, readOnly):
   # 'readOnly' not used yet
@@ -208,6 +203,99 @@ def bindRegister(prefix, index, addr, readOnly):
   
   return (event, configEvent)
 
+# poll planning ----
+
+# Banks are not polled individually. Instead, banks of the same kind with contiguous (or overlapping) addresses are
+# merged into the fewest Modbus reads. Each read adapts its own rate: fast while its values are changing, backing off
+# towards the idle gap while they're not.
+
+COILS = 'coils'
+REGISTERS = 'registers'
+
+# the most a single read can cover (as per the Modbus spec)
+MAX_READ_COUNT = { COILS: 2000, REGISTERS: 125 }
+
+FAST_POLL_GAP = 0.08  # (secs) inputs that are changing
+OUTPUT_POLL_GAP = 2.0 # (secs) outputs only
+
+POLL_BACKOFF = 1.5
+
+# the banks as bound, i.e. (kind, startAddr, count, readOnly, onValues)
+pollBanks = list()
+
+class PollRange:
+  def __init__(self, kind, startAddr, count):
+    self.kind = kind
+    self.startAddr = startAddr
+    self.count = count
+    self.readOnly = False # has at least one read-only bank
+    self.banks = list() # e.g. [ (offset, count, onValues) ]
+    self.reset()
+    
+  def end(self):
+    return self.startAddr + self.count
+  
+  def add(self, startAddr, count, readOnly, onValues):
+    self.count = max(self.end(), startAddr + count) - self.startAddr
+    self.readOnly = self.readOnly or readOnly
+    self.banks.append((startAddr - self.startAddr, count, onValues))
+    
+  def minGap(self):
+    return FAST_POLL_GAP if self.readOnly else OUTPUT_POLL_GAP
+  
+  def maxGap(self):
+    return max(self.minGap(), param_idlePollGap or DEFAULT_IDLE_POLL_GAP) if self.readOnly else OUTPUT_POLL_GAP
+  
+  def reset(self):
+    self.lastValues = None
+    self.gap = FAST_POLL_GAP
+    
+  def poll(self, seqNum):
+    # chain next call (instead of locked timer)
+    if seqNum != sequence[0]:
+      # stop this chain
+      print '(connection %s ended)' % seqNum
+      return
+    
+    read = modbus_readCoils if self.kind == COILS else modbus_readRegisters
+    read(self.startAddr, self.count, lambda values: self.onValues(seqNum, values),
+         onFailure=lambda: self.next(seqNum))
+    
+  def onValues(self, seqNum, values):
+    for (offset, count, onValues) in self.banks:
+      onValues(values[offset:offset+count])
+      
+    if values != self.lastValues:
+      self.gap = self.minGap()
+    else:
+      self.gap = min(self.maxGap(), self.gap * POLL_BACKOFF)
+      
+    self.lastValues = values
+    
+    self.next(seqNum)
+    
+  def next(self, seqNum):
+    call_safe(lambda: self.poll(seqNum), self.gap)
+    
+def addPollBank(kind, startAddr, count, readOnly, onValues):
+  pollBanks.append((kind, startAddr, count, readOnly, onValues))
+  
+def planPolls(banks, mergeGap=0):
+  '''Merges the banks into the fewest reads. Banks whose addresses are within 'mergeGap' of each other are also
+     merged (the addresses in between are read and ignored).'''
+  ranges = list()
+  
+  current = None
+  for (kind, startAddr, count, readOnly, onValues) in sorted(banks, key=lambda bank: (bank[0], bank[1])):
+    if current == None or current.kind != kind or startAddr > current.end() + mergeGap \
+        or max(current.end(), startAddr + count) - current.startAddr > MAX_READ_COUNT[kind]:
+      current = PollRange(kind, startAddr, 0)
+      ranges.append(current)
+      
+    current.add(startAddr, count, readOnly, onValues)
+    
+  return ranges
+
 sequence = [0]
 
 def connected():
@@ -216,15 +304,16 @@ def connected():
   # don't let commands rush through
 
   tcp.clearQueue()
-  queue.clearQueue()
+  clearTransactions()
   
   # start all the poller
   seqNum = sequence[0]
   
   console.info('(new sequence %s)' % seqNum)
 
-  for f in pollers:
-    f(seqNum)
+  for r in pollRanges:
+    r.reset()
+    r.poll(seqNum)
   
 def received(data):
   lastReceive[0] = system_clock()
@@ -232,15 +321,7 @@ def received(data):
   if local_event_ShowLog.getArg():
     print 'RECV: [%s]' % data.encode('hex')
     
-  # ensure buffer doesn't blow out i.e. greater than a reasonable sized "massive" value
-  if len(recvBuffer) > 4096:
-    console.warn('The incoming buffer is too large which might indicate protocol corruption; dropping it')
-    del recvBuffer[:]
-
-  # extend the recv buffer
-  recvBuffer.extend(data)
-
-  processBuffer()    
+  scanner.feed(data)
   
 def sent(data):
   if local_event_ShowLog.getArg():
@@ -251,7 +332,7 @@ def disconnected():
   
   # reset sequence (which will stop pollers)
   tcp.clearQueue()
-  queue.clearQueue()
+  clearTransactions()
   
   newSeq = sequence[0] + 1
   sequence[0] = newSeq
@@ -268,70 +349,205 @@ tcp = TCP(connected=connected,
           sendDelimiters=None, 
           receiveDelimiters=None)
 
-def protocolTimeout():
-  console.log('MODBUS timeout; flushing buffers and dropping TCP connection for good measure')
-  tcp.drop()
-  queue.clearQueue()
-  del recvBuffer[:]
-
-# MODBUS using no delimeters within its binary protocol so must use a 
-# custom request queue
-queue = request_queue(timeout=protocolTimeout)
-
-# the full receive buffer
-recvBuffer = list()
+# MODBUS using no delimeters within its binary protocol so packets are framed by length (see 'MODBUS_TCP_FRAME')
+# and then matched to their transaction by TID
 
 # example response packet:
 # 00:93            00:00                00:05                 01:01:02:fd:0f
 # TID (2 bytes)    Protocol (2 bytes)   Length, n (2 bytes)   n bytes...
-def processBuffer():
-  while True:
-    bufferLen = len(recvBuffer)
-    if bufferLen < 6:
-      # not big enough yet, let it grow
-      return
+# (a Modbus TCP frame is at most 260 bytes)
+MODBUS_TCP_FRAME = FrameFormat(lengthOffset=4, lengthSize=2, lengthAdjust=6, minLength=8, maxLength=260)
+
+def handleDiscard(data, reason):
+  console.warn('Dropping %s received bytes (%s) which might indicate protocol corruption' % (len(data), reason))
+
+# (frames are matched to their transaction)
+scanner = FrameScanner(MODBUS_TCP_FRAME, lambda message: handleFrame(message), onDiscard=handleDiscard)
+
+# transactions ----
+
+# Requests are pipelined: up to MAX_IN_FLIGHT transactions are outstanding at once and responses are matched to
+# their transaction by TID. A transaction that times out is retried or failed on its own without disturbing the
+# TCP connection; the connection is only recycled if the device stops responding altogether.
+#
+# Writes to the same coil supersede each other: a newer write replaces one that hasn't gone out yet and a
+# timed out write isn't retried once there's a newer one for its coil (it could otherwise land after it).
+
+MAX_IN_FLIGHT = 4
+
+TRANSACTION_TIMEOUT = 1.5 # (secs)
+
+READ_RETRIES = 1 # (reads are polled again anyway)
+WRITE_RETRIES = 2
+
+# the number of failed transactions in a row before the connection is recycled
+MAX_CONSECUTIVE_FAILURES = 6
+
+UNIT_ID = 1
+
+class Transaction:
+  def __init__(self, modbus_func, data, count, onFuncResp, onFailure, retries, key):
+    self.modbus_func = modbus_func
+    self.data = data # the request data following the function code
+    self.count = count
+    self.onFuncResp = onFuncResp
+    self.onFailure = onFailure
+    self.retries = retries
+    self.key = key # (writes) the address written, e.g. ('coil', 16)
+    self.tid = None
+    self.sentAt = 0
+
+from collections import deque
+
+# transactions not sent yet
+waitingTransactions = deque()
+
+# the outstanding transactions by TID
+inFlight = {}
+
+# the latest write by address
+latestWrites = {}
+
+consecutiveFailures = [0]
+
+def modbus_request(modbus_func, data, count=0, onFuncResp=None, onFailure=None, retries=READ_RETRIES, urgent=False, key=None):
+  tx = Transaction(modbus_func, data, count, onFuncResp, onFailure, retries, key)
   
-    # got at least 6 bytes (fifth and sixth hold the length)
-    messageLen = toInt16(recvBuffer, 4)
+  if key != None:
+    latestWrites[key] = tx
+    
+    # (keeping its place)
+    for i, waiting in enumerate(waitingTransactions):
+      if waiting.key == key:
+        waitingTransactions[i] = tx
+        pumpTransactions()
+        return
+  
+  # (urgent ones, e.g. writes, jump ahead of any polling)
+  if urgent:
+    waitingTransactions.appendleft(tx)
+  else:
+    waitingTransactions.append(tx)
+    
+  pumpTransactions()
   
-    # work out expected length (incl. header)
-    fullLen = 2 + 2 + 2 + messageLen
+def pumpTransactions():
+  while len(inFlight) < MAX_IN_FLIGHT and len(waitingTransactions) > 0:
+    sendTransaction(waitingTransactions.popleft())
+    
+def sendTransaction(tx):
+  tid = next_seq() % 65536
+  while tid in inFlight:
+    tid = next_seq() % 65536
+    
+  tx.tid = tid
+  tx.sentAt = system_clock()
+  inFlight[tid] = tx
+  
+  #   tID2  protID2  length2  unit  modbus_func  data...
+  # (length covers the unit, function and data)
+  tcp.send('%s%s%s%s%s%s' % (formatInt16(tid), formatInt16(0), formatInt16(2 + len(tx.data)),
+                             chr(UNIT_ID), chr(tx.modbus_func), tx.data))
+  
+def handleFrame(message):
+  tID = toInt16(message, 0)
+  
+  tx = inFlight.pop(tID, None)
+  if tx == None:
+    # most likely a late response to a transaction that has already timed out
+    handleUnknownTID(tID)
+    return
+  
+  consecutiveFailures[0] = 0
+  
+  if tx.key != None and latestWrites.get(tx.key) == tx:
+    del latestWrites[tx.key]
   
-    # check if we've got at least one full packet
-    if bufferLen >= fullLen:
-      # grab that packet from the buffer
-      message = ''.join(recvBuffer[:fullLen])
-      del recvBuffer[:fullLen]
+  handleModbusResponse(message, tx)
+  
+  pumpTransactions()
+  
+def checkTransactions():
+  if len(inFlight) == 0:
+    return
+  
+  now = system_clock()
+  
+  for tx in [tx for tx in inFlight.values() if now - tx.sentAt > TRANSACTION_TIMEOUT*1000]:
+    # (a failure can drop the connection, clearing what's in flight along the way)
+    if inFlight.pop(tx.tid, None) == None:
+      continue
+    
+    if tx.key != None and latestWrites.get(tx.key) != tx:
+      # superseded by a newer write to the same address
+      if local_event_ShowLog.getArg():
+        console.log('Transaction tid:%s func:%s timed out; superseded' % (tx.tid, tx.modbus_func))
+        
+      continue
+    
+    if tx.retries > 0:
+      tx.retries -= 1
       
-      # and 'push' it back through the request queue handler
-      queue.handle(message)
+      if local_event_ShowLog.getArg():
+        console.log('Transaction tid:%s func:%s timed out; retrying' % (tx.tid, tx.modbus_func))
       
-      # might be more, so continue...
+      waitingTransactions.appendleft(tx)
       
     else:
-      return
+      failTransaction(tx, 'timed out')
+      
+  pumpTransactions()
+  
+def failTransaction(tx, reason):
+  if local_event_ShowLog.getArg():
+    console.log('Transaction tid:%s func:%s failed (%s)' % (tx.tid, tx.modbus_func, reason))
+    
+  consecutiveFailures[0] += 1
+  
+  if consecutiveFailures[0] >= MAX_CONSECUTIVE_FAILURES:
+    console.warn('MODBUS device has not responded to the last %s transactions; dropping TCP connection' % consecutiveFailures[0])
+    tcp.drop()
+    clearTransactions()
+    return
+  
+  if tx.onFailure:
+    tx.onFailure()
+    
+def clearTransactions():
+  waitingTransactions.clear()
+  inFlight.clear()
+  latestWrites.clear()
+  consecutiveFailures[0] = 0
+  scanner.clear()
+  
+timer_checkTransactions = Timer(checkTransactions, 0.25)
 
 # modbus ----
 READ_COILS = 1
 READ_REGISTERS = 3
 FORCE_COIL = 5
 
-def handleModbusResponse(resp, expTid, count=0, onFuncResp=None):
+EXCEPTION_FLAG = 0x80
+
+def handleModbusResponse(resp, tx):
   # Response example
   # (raw buffer): 0093 0000 0005 01 01 02 fd0f
   tID = toInt16(resp, 0)
-  if tID != expTid:
-    handleTIDMismatch(tID, expTid)
-    return
-
   protID = toInt16(resp, 2)
   length = toInt16(resp, 4)
     
   unit = ord(resp[6])
   modbus_func = ord(resp[7])
-  byteCount = ord(resp[8])
   
-  if modbus_func == READ_COILS:
+  count = tx.count
+  onFuncResp = tx.onFuncResp
+  
+  if modbus_func & EXCEPTION_FLAG:
+    # e.g. 0093 0000 0003 01 81 02
+    failTransaction(tx, 'exception code %s' % ord(resp[8]))
+  
+  elif modbus_func == READ_COILS:
+    byteCount = ord(resp[8])
     bits = list()
     
     for i in range(byteCount):
@@ -348,8 +564,7 @@ def handleModbusResponse(resp, expTid, count=0, onFuncResp=None):
       # return boolean array
       onFuncResp(bits)
 
-
-  if modbus_func == READ_REGISTERS:
+  elif modbus_func == READ_REGISTERS:
     registers = list()
 
     # go through the 2-byte registers which
@@ -364,7 +579,6 @@ def handleModbusResponse(resp, expTid, count=0, onFuncResp=None):
       # return boolean array
       onFuncResp(registers)
 
-
   elif modbus_func == FORCE_COIL:
     # e.g. 0001 0000 0006 01 05 0010 ff00
     
@@ -376,16 +590,11 @@ def handleModbusResponse(resp, expTid, count=0, onFuncResp=None):
       onFuncResp(state)
 
 
-def modbus_readCoils(startAddr=0, count=12, onFuncResp=None):
+def modbus_readCoils(startAddr=0, count=12, onFuncResp=None, onFailure=None):
   # Request example:
   #      \x00\x93  \x00\x00  \x00\x06  \x01  \x01         \x00\x00     \x00\x0c                                      
   #      tID2      protID2   length2   unit  modbus_func  start_addr2  count
-  (tid, protID, length, unitID, modbus_func) = (next_seq() % 65536, 0, 6, 1, READ_COILS)
-  
-  req = '%s%s%s%s%s%s%s' % (formatInt16(tid), formatInt16(protID), formatInt16(length),
-                            chr(unitID), chr(modbus_func), formatInt16(startAddr), formatInt16(count))
-  
-  queue.request(lambda: tcp.send(req), lambda resp: handleModbusResponse(resp, tid, count, onFuncResp=onFuncResp))
+  modbus_request(READ_COILS, '%s%s' % (formatInt16(startAddr), formatInt16(count)), count, onFuncResp, onFailure)
   
 Action('ReadCoils', lambda arg: modbus_readCoils(arg['startAddr'], arg['count']), 
        metadata={'group': 'Modbus', 'order': next_seq()+9000, 'schema': {'type': 'object', 'title': 'Params', 'properties': {
@@ -393,16 +602,11 @@ Action('ReadCoils', lambda arg: modbus_readCoils(arg['startAddr'], arg['count'])
         'count': {'type': 'integer', 'title': 'Count', 'order': 2}}}})
 
 
-def modbus_readRegisters(startAddr=0, count=12, onFuncResp=None):
+def modbus_readRegisters(startAddr=0, count=12, onFuncResp=None, onFailure=None):
   # Request example (read 3 registers, from address 00:6B)
   #      \x00\x93  \x00\x00  \x00\x06  \x01  \x03         \x00\x6b     \x00\x03
   #      tID2      protID2   length2   unit  modbus_func  start_addr2  count
-  (tid, protID, length, unitID, modbus_func) = (next_seq() % 65536, 0, 6, 1, READ_REGISTERS)
-  
-  req = '%s%s%s%s%s%s%s' % (formatInt16(tid), formatInt16(protID), formatInt16(length),
-                            chr(unitID), chr(modbus_func), formatInt16(startAddr), formatInt16(count))
-  
-  queue.request(lambda: tcp.send(req), lambda resp: handleModbusResponse(resp, tid, count, onFuncResp=onFuncResp))
+  modbus_request(READ_REGISTERS, '%s%s' % (formatInt16(startAddr), formatInt16(count)), count, onFuncResp, onFailure)
 
 Action('ReadRegisters', lambda arg: modbus_readRegisters(arg['startAddr'], arg['count']), 
        metadata={'group': 'Modbus', 'order': next_seq()+9000, 'schema': {'type': 'object', 'title': 'Params', 'properties': {
@@ -412,17 +616,13 @@ Action('ReadRegisters', lambda arg: modbus_readRegisters(arg['startAddr'], arg['
 def modbus_writeCoil(addr, state, onFuncResp=None):
   # e.g 00 01     00 00     00 06     01    05           00 10     ff 00
   #     tID2      protID2   length2   unit  modbus_func  addr      state
-  (tid, protID, length, unitID, modbus_func) = (next_seq() % 65536, 0, 6, 1, FORCE_COIL)
-  
   if state == True:
     value = '\xff\x00'
   else:
     value = '\x00\x00'
   
-  req = '%s%s%s%s%s%s%s' % (formatInt16(tid), formatInt16(protID), formatInt16(length),
-                            chr(unitID), chr(modbus_func), formatInt16(addr), value)
-  
-  queue.request(lambda: tcp.send(req), lambda resp: handleModbusResponse(resp, tid, onFuncResp=onFuncResp))
+  # (forcing a coil is idempotent so is safe to retry)
+  modbus_request(FORCE_COIL, '%s%s' % (formatInt16(addr), value), onFuncResp=onFuncResp, retries=WRITE_RETRIES, urgent=True, key=('coil', addr))
 
 Action('WriteCoil', lambda arg: modbus_writeCoil(arg['addr'], arg['state']), 
        metadata={'group': 'Modbus', 'order': next_seq()+9000, 'schema': {'type': 'object', 'title': 'Params', 'properties': {
@@ -430,15 +630,13 @@ Action('WriteCoil', lambda arg: modbus_writeCoil(arg['addr'], arg['state']),
         'state': {'type': 'boolean', 'title': 'State', 'order': 2}}}})           
 
 
-def handleTIDMismatch(tid, expTID):
-  console.warn('Mismatched TID (modbus seqnum) detected; dropping connection and resyncing... tid=%s, expected=%s' % (tid, expTID))
+def handleUnknownTID(tid):
+  console.warn('Response with unknown TID (modbus seqnum) ignored; tid=%s' % tid)
   
   arg = local_event_SyncErrors.getArg() or {'count': 0}
   arg['count'] = int(arg.get('count') or 0) + 1
   arg['last'] = str(date_now())
   local_event_SyncErrors.emit(arg)
-                                     
-  tcp.drop()
 		
 # convenience functions ----
 
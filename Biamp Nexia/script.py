@@ -119,11 +119,11 @@ def initBoolValue(controlType, cmd, label, dev, inst, index1, index2=None):
   # some cmds take in index1 and index2
   index = index1 if index2 == None else '%s %s' % (index1, index2)
     
-  getter = Action('Get ' + name, lambda arg: tcp.request('GET %s %s %s %s\n' % (dev, cmd, inst, index), 
+  getter = Action('Get ' + name, lambda arg: request('GET %s %s %s %s' % (dev, cmd, inst, index), 
                           lambda resp: parseResp(resp, lambda arg: signal.emit(arg == '1'))),
                  {'title': 'Get', 'group': group, 'order': next_seq()})
   
-  setter = Action(name, lambda arg: tcp.request('SET %s %s %s %s %s\n' % (dev, cmd, inst, index, '1' if arg == True else '0'), 
+  setter = Action(name, lambda arg: request('SET %s %s %s %s %s' % (dev, cmd, inst, index, '1' if arg == True else '0'), 
                           lambda resp: parseResp(resp, 
                             lambda result: signal.emit(arg))), # NOTE: uses the original 'arg' here
                   {'title': title, 'group': group, 'order': next_seq(), 'schema': schema})
@@ -152,11 +152,11 @@ def initNumberValue(controlType, cmd, label, dev, inst, index1, isInteger=False,
   # some cmds take in index1 and index2
   index = index1 if index2 == None else '%s %s' % (index1, index2)
     
-  getter = Action('Get ' + name, lambda arg: tcp.request('GET %s %s %s %s\n' % (dev, cmd, inst, index), 
+  getter = Action('Get ' + name, lambda arg: request('GET %s %s %s %s' % (dev, cmd, inst, index), 
                           lambda resp: parseResp(resp, lambda arg: signal.emit(int(float(arg)) if isInteger else float(arg)))),
                  {'title': 'Get', 'group': group, 'order': next_seq()})
   
-  setter = Action(name, lambda arg: tcp.request('SET %s %s %s %s %s\n' % (dev, cmd, inst, index, arg), 
+  setter = Action(name, lambda arg: request('SET %s %s %s %s %s' % (dev, cmd, inst, index, arg), 
                           lambda resp: parseResp(resp, 
                             lambda result: signal.emit(arg))), # NOTE: uses the original 'arg' here
                   {'title': title, 'group': group, 'order': next_seq(), 'schema': schema})
@@ -176,12 +176,12 @@ def initSourceSelect(label, dev, inst, sourceCount):
   
   signal = Event(name, {'title': title, 'group': group, 'order': next_seq(), 'schema': {'type': 'integer'}})
   
-  getter = Action('Get ' + name, lambda arg: tcp.request('GET %s SRCSELSRC %s 1\n' % (dev, inst), 
+  getter = Action('Get ' + name, lambda arg: request('GET %s SRCSELSRC %s 1' % (dev, inst), 
                           lambda resp: parseResp(resp, lambda result: signal.emit(int(result)))),
                  {'title': 'Get', 'group': group, 'order': next_seq()})
   
   # safe to use title here remembering within brackets is extraneous
-  setter = Action(name, lambda arg: tcp.request('SET %s SRCSELSRC %s 1 %s\n' % (dev, inst, int(arg)), 
+  setter = Action(name, lambda arg: request('SET %s SRCSELSRC %s 1 %s' % (dev, inst, int(arg)), 
                           lambda resp: parseResp(resp, 
                             lambda result: signal.emit(int(arg)))), # NOTE: uses the original 'arg' here
                   {'title': title, 'group': group, 'schema': {'type': 'integer'}})
@@ -195,6 +195,26 @@ def bindMeterBlocks():
     initMeters(info['type'], info['label'], getOrDefault(info.get('device'), DEFAULT_DEVICE), 
                      info['instance'], info['index'])
     
+  if len(meters) > 0:
+    Timer(pollMeters, METER_INTERVAL, random(10,15))
+    Timer(reportMeterRate, METER_RATE_PERIOD)
+    
+# Meters are read as a group: each cycle queues every meter's request (at a lower priority than control
+# requests) and the next cycle only starts once the previous one has been answered, so the effective refresh
+# rate slows down gracefully rather than requests piling up.
+
+METER_INTERVAL = 0.4 # (secs) the fastest cycle
+
+METER_RATE_PERIOD = 5 # (secs)
+
+# the meter (request line, result handler) pairs
+meters = list()
+
+# the number of outstanding meter requests of the current cycle and cycles completed recently
+meterCycle = { 'outstanding': 0, 'completed': 0 }
+
+local_event_MeterRefreshRate = LocalEvent({'title': 'Meter refresh rate (Hz)', 'group': 'Meters', 'order': next_seq(), 'schema': {'type': 'number'}})
+    
 def initMeters(meterType, label, dev, inst, index):
   name = '%s Meter %sx%sx%s' % (meterType, dev, inst, index)
   title = '%s ("%s")' % (name, label)
@@ -220,11 +240,32 @@ def initMeters(meterType, label, dev, inst, index):
     else:
       signal.emit(float(result))
   
-  def poll():
-    tcp.request('GET %s %s %s %s\n' % (dev, cmd, inst, index), 
-                lambda resp: parseResp(resp, handleResult))
+  meters.append(('GET %s %s %s %s' % (dev, cmd, inst, index), handleResult))
+  
+def pollMeters():
+  if meterCycle['outstanding'] > 0:
+    # previous cycle still being answered
+    return
+  
+  meterCycle['outstanding'] = len(meters)
   
-  Timer(poll, 0.4, random(10,15))
+  # (queued all at once so they go out back-to-back)
+  for line, handleResult in meters:
+    meterRequests.append((line, lambda resp, handleResult=handleResult: handleMeterResp(resp, handleResult)))
+    
+  pumpRequests()
+    
+def handleMeterResp(resp, handleResult):
+  parseResp(resp, handleResult)
+  
+  meterCycle['outstanding'] -= 1
+  
+  if meterCycle['outstanding'] == 0:
+    meterCycle['completed'] += 1
+    
+def reportMeterRate():
+  local_event_MeterRefreshRate.emit(round(float(meterCycle['completed']) / METER_RATE_PERIOD, 2))
+  meterCycle['completed'] = 0
     
   
 # FDRLVL
@@ -235,6 +276,86 @@ def initMeters(meterType, label, dev, inst, index):
 # --- protocol>
 
  
+# <request pipeline ---
+
+# Requests are pipelined: several lines are sent back-to-back and the Nexia responds to each in order, so
+# responses are matched first-in-first-out. Control requests always go ahead of meter requests.
+
+MAX_IN_FLIGHT = 8 # (bounds how long a control request can wait behind meter requests)
+
+RESPONSE_TIMEOUT = 5 # (secs)
+
+from collections import deque
+
+controlRequests = deque() # e.g. [ ('GET 1 FDRLVL 3 1', onResp) ]
+meterRequests = deque()
+
+# the requests sent and waiting for a response, with when they were sent
+inFlight = deque() # e.g. [ ('GET 1 FDRLVL 3 1', onResp, 1500000000000) ]
+
+def request(line, onResp):
+  controlRequests.append((line, onResp))
+  
+  pumpRequests()
+  
+def pumpRequests():
+  lines = list()
+  
+  while len(inFlight) < MAX_IN_FLIGHT:
+    if len(controlRequests) > 0:
+      line, onResp = controlRequests.popleft()
+    elif len(meterRequests) > 0:
+      line, onResp = meterRequests.popleft()
+    else:
+      break
+    
+    inFlight.append((line, onResp, system_clock()))
+    lines.append(line + '\n')
+  
+  # (sent together)
+  if len(lines) > 0:
+    tcp.send(''.join(lines))
+    
+def isResponse(data):
+  if data == '+OK' or data.startswith('-ERR'):
+    return True
+  
+  try:
+    float(data)
+    return True
+  except ValueError:
+    # e.g. banners and telnet negotiation
+    return False
+
+def handleResponse(data):
+  if len(inFlight) == 0:
+    log(1, 'unexpected response [%s]' % data)
+    return
+  
+  line, onResp, sentAt = inFlight.popleft()
+  
+  onResp(data)
+  
+  pumpRequests()
+  
+def checkRequests():
+  if len(inFlight) > 0 and system_clock() - inFlight[0][2] > RESPONSE_TIMEOUT*1000:
+    console.warn('No response to [%s]; dropping connection to resync' % inFlight[0][0])
+    clearRequests()
+    tcp.drop()
+    
+def clearRequests():
+  controlRequests.clear()
+  meterRequests.clear()
+  inFlight.clear()
+  
+  # (any meter cycle underway is abandoned)
+  meterCycle['outstanding'] = 0
+  
+timer_checkRequests = Timer(checkRequests, 1)
+
+# --- request pipeline>
+
 # <tcp ---
   
 TELNET_ECHO_OFF = '\xFF\xFE\x01'  
@@ -242,6 +363,7 @@ TELNET_ECHO_OFF = '\xFF\xFE\x01'
 def tcp_connected():
   console.info('tcp_connected')
   tcp.clearQueue()
+  clearRequests()
   
 def tcp_received(data):
   log(3, 'tcp_recv [%s]' % data)
@@ -254,11 +376,15 @@ def tcp_received(data):
     tcp.send(TELNET_ECHO_OFF)
     return
   
+  if isResponse(data):
+    handleResponse(data)
+  
 def tcp_sent(data):
   log(3, 'tcp_sent [%s]' % data)
   
 def tcp_disconnected():
   console.warn('tcp_disconnected')
+  clearRequests()
   
 def tcp_timeout():
   console.warn('tcp_timeout')
@@ -17,6 +17,8 @@ param_signalTypes = Parameter({'title': 'Signal types', 'schema': {'type': 'arra
         'nonactiveState': {'type': 'string', 'order': 3}
     }}}})
 
+param_eventDrivenTransitions = Parameter({'title': 'Event-driven transitions', 'desc': 'Processes bookings exactly at their start and end boundaries; the half-minute poll then only re-syncs if a boundary was somehow missed', 'schema': {'type': 'boolean'}})
+
 param_scheduleSources = Parameter({'title': 'Schedule sources', 'schema': {'type': 'array', 'items': {'type': 'object', 'properties': {
         'name': {'type': 'string', 'order': 1},
         'defaultMember': {'type': 'string', 'order': 2},
@@ -51,34 +53,30 @@ local_event_Debug = LocalEvent({'title': 'Debug level', 'group': 'Debug', 'schem
 # signal types by name
 signalTypes = {}
 
-# last trees by signal name
-lastTrees = {}
+# persistent state trees by signal name
+stateTrees = {}
 
 # members by member name
 members = {}
 
-# The trees holds the data-structure to help with state propagation:
+# (the last propagated states are persisted so a restart does not force a full re-propagation)
+local_event_LastStates = LocalEvent({'title': 'Last propagated states', 'group': '(advanced)', 'schema': {'type': 'object'}})
+
+# The hierarchy is built once and holds cached child, descendant and ancestor indexes
+# (members can appear more than once so it is really a graph):
+#
+# e.g. children:    { 'M': ['X', 'Y'], 'X': ['A', 'B', 'C'], ... }
+#      descendants: { 'M': ['M', 'X', 'Y', 'A', 'B', 'C', ...], ... }   (includes itself)
+#      ancestors:   { 'A': set(['X', 'M']), ... }                        (excludes itself)
 #
-# e.g. {
-#        'M':
-#          { 'state': 'On', 
-#            'locked': True,
-#            'members': [ #REF_TO_X, #REF_TO_Y ] 
-#          },
+# Each signal type has a persistent state tree (really just the last propagated state by member name)
+# and the state list it was last evaluated against. The state of a member is:
 #
-#        'X':
-#          { 'state': 'On',
-#            'locked': False,
-#            'members': [ #REF_TO_A, #REF_TO_B, #REF_TO_C ]
-#          }
+#  - the state of the FIRST entry that names it directly (it is then 'locked') otherwise
+#  - the state of the LAST entry that names any of its ancestors otherwise
+#  - None (unaffected)
 #
-#        'A':
-#          { ... 
-#          }
-#       .
-#       .
-#       .
-#      }
+# so only the members below entries that have changed need to be re-evaluated.
 
 # 'states' e.g.:
 #
@@ -89,121 +87,227 @@ members = {}
 # States with warnings will be skipped
 
 def applyStateList(states, force=False):
-  stateTrees = {}
+  # group the entries by signal type, preserving order
+  entriesBySignal = {}
   
-  def lockAndTraverse(state, member, traverseOnly=False):
-    # set the state if not locked
-    if not member['locked']:
-      member['state'] = state
-      
-    # lock if not only traversing
-    if not traverseOnly:
-      member['locked'] = True
-    
-    for subMember in member['members']:
-      # only traverse from here
-      lockAndTraverse(state, subMember, True)
-      
-  # create a tree for each signal type
   for signalType in param_signalTypes:
-    signalName = signalType['name']
-    stateTrees[signalName] = createNewTree()
+    entriesBySignal[signalType['name']] = list()
       
-  # for each state entry, traverse its branch (on its signal tree)
   for stateInfo in states:
     # skip those with warnings
     if not isBlank(stateInfo.get('warning')):
       continue
 
-    memberName = stateInfo['member']
-    signal = stateInfo['signal']
-    state = stateInfo['state']
+    entriesBySignal[stateInfo['signal']].append((stateInfo['member'], stateInfo['state']))
     
-    member = stateTrees[signal][memberName]
-      
-    lockAndTraverse(state, member)
+  changed = False
     
   for signalType in param_signalTypes:
     signalName = signalType['name']
     
     stateTree = stateTrees[signalName]
     
-    # DEBUG: dump the all the trees
-    dumpTree(stateTree)
-    
-    # state tree is ready, now go through all affected members and call the actions
-    # taking into account what their previous state information was
-  
-    for name in stateTree:
-      memberInfo = stateTree[name]
-      state = memberInfo['state']
-    
-      reverting = False
-      
-      lastState = lastTrees[signalName][name]['state']
-      
-      if not force and state == lastState:
-        continue
-      
-      # skip if member is unaffected and last state was also none, otherwise use default inactive state
-      if state == None:
-        if lastState == None:
-          print ('Skipping "%s"' % name)
-          continue
-          
-        else:
-          state = signalType['nonactiveState']
-          reverting = True
-      
+    # go through the minimal list of changes and call the actions
+    for name, state, reverting, isEdge in stateTree.update(entriesBySignal[signalName], force):
       # if member is an edge, propagation is safe, otherwise request no propagation
     
       actionName = '%s Propagate %s' % (name, signalName)
-      arg = {'state': state, 'noPropagate': not memberInfo['isEdge']}
+      arg = {'state': state, 'noPropagate': not isEdge}
       
       print '%s... "%s": %s' % ('Reverting' if reverting else 'Forcing', actionName, arg)
 
       lookup_remote_action(actionName).call(arg)
       
       lookup_local_event('%s %s' % (name, signalName)).emit(state)
-    
-    lastTrees[signalName] = stateTree
+      
+      changed = True
+      
+    # DEBUG: dump the all the trees
+    dumpTree(stateTree)
+      
+  if changed:
+    persistStateTrees()
       
 def dumpTree(tree):
   if local_event_Debug.getArg() > 0:
-    for name in tree:
-      value = tree[name]
-      print '[%s]: state:[%s] locked:[%s]' % (name, value['state'], value['locked'])
+    for name in tree.hierarchy.names:
+      print '[%s]: state:[%s]' % (name, tree.states.get(name))
+      
+def persistStateTrees():
+  lastStates = {}
   
-def createNewTree():
-  stateTree = {}
+  for signalName in stateTrees:
+    lastStates[signalName] = stateTrees[signalName].persistable()
+    
+  local_event_LastStates.emit(lastStates)
+
+class MemberHierarchy:
+  '''The member hierarchy with cached indexes'''
   
-  def traverse(memberInfo):
+  def __init__(self, rootInfos):
+    self.names = list()  # in traversal order
+    self.children = {}
+    self.isEdge = {}
+    
+    for memberInfo in rootInfos:
+      self._traverse(memberInfo)
+      
+    self._descendants = {}
+    self.ancestors = {}
+    
+    for name in self.names:
+      for descendant in self.descendants(name):
+        if descendant != name:
+          self.ancestors.setdefault(descendant, set()).add(name)
+    
+  def _traverse(self, memberInfo):
     name = memberInfo['name']
     
-    if name not in stateTree:
-      member = { 'state': None,
-                 'locked': False,
-                 'isEdge': False,
-                 'members': [] }
-      stateTree[name] = member
-    else:
-      member = stateTree[name]
+    if name not in self.children:
+      self.names.append(name)
+      self.children[name] = list()
+      self.isEdge[name] = False
       
-    if safeLen(memberInfo['members']) == 0:
-      member['isEdge'] = True
+    if safeLen(memberInfo.get('members')) == 0:
+      self.isEdge[name] = True
       
     else:
       for subMemberInfo in memberInfo['members']:
-        traverse(subMemberInfo)
+        self._traverse(subMemberInfo)
+        
+        self.children[name].append(subMemberInfo['name'])
+        
+  def descendants(self, name):
+    '''The member itself and everything below it (cached)'''
+    result = self._descendants.get(name)
+    
+    if result == None:
+      result = list()
+      seen = set()
+      pending = [name]
       
-        # set the member references
-        member['members'].append(stateTree[subMemberInfo['name']])
+      while len(pending) > 0:
+        current = pending.pop(0)
+        if current in seen:
+          continue
+        
+        seen.add(current)
+        result.append(current)
+        pending.extend(self.children.get(current) or [])
+        
+      self._descendants[name] = result
+      
+    return result
   
-  # traverse the roots
-  for memberInfo in param_members:
-    traverse(memberInfo)
+class StateTree:
+  '''The persistent state tree of one signal type'''
+  
+  def __init__(self, signalType, hierarchy, lastStates):
+    self.signalType = signalType
+    self.hierarchy = hierarchy
+    
+    # the last propagated state by member name (None when unaffected)
+    self.states = {}
+    for name in hierarchy.names:
+      self.states[name] = (lastStates or {}).get(name)
+    
+    # the entries last evaluated, None if never
+    self._entries = None
+    
+  def update(self, entries, force=False):
+    '''Re-evaluates against a new entry list, returning the changes as (name, state, reverting, isEdge)'''
+    hierarchy = self.hierarchy
+    
+    if force or self._entries == None:
+      affected = hierarchy.names
+    else:
+      affected = self._affected(self._entries, entries)
+      
+    self._entries = entries
+    
+    if len(affected) == 0:
+      return []
+    
+    # index the entries
+    firstDirect = {}
+    lastIndex = {}
+    for i, (name, state) in enumerate(entries):
+      if name not in firstDirect:
+        firstDirect[name] = state
+        
+      lastIndex[name] = (i, state)
+      
+    changes = list()
+    
+    for name in affected:
+      if name in firstDirect:
+        state = firstDirect[name]
+        
+      else:
+        best = None
+        for ancestor in hierarchy.ancestors.get(name) or []:
+          candidate = lastIndex.get(ancestor)
+          if candidate != None and (best == None or candidate[0] > best[0]):
+            best = candidate
+            
+        state = best[1] if best != None else None
+    
+      lastState = self.states.get(name)
+      
+      if not force and state == lastState:
+        continue
+      
+      self.states[name] = state
+      
+      # skip if member is unaffected and last state was also none, otherwise use default inactive state
+      if state == None:
+        if lastState == None:
+          print ('Skipping "%s"' % name)
+          continue
+        
+        changes.append((name, self.signalType['nonactiveState'], True, hierarchy.isEdge[name]))
+        
+      else:
+        changes.append((name, state, False, hierarchy.isEdge[name]))
+        
+    return changes
+  
+  def _affected(self, oldEntries, newEntries):
+    '''The members below the entries that have changed (in traversal order)'''
+    if oldEntries == newEntries:
+      return []
     
-  return stateTree
+    oldByMember = {}
+    for name, state in oldEntries:
+      oldByMember.setdefault(name, list()).append(state)
+
+    newByMember = {}
+    for name, state in newEntries:
+      newByMember.setdefault(name, list()).append(state)
+      
+    changedMembers = set([name for name in set(oldByMember) | set(newByMember) if oldByMember.get(name) != newByMember.get(name)])
+    
+    # if the unchanged entries were re-ordered amongst themselves, "last one wins" may be different
+    if [entry for entry in oldEntries if entry[0] not in changedMembers] != [entry for entry in newEntries if entry[0] not in changedMembers]:
+      return self.hierarchy.names
+    
+    affected = set()
+    for name in changedMembers:
+      if name in self.hierarchy.children:
+        affected.update(self.hierarchy.descendants(name))
+      
+    return [name for name in self.hierarchy.names if name in affected]
+  
+  def persistable(self):
+    result = {}
+    
+    for name in self.states:
+      state = self.states[name]
+      if state != None:
+        result[name] = state
+        
+    return result
+
 
 def main():
   # set up the schedule sources
@@ -213,6 +317,9 @@ def main():
 
   for scheduleSource in param_scheduleSources:
     initScheduleSource(scheduleSource)
+    
+    # index whatever was last received (persisted)
+    indexScheduleSource(scheduleSource, lookup_local_event('Source %s Items' % scheduleSource['name']).getArg())
 
   if isEmpty(param_members):
     console.warn('No members have been configured; nothing to do.')
@@ -229,17 +336,24 @@ def main():
   for memberInfo in param_members:
     initMember(memberInfo)
     
-  # TODO: ideally unpersist this data but not a big deal if done outside of booking windows
+  # initialise the state trees (seeding with the last propagated states)
+  hierarchy = MemberHierarchy(param_members)
+  
+  lastStates = local_event_LastStates.getArg() or {}
   
-  # initialise last trees
-  # create a tree for each signal type
   for signalType in param_signalTypes:
     signalName = signalType['name']
-    lastTrees[signalName] = createNewTree()
+    stateTrees[signalName] = StateTree(signalType, hierarchy, lastStates.get(signalName))
     
   delay = quantisePollNow()
   
-  console.info('Scheduler started! (polling on half-minute boundaries first one in %.1f seconds)' % delay)
+  if param_eventDrivenTransitions:
+    transitionDelay = armTransitionTimer()
+    
+    console.info('Scheduler started! (event-driven, next transition %s; re-syncing on half-minute boundaries)' % ('in %.1f seconds' % transitionDelay if transitionDelay != None else 'not yet known'))
+    
+  else:
+    console.info('Scheduler started! (polling on half-minute boundaries first one in %.1f seconds)' % delay)
   
   # check the active future ones every 5 mins (after 30s at first)
   Timer(lambda: lookup_local_action('ProcessActiveFuture'), 30, 5*60)
@@ -260,12 +374,72 @@ def handlePollTimer():
   # when this timer fires, we should be on sharp 30s intervals 
   # of the wall clock
   
+  # (in event-driven mode, transitions have their own timer so this is only a safety re-sync)
+  if param_eventDrivenTransitions and activeBookingsSignature(date_now().getMillis()) == lastActiveBookings:
+    quantisePollNow()
+    return
+  
   lookup_local_action('ProcessActiveNow').call()
   quantisePollNow()
   
 timer_poller = Timer(handlePollTimer, 99999, 99999) # NOTE: 'delay' is continually set on-the-fly
                                                     #       and 'interval' control is not used
 
+# <!--- event-driven transitions
+
+# how long to wait when there are no upcoming transitions at all (a new feed re-arms the timer anyway)
+IDLE_TRANSITION_DELAY = 3600
+
+# the (source, booking) pairs that were active when last processed
+lastActiveBookings = None
+
+def activeBookingsSignature(instantMillis):
+  signature = list()
+  
+  for sourceInfo in param_scheduleSources:
+    name = sourceInfo['name']
+    
+    for booking in lookupBookingIndex(name).activeAt(instantMillis):
+      signature.append((name, booking[BOOKING_SEQ]))
+      
+  return signature
+
+# arms the transition timer for exactly the next booking start or end, returns the delay (or None)
+def armTransitionTimer():
+  nowMillis = date_now().getMillis()
+  
+  nextMillis = None
+  
+  for sourceInfo in param_scheduleSources:
+    millis = lookupBookingIndex(sourceInfo['name']).nextTransition(nowMillis)
+    
+    if millis != None and (nextMillis == None or millis < nextMillis):
+      nextMillis = millis
+      
+  if nextMillis == None:
+    timer_transition.setDelay(IDLE_TRANSITION_DELAY)
+    return None
+  
+  # (if this fires a touch early, the same boundary is simply re-armed)
+  delay = max((nextMillis - nowMillis) / 1000.0, 0.001)
+  timer_transition.setDelay(delay)
+  
+  return delay
+  
+def handleTransitionTimer():
+  if local_event_Debug.getArg() > 0:
+    console.log('handleTransitionTimer called')
+    
+  if not param_eventDrivenTransitions:
+    return
+  
+  lookup_local_action('ProcessActiveNow').call()
+  
+timer_transition = Timer(handleTransitionTimer, 99999, 99999) # NOTE: 'delay' is continually set on-the-fly
+                                                              #       and 'interval' control is not used
+
+# event-driven transitions ---!>
+
 def initMember(memberInfo):
   name = memberInfo.get('name')
   if isBlank(name):
@@ -311,12 +485,19 @@ def initScheduleSource(sourceInfo):
 def handleScheduleSourceFeed(sourceInfo, items):
   lookup_local_event('Source %s Items' % sourceInfo['name']).emit(items)
   
+  # (parse the bookings once, here)
+  indexScheduleSource(sourceInfo, items)
+  
   lookup_local_action('ProcessActiveNow').call()
 
 def local_action_ProcessActiveNow(arg=None):
+  global lastActiveBookings
+  
   warnings = []
   
-  items = processAllActiveItems(date_now(), warnings)
+  now = date_now()
+  
+  items = processAllActiveItems(now, warnings)
 
   local_event_ActiveNow.emit(items)
 
@@ -324,6 +505,10 @@ def local_action_ProcessActiveNow(arg=None):
   
   quantisePollNow()
   
+  if param_eventDrivenTransitions:
+    lastActiveBookings = activeBookingsSignature(now.getMillis())
+    armTransitionTimer()
+  
 def local_action_ForceActiveNow(arg=None):
   warnings = []
   
@@ -333,22 +518,22 @@ def local_action_ForceActiveNow(arg=None):
 
   applyStateList(items, force=True)
 
+FUTURE_DAYS = 7 # how far ahead 'Active Future' and the agenda look
+
 def local_action_ProcessActiveFuture(arg=None):
-  instantsSet = set()
-  instantsList = list()
+  nowMillis = date_now().getMillis()
+  untilMillis = nowMillis + FUTURE_DAYS * 24 * 3600 * 1000
+  
+  # distinct start instants (by millis) across all sources, over the next few days
+  instantsByMillis = {}
 
   for sourceInfo in param_scheduleSources:
-    items = lookup_local_event('Source %s Items' % sourceInfo['name']).getArg()
-
-    for item in safely(items):
-      start = item['start']
-
-      if start not in instantsSet:
-        instantsList.append(date_parse(start))
-        instantsSet.add(start)
+    for millis, instant in lookupBookingIndex(sourceInfo['name']).startInstants(nowMillis, untilMillis):
+      if millis not in instantsByMillis:
+        instantsByMillis[millis] = instant
 
   # sort by date
-  instantsList.sort()
+  instantsList = [instantsByMillis[millis] for millis in sorted(instantsByMillis)]
 
   result = list()
   
@@ -416,17 +601,8 @@ def processAllActiveItems(instant, warnings):
   
   # consolidates all available calendar sources
   for sourceInfo in param_scheduleSources:
-    items = lookup_local_event('Source %s Items' % sourceInfo['name']).getArg()
-
-    for item in safely(items):
-      start = item['start']
-      end = item['end']
-
-      startMillis = date_parse(start).getMillis()
-      endMillis = date_parse(end).getMillis()
-
-      if instantMillis < startMillis or instantMillis >= endMillis:
-        continue
+    for booking in lookupBookingIndex(sourceInfo['name']).activeAt(instantMillis):
+      item = booking[BOOKING_ITEM]
       
       activeItem = {}
       
@@ -470,6 +646,133 @@ def processAllActiveItems(instant, warnings):
   return activeItems
 
 
+# <!--- booking index
+
+# Bookings are parsed once when a source's feed arrives and are held in an interval index keyed by
+# epoch millis so "active at" and "starts between" are O(log n + k) queries and "next transition" is O(log n).
+
+from bisect import bisect_left, bisect_right
+
+# booking tuple fields
+BOOKING_START, BOOKING_END, BOOKING_SEQ, BOOKING_INSTANT, BOOKING_ITEM = range(5)
+
+# index by source name
+bookingIndexes = {}
+
+def indexScheduleSource(sourceInfo, items):
+  bookingIndexes[sourceInfo['name']] = BookingIndex(sourceInfo['name'], items)
+  
+def lookupBookingIndex(sourceName):
+  index = bookingIndexes.get(sourceName)
+  if index == None:
+    index = BookingIndex(sourceName, None)
+    bookingIndexes[sourceName] = index
+    
+  return index
+
+class BookingIndex:
+  '''A static interval tree over a source's bookings (implicit, i.e. the middle of any range of the
+     start-sorted bookings is the root of that sub-tree and holds the sub-tree's maximum end)'''
+  
+  def __init__(self, sourceName, items):
+    bookings = list()
+    
+    for seq, item in enumerate(safely(items)):
+      try:
+        start = date_parse(item['start'])
+        end = date_parse(item['end'])
+        
+      except:
+        console.warn('Source "%s": ignoring booking with unreadable start or end (title:"%s", start:%s, end:%s)' % (sourceName, item.get('title'), item.get('start'), item.get('end')))
+        continue
+        
+      bookings.append((start.getMillis(), end.getMillis(), seq, start, item))
+      
+    bookings.sort()
+    
+    self._bookings = bookings
+    self._starts = [booking[BOOKING_START] for booking in bookings]
+    self._ends = sorted([booking[BOOKING_END] for booking in bookings])
+    
+    self._maxEnds = [0] * len(bookings)
+    self._fillMaxEnds(0, len(bookings))
+    
+  def _fillMaxEnds(self, lo, hi):
+    if lo >= hi:
+      return None
+    
+    mid = (lo + hi) / 2
+    
+    maxEnd = self._bookings[mid][BOOKING_END]
+    
+    for subMaxEnd in [self._fillMaxEnds(lo, mid), self._fillMaxEnds(mid + 1, hi)]:
+      if subMaxEnd != None and subMaxEnd > maxEnd:
+        maxEnd = subMaxEnd
+        
+    self._maxEnds[mid] = maxEnd
+    
+    return maxEnd
+  
+  def activeAt(self, millis):
+    '''The bookings where start <= millis < end, in feed order'''
+    result = list()
+    
+    self._stab(millis, 0, len(self._bookings), result)
+    
+    if len(result) > 1:
+      result.sort(key=lambda booking: booking[BOOKING_SEQ])
+    
+    return result
+  
+  def _stab(self, millis, lo, hi, result):
+    while lo < hi:
+      mid = (lo + hi) / 2
+      
+      if self._maxEnds[mid] <= millis:
+        # nothing in this sub-tree is still going
+        return
+      
+      self._stab(millis, lo, mid, result)
+      
+      booking = self._bookings[mid]
+      
+      if booking[BOOKING_START] > millis:
+        # everything to the right starts later
+        return
+      
+      if millis < booking[BOOKING_END]:
+        result.append(booking)
+        
+      lo = mid + 1
+  
+  def startInstants(self, fromMillis, toMillis):
+    '''The distinct start instants where fromMillis <= start < toMillis as (millis, date-time) pairs, in order'''
+    result = list()
+    
+    lastMillis = None
+    
+    for i in range(bisect_left(self._starts, fromMillis), bisect_left(self._starts, toMillis)):
+      booking = self._bookings[i]
+      millis = booking[BOOKING_START]
+      if millis != lastMillis:
+        result.append((millis, booking[BOOKING_INSTANT]))
+        lastMillis = millis
+        
+    return result
+  
+  def nextTransition(self, afterMillis):
+    '''The first start or end instant (in millis) strictly after afterMillis, or None'''
+    result = None
+    
+    for instants in [self._starts, self._ends]:
+      i = bisect_right(instants, afterMillis)
+      if i < len(instants) and (result == None or instants[i] < result):
+        result = instants[i]
+        
+    return result
+  
+# booking index ---!>
+
 # <!--- status
 
 local_event_Status = LocalEvent({'group': 'Status', 'schema': {'type': 'object', 'properties': {
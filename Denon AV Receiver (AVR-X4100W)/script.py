@@ -47,6 +47,9 @@ def connected():
   console.info('Connected')
   tcp.clearQueue()
   
+  # (nothing is known about the new session)
+  resetPolls()
+  
 def disconnected():
   console.warn('Disconnected')
   
@@ -57,9 +60,12 @@ def timeout():
   console.warn('Timeout!')
   
 def received(data):
-  lastReceive[0] = system_clock()
+  now = system_clock()
+  lastReceive[0] = now
   log(4, 'recv: [%s]' % data)
   
+  noteFeedback(data, now)
+  
   parseFeedback(data)
 
 tcp = TCP(connected=connected, received=received, sent=sent, disconnected=disconnected, sendDelimiters='\r', receiveDelimiters='\r', timeout=timeout)
@@ -115,7 +121,7 @@ def bindPower(groupName, zoneCode, zonePrefix):
   powerOn = Action('%sPower on' % zonePrefix, lambda arg: tcp.send('%sON' % zoneCode), { 'title': 'On', 'group' : group, 'order': next_seq() })
   powerOff = Action('%sPower off' % zonePrefix, lambda arg: tcp.send('%sOFF' % zoneCode), { 'title': 'Off', 'group' : group, 'order': next_seq() })
   
-  Timer(lambda: tcp.request('%s?' % zoneCode, lambda resp: parseFeedback(resp)), 10) # poll every 10s
+  registerPoll('%s?' % zoneCode)
 
 def nullFunc(arg=None):
   pass
@@ -145,7 +151,7 @@ def bindVolume(groupName, zoneCode, zonePrefix):
   callbacksAndPrefixesList.append(('%sMAX' % zoneCode, nullFunc))
   callbacksAndPrefixesList.append(('%s' % zoneCode, volumeRespHandler))
   
-  Timer(lambda: tcp.request('%s?' % zoneCode, lambda resp: parseFeedback(resp)), 10)
+  registerPoll('%s?' % zoneCode)
   
 def bindMuting(groupName, zoneCode, zonePrefix):
   group = '%s Muting' % groupName
@@ -168,7 +174,7 @@ def bindMuting(groupName, zoneCode, zonePrefix):
   callbacksByData['%sON' % zoneCode] = lambda resp: mutingEvent.emitIfDifferent(True)
   callbacksByData['%sOFF' % zoneCode] = lambda resp: mutingEvent.emitIfDifferent(False)
   
-  Timer(lambda: tcp.request('%s?' % zoneCode, lambda resp: parseFeedback(resp)), 10)
+  registerPoll('%s?' % zoneCode)
 
 UNMAPPED_INPUT_CALLBACK = lambda arg: warn(1, 'Unmapped input; ignoring')
   
@@ -208,7 +214,7 @@ def bindInput(group, zoneCode, zonePrefix, interlockGroup, name, code):
   
   callbacksByData['%s%s' % (zoneCode, code)] = handleInputResponse
   
-  Timer(lambda: tcp.request('%s?' % zoneCode, lambda resp: parseFeedback(resp)), 10)
+  registerPoll('%s?' % zoneCode)
 
 # NOTE: Master Power is treated differently to Main, Z2, and Z3. 
 #       It has slightly different parameters.
@@ -240,8 +246,93 @@ def bindMasterPower():
   powerOn = Action('Master Power on', lambda arg: tcp.send('PWON'), { 'title': 'On', 'group' : group, 'order': next_seq() })
   powerOff = Action('Master Power off', lambda arg: tcp.send('PWSTANDBY'), { 'title': 'Off', 'group' : group, 'order': next_seq() })  
   
-  Timer(lambda: tcp.request('PW?', lambda resp: parseFeedback(resp)), 10) # poll every 10s
+  registerPoll('PW?')
     
+# <polling ---
+
+# Status queries are registered by the 'bind...' functions and deduplicated here (e.g. 'Z2?' answers Zone 2's
+# power, volume and input so it's only sent once), replies fan out through 'parseFeedback' as usual.
+#
+# One query goes out per tick, the most overdue first. The receiver also sends unsolicited feedback when
+# anything changes; while that's flowing the poll interval is stretched out (passive listening) and any
+# query whose feedback was heard recently isn't repeated.
+
+POLL_INTERVAL = 10          # (secs)
+PASSIVE_POLL_INTERVAL = 60  # (secs) while unsolicited feedback is flowing
+PASSIVE_WINDOW = 5*60       # (secs) how recent unsolicited feedback needs to be
+RESPONSE_WINDOW = 1.5       # (secs) feedback arriving this soon after a query is treated as its reply
+
+local_event_FeedbackMode = LocalEvent({'group': 'Status', 'title': 'Feedback mode', 'order': 9991, 'schema': {'type': 'string', 'enum': ['Polling', 'Passive']}})
+
+class PollQuery:
+  def __init__(self, query):
+    self.query = query         # e.g. 'Z2?'
+    self.prefix = query[:-1]   # e.g. 'Z2' (replies start with this)
+    self.lastSent = 0
+    self.lastHeard = 0
+
+pollQueries = list()         # in registration order
+pollQueriesByPrefix = list() # longest prefix first (so 'Z2MU' is matched before 'Z2')
+
+lastUnsolicited = [0]
+
+def registerPoll(query):
+  for q in pollQueries:
+    if q.query == query:
+      return
+    
+  q = PollQuery(query)
+  pollQueries.append(q)
+  
+  pollQueriesByPrefix.append(q)
+  pollQueriesByPrefix.sort(key=lambda q: -len(q.prefix))
+  
+lastPollSent = [0]
+
+def noteFeedback(resp, now):
+  lastSent = lastPollSent[0] # (for feedback that doesn't belong to a query, e.g. 'SV...' after 'SI?')
+  
+  for q in pollQueriesByPrefix:
+    if resp.startswith(q.prefix):
+      q.lastHeard = now
+      lastSent = q.lastSent
+      break
+      
+  if now - lastSent > RESPONSE_WINDOW*1000:
+    lastUnsolicited[0] = now
+  
+def pollTick():
+  now = system_clock()
+  
+  passive = lastUnsolicited[0] > 0 and now - lastUnsolicited[0] < PASSIVE_WINDOW*1000
+  local_event_FeedbackMode.emitIfDifferent('Passive' if passive else 'Polling')
+  
+  interval = (PASSIVE_POLL_INTERVAL if passive else POLL_INTERVAL) * 1000
+  
+  # the most overdue query
+  due = None
+  for q in pollQueries:
+    last = max(q.lastSent, q.lastHeard)
+    if now - last >= interval and (due == None or last < max(due.lastSent, due.lastHeard)):
+      due = q
+      
+  if due != None:
+    due.lastSent = now
+    lastPollSent[0] = now
+    tcp.request(due.query, lambda resp: parseFeedback(resp))
+    
+def resetPolls():
+  for q in pollQueries:
+    q.lastSent = 0
+    q.lastHeard = 0
+    
+  lastPollSent[0] = 0
+  lastUnsolicited[0] = 0
+  
+poll_timer = Timer(pollTick, 1)
+
+# polling --->
+
 # status ---
 
 local_event_Status = LocalEvent({'title': 'Status', 'group': 'Status', 'order': 9990, "schema": { 'title': 'Status', 'type': 'object', 'properties': {
@@ -0,0 +1,170 @@
+'''Replays contextual feedback through this recipe's dispatch table and reports lines per second.'''
+
+# Runs under CPython 2.7 (script.py is Jython 2.7 code), outside Nodel, e.g.
+#
+#   python replayFeedback.py --ports 16 --events 40 --lines 200000
+#
+# script.py is loaded with a minimal stand-in for the few toolkit globals it touches when loading (Parameters,
+# LocalEvents, TCP, Timer). Each port gets --events feedback events, split between discrete states
+# ('W1,2,76,1LE|' style, one event per state) and continuous ones (sliding values), registered through
+# registerGlobalEvent as a bound port would. Lines like "Evt00001,2,0000000092,330" are then fed to
+# dispatchFeedback() (what tcp_received() does with each line of feedback) in a random order, with --unknown
+# of them for events nobody registered, and the same lines are replayed through the previous dispatch (a
+# string key per feedback line, discrete then continuous) as a baseline. Every line must reach the same event
+# both ways.
+
+import argparse
+import os
+import random
+import time
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'script.py')
+
+class StandInEvent:
+  def __init__(self, name=None, metadata=None):
+    self.name = name
+    self.arg = None
+    self.emits = 0
+
+  def emit(self, arg=None):
+    self.arg = arg
+    self.emits += 1
+
+  def getArg(self):
+    return self.arg
+
+class StandInConsole:
+  def log(self, message):
+    pass
+
+  info = warn = error = log
+
+def standIn(*args, **kwargs):
+  return None
+
+class StandInTimer:
+  def __init__(self, *args, **kwargs):
+    pass
+
+  def start(self):
+    pass
+
+  def stop(self):
+    pass
+
+def loadRecipe():
+  ns = {'__name__': 'recipe', 'Parameter': standIn, 'LocalEvent': StandInEvent, 'TCP': lambda **kwargs: None,
+        'Timer': StandInTimer, 'console': StandInConsole(), 'system_clock': lambda: int(time.time() * 1000), 'next_seq': lambda: 0}
+  exec(compile(open(SCRIPT).read(), SCRIPT, 'exec'), ns)
+  return ns
+
+def register(ns, portCount, eventCount, rng):
+  '''Registers the events, returning [(line, event)] covering every registered state or value'''
+  lines = []
+
+  for port in range(1, portCount + 1):
+    for eventId in range(1, eventCount + 1):
+      category = rng.choice([1, 2, 4])
+
+      if rng.random() < 0.5:
+        # discrete states, e.g. power on / off
+        for state in range(rng.randint(2, 4)):
+          event = StandInEvent('Port %s Event %s State %s' % (port, eventId, state))
+          eventInfo = ns['EventInfo'](None, event, state, cmd_down='W%s,%s,%s,%sLE|' % (port, category, eventId, state))
+          ns['registerGlobalEvent'](eventInfo)
+          lines.append(('Evt%05d,%s,%010d,%s' % (port, category, eventId, state), event))
+
+      else:
+        # continuous, e.g. volume
+        event = StandInEvent('Port %s Event %s' % (port, eventId))
+        eventInfo = ns['EventInfo'](None, event, None, cmd_down='W%s,%s,%s,0LE|' % (port, category, eventId))
+        ns['registerGlobalEvent'](eventInfo, continuous=True)
+        for i in range(5):
+          lines.append(('Evt%05d,%s,%010d,%s' % (port, category, eventId, rng.randint(100, 999)), event))
+
+  return lines
+
+def previousTable(ns):
+  '''The same registrations keyed as they were before the dispatch table, e.g. '1,2,76,1' and '1,2,76\''''
+  table = {}
+
+  for key, target in ns['eventCallbacks'].items():
+    for state, eventInfo in target.byState.items():
+      table['%s,%s,%s,%s' % (key + (state,))] = eventInfo
+
+    if target.continuous is not None:
+      table['%s,%s,%s' % key] = target.continuous
+
+  return table
+
+def previousDispatch(ns, table, unknown, data):
+  # (as tcp_received dispatched feedback before the table, less the always-on TCP Received event)
+  feedback = ns['parseFeedback'](data)
+
+  if feedback is None or len(feedback) != 4:
+    return
+
+  key = '%s,%s,%s,%s' % (feedback[0], feedback[1], feedback[2], feedback[3])
+  eventInfo = table.get(key)
+  if eventInfo:
+    eventInfo.event.emit()
+    return
+
+  key = '%s,%s,%s' % (feedback[0], feedback[1], feedback[2])
+  eventInfo = table.get(key)
+  if eventInfo:
+    eventInfo.event.emit(int(feedback[3]))
+    return
+
+  unknown.emit({'key': key})
+
+def main():
+  parser = argparse.ArgumentParser(description='Replay Extron G2 feedback through the dispatch table')
+  parser.add_argument('--ports', type=int, default=16)
+  parser.add_argument('--events', type=int, default=40, help='per port')
+  parser.add_argument('--lines', type=int, default=200000, help='feedback lines to replay')
+  parser.add_argument('--unknown', type=float, default=0.05, help='fraction of lines for unregistered events')
+  parser.add_argument('--seed', type=int, default=1)
+  args = parser.parse_args()
+
+  rng = random.Random(args.seed)
+
+  ns = loadRecipe()
+  known = register(ns, args.ports, args.events, rng)
+
+  replay = []
+  for i in range(args.lines):
+    if rng.random() < args.unknown:
+      replay.append(('Evt%05d,2,%010d,1' % (args.ports + 1, rng.randint(1, 999)), None))
+    else:
+      replay.append(rng.choice(known))
+
+  lines = [line for (line, event) in replay]
+  table = previousTable(ns)
+  unknown = ns['local_event_UnknownFeedback']
+
+  print('%s ports x %s events: %s registered keys, replaying %s lines (%.0f%% unknown)' % (
+        args.ports, args.events, len(table), len(lines), args.unknown * 100))
+
+  for name, dispatch in [('table', ns['dispatchFeedback']), ('previous', lambda data: previousDispatch(ns, table, unknown, data))]:
+    # (counts are checked against each line's expected event)
+    for line, event in known:
+      event.emits = 0
+    unknown.emits = 0
+
+    start = time.time()
+    for line in lines:
+      dispatch(line)
+    secs = time.time() - start
+
+    expected = {}
+    for line, event in replay:
+      if event is not None:
+        expected[event] = expected.get(event, 0) + 1
+
+    misses = len([event for event in expected if event.emits != expected[event]])
+    print('  %-8s %8.0f lines/s  (%.2f us per line, unknown %s, mismatched events %s)' % (
+          name, len(lines) / secs, secs / len(lines) * 1000000, unknown.emits, misses))
+
+if __name__ == '__main__':
+  main()
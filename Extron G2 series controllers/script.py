@@ -5,6 +5,8 @@
 #    http://media.extron.com/download/files/userman/68-1715-01_IPL_250_A_080509.pdf
 
 import xml.etree.ElementTree as ET
+import hashlib # content hashes of the XML files
+import os      # working directory
 
 # aborts after parse failure. Used for scrict testing; should be False in production
 strictParse = True
@@ -34,6 +36,9 @@ reservedNamesByPortNum = {}
 
 ports = set()
 
+# the bound ports by URL
+portsByURL = {}
+
 # Receiving state
 # 'Normal' (or None)
 # 'Listing files'
@@ -131,25 +136,67 @@ def bindEverything():
       urls = extractPortURLs(urlBase, controlSummaryPath)
     
       print 'Extracted device URLs:', urls
+      
+      # release any ports that are no longer listed
+      for url in list(portsByURL):
+          if url not in urls:
+              releasePort(portsByURL[url])
+              
+              if getXMLCache().pop(url, None) is not None:
+                  _xmlCacheDirty[0] = True
 
       for url in urls:
-          bindPort(url)
-
- 	  bindPort(controlSummaryPath)
+          configXML, digest = fetchXML(url)
+          
+          # ports with unchanged content stay bound across reconnects
+          port = portsByURL.get(url)
+          if port is not None:
+              if port.digest == digest:
+                  print 'Port "%s" is unchanged; keeping it bound' % port.name
+                  continue
+              
+              releasePort(port)
+          
+          bindPort(url, configXML, digest)
+          
+      saveXMLCache()
         
 def unbindEverything():
-    for port in ports:
-        if port.subnode:
-          print 'Releasing node "%s"' % port.name
-          releaseNode(port.subnode)
+    for port in list(ports):
+        releasePort(port)
         
     ports.clear()
+    portsByURL.clear()
     _uniqueNames.clear()
+    
+def releasePort(port):
+    if port.subnode:
+        print 'Releasing node "%s"' % port.name
+        releaseNode(port.subnode)
+        _uniqueNames.discard(port.name)
+        
+    # only drop the feedback callbacks this port still owns
+    for key, eventInfo in port.callbacks.items():
+        unregisterGlobalEvent(key, eventInfo)
+    
+    ports.discard(port)
+    
+    if portsByURL.get(port.url) is port:
+        del portsByURL[port.url]
+    
+def local_action_RebindPorts(arg = None):
+    '{"title": "Rebind ports", "desc": "Releases all ports and binds them again from the unit", "group": "Comms"}'
+    unbindEverything()
+    bindEverything()
         
 local_event_TCPConnected = LocalEvent({ 'desc': 'When a TCP connection occurs.', 'group': 'Comms' })
 local_event_TCPDisconnected = LocalEvent({ 'desc': 'When a TCP disconnection occurs.', 'group': 'Comms' })
-local_event_TCPSent = LocalEvent({ 'desc': 'When TCP data is sent.', 'group': 'Comms' })
-local_event_TCPReceived = LocalEvent({ 'desc': 'When TCP data is received.', 'group': 'Comms' })
+local_event_TCPSent = LocalEvent({ 'desc': 'When TCP data is sent (only when debugging comms).', 'group': 'Comms' })
+local_event_TCPReceived = LocalEvent({ 'desc': 'When TCP data is received (only when debugging comms).', 'group': 'Comms' })
+
+# the TCP data events are relatively expensive with many ports streaming feedback so are off by default
+local_event_DebugComms = LocalEvent({ 'title': 'Debug comms?', 'desc': 'Emits the TCP sent and received events.', 'group': 'Debug', 
+                                      'schema': {'type': 'boolean'}})
 local_event_TCPTimeout = LocalEvent({ 'desc': 'When TCP timeout connection or read timeout occurs.', 'group': 'Comms' })
 
 local_event_IntroGreeting = LocalEvent()
@@ -180,19 +227,21 @@ def tcp_disconnected():
     local_event_TCPDisconnected.emit()
     ping_timer.stop()
     
-    unbindEverything()
+    # (ports stay bound; they're diffed against the unit's XML on the next connection)
 
 def tcp_sent(data):
-    local_event_TCPSent.emit(data)
+    if local_event_DebugComms.getArg():
+        local_event_TCPSent.emit(data)
   
 def tcp_timeout():
     local_event_TCPTimeout.emit()
   
 def tcp_received(data):
-    local_event_TCPReceived.emit(data)
-    
     lastReceive[0] = system_clock()
     
+    if local_event_DebugComms.getArg():
+        local_event_TCPReceived.emit(data)
+    
     parseState = local_event_ParseMode.getArg()
     if parseState == 'Listing files':
         parseFileListResp(data)
@@ -202,26 +251,12 @@ def tcp_received(data):
         if currentIRfile is not None:
             currentIRfile.parseLine(data)
     
-    feedback = parseFeedback(data)
-
-    if feedback is None or len(feedback) != 4:
-        return
-  
-    # try match discrete state feedback
-    key = '%s,%s,%s,%s' % (feedback[0], feedback[1], feedback[2], feedback[3])
-    eventInfo = eventCallbacks.get(key)
-    if eventInfo:
-        eventInfo.event.emit()
-        return
-
-    # otherwise match variable state feedback (sliding values, etc.)
-    key = '%s,%s,%s' % (feedback[0], feedback[1], feedback[2])
-    eventInfo = eventCallbacks.get(key)
-    if eventInfo:
-        eventInfo.event.emit(int(feedback[3]))
+    if dispatchFeedback(data):
         return
-      
-    local_event_UnknownFeedback.emit({'key' : key })
+    
+    # (non-contextual feedback is handled by the request callbacks; only flag the unrecognised)
+    if data.count(',') not in (0, 3):
+        local_event_UnknownFeedback.emit(data)
   
 # TCP has to be set up after callback functions are defined 
 tcp = TCP(connected = tcp_connected, received = tcp_received, sent = tcp_sent, disconnected = tcp_disconnected, timeout = tcp_timeout)
@@ -229,13 +264,80 @@ tcp = TCP(connected = tcp_connected, received = tcp_received, sent = tcp_sent, d
 # 'ping' every 60s
 ping_timer = Timer(lambda: local_action_RequestFirmware(), 60, stopped=True)
 
-# holds the global EventInfos by event key
-# key might be '1,2,3' or '1,2,3,4'
+# holds the global FeedbackTargets by (port, category, eventId) e.g. (1, 2, 76)
 eventCallbacks = {}
 
-def bindPort(url):
+class FeedbackTarget:
+    "The EventInfos for a port, category and event ID"
+    def __init__(self):
+        self.byState = {} # discrete state EventInfos by state value
+        self.continuous = None # EventInfo for variable state feedback (sliding values, etc.)
+
+# the (port, category, eventId) keys by raw feedback prefix e.g. 'Evt00001,2,0000000092',
+# so repeated feedback skips the splitting and integer parsing (only registered keys are held
+# so unknown feedback can't churn it)
+_keysByPrefix = {}
+
+# (or twice the registered keys if more, a unit sends the one prefix per event)
+MAX_PREFIXES = 4096
+
+def dispatchFeedback(data):
+    '''Dispatches contextual feedback e.g. "Evt00001,2,0000000092,330" to its event, 
+       returning False if the data isn't contextual feedback'''
+    i = data.rfind(',')
+    if i < 0:
+        return False
+    
+    prefix = data[:i]
+    
+    key = _keysByPrefix.get(prefix)
+    if key is None:
+        key = parseFeedbackKey(prefix)
+        if key is None:
+            return False
+        
+        if key in eventCallbacks:
+            if len(_keysByPrefix) >= max(MAX_PREFIXES, 2 * len(eventCallbacks)):
+                _keysByPrefix.clear()
+                
+            _keysByPrefix[prefix] = key
+        
+    try:
+        value = int(data[i+1:])
+    except ValueError:
+        return False
+        
+    target = eventCallbacks.get(key)
+    if target is not None:
+        # try match discrete state feedback
+        eventInfo = target.byState.get(value)
+        if eventInfo:
+            eventInfo.event.emit()
+            return True
+        
+        # otherwise match variable state feedback
+        eventInfo = target.continuous
+        if eventInfo:
+            eventInfo.event.emit(value)
+            return True
+        
+    local_event_UnknownFeedback.emit({'key' : '%s,%s,%s' % key })
+    return True
+    
+def parseFeedbackKey(prefix):
+    "'Evt00001,2,0000000092' becomes (1, 2, 92), or None if not in that form"
+    parts = prefix.split(',')
+    if len(parts) != 3 or not parts[0].startswith('Evt'):
+        return None
+    
+    try:
+        return (int(parts[0][3:]), int(parts[1]), int(parts[2]))
+    except ValueError:
+        return None
+
+def bindPort(url, configXML, digest):
     console.info('Binding port against URL "%s"' % url)
-    port = ExtronPort(url)
+    port = ExtronPort(url, configXML, digest)
     name = url
 
     try:
@@ -279,18 +381,26 @@ class EventInfo:
         self.cmd_down = cmd_down
 
 class ExtronPort:
-    def __init__(self, url):
+    def __init__(self, url, configXML, digest):
         self.url = url
+        self.configXML = configXML
+        self.digest = digest # content hash of 'configXML'
         self.warnings = [] # any warnings that occur during parsing
         self.infos = [] # info a user of the driver might find useful
         self.eventLookups = {} # event callback lookups
         self.subnode = None # will be created when at least one command exists
+        self.callbacks = {} # the global event callbacks registered by this port
         ports.add(self)
+        portsByURL[url] = self
 
-    def parse(self):
-        configXML = getURL(self.url)
+    def registerGlobalEvent(self, eventInfo, continuous = False):
+        key = registerGlobalEvent(eventInfo, continuous)
         
-        content = ET.fromstring(configXML)
+        if key:
+            self.callbacks[key] = eventInfo
+
+    def parse(self):
+        content = ET.fromstring(self.configXML)
         
         # ...
         # <group device="0" heading="Integra DTR-5.8" dev_type_id="27" driver_info="Integra DTR-5.8">
@@ -435,7 +545,7 @@ class ExtronPort:
             events[code] = (event, state)
             eventInfo = EventInfo(code, event, state, retrieve_cmd)
             self.eventLookups[code] = eventInfo
-            registerGlobalEvent(eventInfo)
+            self.registerGlobalEvent(eventInfo)
 
         # only one action to get the state
         retrieve_cmd = item.attrib['current']
@@ -476,7 +586,7 @@ class ExtronPort:
             events[code] = (event, state)
             eventInfo = EventInfo(code, event, state, retrieve_cmd, cmd_down)
             self.eventLookups[code] = eventInfo
-            registerGlobalEvent(eventInfo)
+            self.registerGlobalEvent(eventInfo)
 
         # retrieve action (if provided or not already been set up)
         if retrieverArg is None and retrieve_cmd is not None:
@@ -568,7 +678,7 @@ class ExtronPort:
             events[code] = (event, state)
             eventInfo = EventInfo(code, event, state, retrieveCurrent, cmd_down)
             self.eventLookups[code] = eventInfo
-            registerGlobalEvent(eventInfo)
+            self.registerGlobalEvent(eventInfo)
 
             actionHandler = createActionHandler(cmd_down, state)
 
@@ -609,7 +719,7 @@ class ExtronPort:
         dummy_cmd_down = '%s%s%s' % (cmd_pre, 0, cmd_suf)
         eventInfo = EventInfo(code, event, None, retrieve_cmd, dummy_cmd_down)
         self.eventLookups[code] = eventInfo
-        registerGlobalEvent(eventInfo, continuous=True)
+        self.registerGlobalEvent(eventInfo, continuous=True)
         
         if retrieverArg is None and retrieve_cmd is not None: 
             def actionHandler(arg = None):
@@ -676,6 +786,8 @@ class ExtronPort:
 
 # 'W1,2,76,1LE|'
 def parseEventKeyFromRequest(cmd, continuous = False):
+    '''Returns (port, category, eventId, state) e.g. (1, 2, 76, 1)
+       or (port, category, eventId) if continuous'''
     if cmd is None: return
     
     parts = cmd.split(',')
@@ -686,22 +798,46 @@ def parseEventKeyFromRequest(cmd, continuous = False):
         eventId = int(parts[2])
         if continuous:
             # ignore the state part
-            key = '%s,%s,%s' % (port, category, eventId)
-            return key
+            return (port, category, eventId)
         else:
             state = int(parts[3][0:-3]) # drop '1LE|'
-            key = '%s,%s,%s,%s' % (port, category, eventId, state)
-            return key
+            return (port, category, eventId, state)
       
     else:
         return None
 
 def registerGlobalEvent(eventInfo, continuous = False):
-    "Registers a callback in the callback map"
+    "Registers a callback in the callback map, returning its key"
     key = parseEventKeyFromRequest(eventInfo.cmd_down, continuous)
     
     if key:
-        eventCallbacks[key] = eventInfo      
+        target = eventCallbacks.get(key[:3])
+        if target is None:
+            target = FeedbackTarget()
+            eventCallbacks[key[:3]] = target
+            
+        if continuous:
+            target.continuous = eventInfo
+        else:
+            target.byState[key[3]] = eventInfo
+        
+    return key
+
+def unregisterGlobalEvent(key, eventInfo):
+    "Removes a callback from the callback map (if it's still the registered one)"
+    target = eventCallbacks.get(key[:3])
+    if target is None:
+        return
+    
+    if len(key) == 3:
+        if target.continuous is eventInfo:
+            target.continuous = None
+            
+    elif target.byState.get(key[3]) is eventInfo:
+        del target.byState[key[3]]
+        
+    if target.continuous is None and len(target.byState) == 0:
+        del eventCallbacks[key[:3]]
         
 
 def parseFeedback(data):
@@ -979,7 +1115,7 @@ def extractPortURLs(baseURL, filename):
     '''
     dest = baseURL + '/' + filename
     console.info('Retrieving %s' % dest)
-    rootXML = getURL(dest)
+    rootXML, digest = fetchXML(dest)
         
     root = ET.fromstring(rootXML)
     
@@ -1008,6 +1144,115 @@ def extractPortURLs(baseURL, filename):
           
     return baseURLs
   
+# <--- XML cache
+#
+# The control summary and port XML files are cached on disk by URL along with a content hash and
+# the HTTP validators (ETag, Last-Modified) the unit sent with them. Cached files are revalidated
+# with a conditional GET rather than downloaded again (including after a restart), unchanged ports
+# stay bound across reconnects and the last known files are used if the unit's web server can't be
+# reached.
+
+XML_CACHE_FILE = os.path.join(os.getcwd(), 'controlSummaryCache.json')
+
+# e.g. { 'http://192.168.178.205/gc2/gv-portserial1ctl.xml': { 'digest': '8fa1...', 'xml': '<?xml ...',
+#                                                                'etag': '"5c-1f3"', 'lastModified': 'Tue, 03 Mar ...' },
+#        ... }
+_xmlCache = None
+
+_xmlCacheDirty = [False]
+
+def getXMLCache():
+    global _xmlCache
+    
+    if _xmlCache is None:
+        _xmlCache = {}
+        
+        if os.path.exists(XML_CACHE_FILE):
+            try:
+                f = open(XML_CACHE_FILE, 'r')
+                try:
+                    _xmlCache = json_decode(f.read()) or {}
+                finally:
+                    f.close()
+                    
+            except Exception, e:
+                console.warn('XML cache could not be loaded (will be recreated) - %s' % e)
+            
+    return _xmlCache
+
+def saveXMLCache():
+    if not _xmlCacheDirty[0]:
+        return
+    
+    try:
+        f = open(XML_CACHE_FILE, 'w')
+        try:
+            f.write(json_encode(getXMLCache()))
+        finally:
+            f.close()
+
+        _xmlCacheDirty[0] = False
+        
+    except Exception, e:
+        console.warn('XML cache could not be saved - %s' % e)
+
+def digestOf(xml):
+    data = xml.encode('utf-8') if isinstance(xml, unicode) else xml
+    return hashlib.md5(data).hexdigest()
+
+def headerValue(headers, name):
+    'Looks up a response header regardless of case.'
+    for key in headers or {}:
+        if key is not None and key.lower() == name.lower():
+            return headers[key]
+        
+    return None
+
+def fetchXML(url):
+    'Returns (xml, digest) for the URL, revalidating a cached copy and falling back to it if the URL cannot be retrieved.'
+    cache = getXMLCache()
+    entry = cache.get(url)
+    
+    # only download the file if it has changed since it was cached
+    headers = {}
+    if entry is not None:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('lastModified'):
+            headers['If-Modified-Since'] = entry['lastModified']
+    
+    try:
+        response = get_url(url, headers=headers, fullResponse=True)
+        
+        statusCode = response['statusCode']
+        
+        if statusCode == 304 and entry is not None:
+            return entry['xml'], entry['digest']
+        
+        if statusCode != 200:
+            raise Exception('HTTP %s %s' % (statusCode, response.get('reasonPhrase') or ''))
+        
+    except Exception, e:
+        if entry is None:
+            raise
+        
+        console.warn('Could not retrieve %s (%s); using cached copy' % (url, e))
+        return entry['xml'], entry['digest']
+
+    xml = response['content']
+    digest = digestOf(xml)
+    
+    etag = headerValue(response.get('headers'), 'ETag')
+    lastModified = headerValue(response.get('headers'), 'Last-Modified')
+    
+    if entry is None or entry['digest'] != digest or entry.get('etag') != etag or entry.get('lastModified') != lastModified:
+        cache[url] = { 'digest': digest, 'xml': xml, 'etag': etag, 'lastModified': lastModified }
+        _xmlCacheDirty[0] = True
+        
+    return xml, digest
+    
+# XML cache --->
+  
 _seqCounter = [0L]
 
 def nextSeqNum():
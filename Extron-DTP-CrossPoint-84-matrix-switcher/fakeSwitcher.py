@@ -0,0 +1,173 @@
+'''A stand-in Extron DTP CrossPoint 84 speaking the SIS subset this recipe uses, for trying out tie sync.'''
+
+# Runs under CPython (2.7 or 3), e.g.
+#
+#   python fakeSwitcher.py --port 2323 --drift 30
+#
+# then point the node at it (the recipe always uses port 23, so either run this as root on 23 or
+# temporarily change the port in 'main'). Supported:
+#
+#   q                     firmware
+#   Esc 1CV               verbose mode ("Vrb1")
+#   I*O!  I*O%  I*O$      ties (all, video, audio), e.g. "Out04 In01 Vid"
+#   O%  O$                view an output's video or audio tie
+#   Esc X*O*TVC           view ties (preset X, from output O, type 1 video or 2 audio), e.g. "01 02 00 03 Vid"
+#   Esc +Q I*O! ...       quick multiple tie ("Qik")
+#   Esc DnGRPM  Esc Dn*vGRPM   group gain / mute
+#
+# Anything else answers "E10" (invalid command). With --drift, one random output is re-tied every that many
+# seconds (as if from the front panel) and the verbose tie feedback is sent to connected clients.
+
+import argparse
+import random
+import re
+import socket
+import threading
+import time
+
+try:
+  import socketserver
+except ImportError:
+  import SocketServer as socketserver
+
+OUTPUTS = 8
+INPUTS = 4
+
+class Switcher:
+  def __init__(self):
+    self.ties = {'video': dict([(o, 0) for o in range(1, OUTPUTS+1)]),
+                 'audio': dict([(o, 0) for o in range(1, OUTPUTS+1)])}
+    self.groups = {}
+    self.clients = []
+    self.lock = threading.Lock()
+    self.stats = {'commands': 0, 'view ties': 0, 'quick ties': 0, 'invalid': 0}
+
+  def handle(self, line):
+    self.stats['commands'] += 1
+
+    with self.lock:
+      if line == 'q':
+        return '1.02'
+
+      if line == '\x1b1CV':
+        return 'Vrb1'
+
+      m = re.match(r'^(\d+)\*(\d+)([!%$])$', line)
+      if m:
+        return self.tie(int(m.group(1)), int(m.group(2)), m.group(3))
+
+      m = re.match(r'^(\d+)([%$])$', line)
+      if m:
+        return '%02d' % self.ties['video' if m.group(2) == '%' else 'audio'].get(int(m.group(1)), 0)
+
+      m = re.match(r'^\x1b(\d+)\*(\d+)\*([12])VC$', line)
+      if m:
+        self.stats['view ties'] += 1
+        av = 'video' if m.group(3) == '1' else 'audio'
+        table = self.ties[av]
+        return ' '.join(['%02d' % table[o] for o in range(int(m.group(2)), OUTPUTS+1)]) + (' Vid' if av == 'video' else ' Aud')
+
+      m = re.match(r'^\x1b\+Q((?:\d+\*\d+[!%$])+)$', line)
+      if m:
+        self.stats['quick ties'] += 1
+        for i, o, suffix in re.findall(r'(\d+)\*(\d+)([!%$])', m.group(1)):
+          self.tie(int(i), int(o), suffix)
+        return 'Qik'
+
+      m = re.match(r'^\x1bD(\d+)(?:\*([-+]?\d+))?GRPM$', line)
+      if m:
+        if m.group(2) != None:
+          self.groups[m.group(1)] = int(m.group(2))
+        return 'GrpmD%s*%+06d' % (m.group(1), self.groups.get(m.group(1), 0))
+
+      self.stats['invalid'] += 1
+      return 'E10'
+
+  def tie(self, i, o, suffix):
+    if o < 1 or o > OUTPUTS or i < 0 or i > INPUTS:
+      return 'E01'
+
+    if suffix in '!%':
+      self.ties['video'][o] = i
+    if suffix in '!$':
+      self.ties['audio'][o] = i
+
+    return 'Out%02d In%02d %s' % (o, i, {'!': 'All', '%': 'Vid', '$': 'Aud'}[suffix])
+
+  def drift(self, interval):
+    while True:
+      time.sleep(interval)
+
+      o = random.randint(1, OUTPUTS)
+      i = random.randint(0, INPUTS)
+      with self.lock:
+        feedback = self.tie(i, o, '!')
+        clients = list(self.clients)
+
+      print('drift: %s' % feedback)
+      for client in clients:
+        client.reply(feedback)
+
+class Handler(socketserver.StreamRequestHandler):
+  def setup(self):
+    socketserver.StreamRequestHandler.setup(self)
+    self.sendLock = threading.Lock()
+    self.server.switcher.clients.append(self)
+
+  def handle(self):
+    print('connected %s:%s' % self.client_address)
+    self.reply('(c) Copyright 2015, Extron Electronics, DTPCP84, V1.02, 60-1368-01')
+    self.reply(time.strftime('%a, %d %b %Y %H:%M:%S'))
+
+    while True:
+      line = self.rfile.readline()
+      if not line:
+        break
+
+      line = line.decode('latin-1').strip('\r\n')
+      if line == '':
+        continue
+
+      resp = self.server.switcher.handle(line)
+      print('%r -> %r' % (line, resp))
+      self.reply(resp)
+
+  def finish(self):
+    self.server.switcher.clients.remove(self)
+    socketserver.StreamRequestHandler.finish(self)
+
+  def reply(self, line):
+    with self.sendLock:
+      try:
+        self.wfile.write((line + '\r\n').encode('latin-1'))
+        self.wfile.flush()
+      except socket.error:
+        pass
+
+class Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+  allow_reuse_address = True
+  daemon_threads = True
+
+def main():
+  parser = argparse.ArgumentParser(description='Fake Extron DTP CrossPoint 84')
+  parser.add_argument('--port', type=int, default=23)
+  parser.add_argument('--drift', type=float, default=0, help='secs between random front panel ties (0 for none)')
+  args = parser.parse_args()
+
+  server = Server(('', args.port), Handler)
+  server.switcher = Switcher()
+
+  if args.drift > 0:
+    thread = threading.Thread(target=server.switcher.drift, args=(args.drift,))
+    thread.daemon = True
+    thread.start()
+
+  print('Listening on TCP port %s' % args.port)
+
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    print(server.switcher.stats)
+
+if __name__ == '__main__':
+  main()
@@ -261,11 +261,21 @@ def handle_polltimer():
   # if nothing else, query the firmware
   tcp.request('q', lambda arg: local_event_SystemFirmware.emitIfDifferent(arg))
   
+  if isBulkSync():
+    syncTieTable()
+    
+    for poller in groupPollers:
+      poller()
+  
   #tcp.request('\x1BD1GRPM', lambda resp: handleProgramVolFeedback(pollValue=resp))
   
 timer_poller = Timer(handle_polltimer, 10)
 
 def sync_all_ties():
+  if isBulkSync():
+    syncTieTable()
+    return
+  
   for output in param_outputs:
     syncTie(output['num'])
       
@@ -293,6 +303,11 @@ def local_action_TieAudio(arg=None):
 
 # ('av' can be 'video', 'audio' or 'both', None, etc.)
 def performTie(input, output, av=None):
+  if av != 'audio':
+    desiredTies['video'][output] = input
+  if av != 'video':
+    desiredTies['audio'][output] = input
+    
   if av == 'video':
   	tcp.request('%s*%s%%' % (input, output), parseTieFeedback)
     
@@ -345,6 +360,11 @@ def parseTieFeedback(arg):
 def handleTieFeedback(audio, video, i, o):
   console.info('Handling tie feedback: %s, %s, %s, %s' % (audio, video, i, o))
   
+  if audio:
+    tieTable['audio'][o] = i
+  if video:
+    tieTable['video'][o] = i
+  
   # handle direct output state
   event = None
   if audio:
@@ -419,7 +439,7 @@ def bindGroupControl(name, i, typee):
     Action('%s Gain' % name, lambda arg: tcp.request('\x1BD%s*%sGRPM' % (i, arg*10), parseGainResp), {'title': 'Gain', 'group': '"%s"' % group, 'order': next_seq(), 'schema': schema})
   
     # poller
-    Timer(lambda: tcp.request('\x1BD%sGRPM' % i, parseGainResp), 5.33 + (next_seq() % 10)/3)
+    pollGroup(lambda: tcp.request('\x1BD%sGRPM' % i, parseGainResp))
     
   elif typee == 'Muting':
     schema = {'type': 'boolean'}
@@ -441,7 +461,96 @@ def bindGroupControl(name, i, typee):
            {'title': 'Muting', 'group': '"%s"' % group, 'order': next_seq(), 'schema': schema})
 
     # poller
-    Timer(lambda: tcp.request('\x1BD%sGRPM' % i, parseMuteResp), 5.33 + (next_seq() % 10)/3)
+    pollGroup(lambda: tcp.request('\x1BD%sGRPM' % i, parseMuteResp))
+
+# <bulk tie sync ---
+
+# In 'Bulk' mode the whole tie table is read with the 'view ties' queries (all outputs in one response
+# each for video and audio, e.g. "01 02 00 03 Vid") and diffed against the last known table so only
+# outputs that actually changed emit. Group gains and mutes are polled alongside instead of on their
+# own timers. Ties made through this node can be reapplied in one quick multiple tie command if the
+# switcher is found to differ.
+
+param_tieSync = Parameter({'title': 'Tie sync', 'desc': '"Bulk" reads the whole tie table (and groups) in one go every poll', 
+                           'schema': {'type': 'string', 'enum': ['Per output', 'Bulk'], 'hint': 'Per output'}})
+
+param_reapplyTies = Parameter({'title': 'Reapply ties', 'desc': '("Bulk" only) ties made through this node are reapplied if the switcher differs', 
+                               'schema': {'type': 'boolean'}})
+
+tieTable = {'video': {}, 'audio': {}} # last known input by output number
+
+desiredTies = {'video': {}, 'audio': {}} # as last tied through this node, input by output number
+
+groupPollers = list() # ('Bulk' only)
+
+TIE_TABLE_TAGS = {'video': 'Vid', 'audio': 'Aud'}
+
+videoTableValid = [False] # (this sync cycle)
+
+def isBulkSync():
+  return param_tieSync == 'Bulk'
+
+def syncTieTable():
+  videoTableValid[0] = False
+  
+  # view ties of the current configuration (preset 0) from output 1, type 1 (video) then 2 (audio)
+  tcp.request('\x1B0*1*1VC', lambda resp: handleVideoTieTable(resp))
+  tcp.request('\x1B0*1*2VC', lambda resp: handleAudioTieTable(resp))
+  
+def handleVideoTieTable(resp):
+  videoTableValid[0] = handleTieTable('video', resp)
+  
+def handleAudioTieTable(resp):
+  valid = handleTieTable('audio', resp)
+  
+  # (only when both tables of this cycle are known to be right)
+  if param_reapplyTies and valid and videoTableValid[0]:
+    reapplyTies()
+  
+def handleTieTable(av, resp):
+  '''Applies a tie table, returning False (with nothing applied) if the response isn't one'''
+  # e.g. "01 02 00 03 Vid" (verbose feedback such as "Out04 In01 Vid" or a shifted response could take its place)
+  parts = resp.split()
+  
+  if len(parts) < 2 or parts[-1] != TIE_TABLE_TAGS[av] or not all([part.isdigit() for part in parts[:-1]]):
+    console.warn('Unexpected %s tie table [%s]' % (av, resp))
+    return False
+  
+  inputs = [int(part) for part in parts[:-1]]
+  
+  known = tieTable[av]
+  
+  for index, i in enumerate(inputs):
+    o = index + 1
+    
+    if known.get(o) != i:
+      handleTieFeedback(av == 'audio', av == 'video', i, o)
+      
+  return True
+      
+def reapplyTies():
+  ties = list()
+  
+  for av, suffix in [('video', '%'), ('audio', '$')]:
+    for o, i in desiredTies[av].items():
+      if tieTable[av].get(o) != i:
+        ties.append('%s*%s%s' % (i, o, suffix))
+        
+  if len(ties) == 0:
+    return
+  
+  console.info('Reapplying %s tie(s)' % len(ties))
+  
+  # quick multiple tie, e.g. "\x1B+Q1*2%3*4$" (response "Qik")
+  tcp.request('\x1B+Q%s' % ''.join(ties), lambda resp: console.info('Reapplied ties, response [%s]' % resp))
+  
+def pollGroup(poller):
+  if isBulkSync():
+    groupPollers.append(poller)
+  else:
+    Timer(poller, 5.33 + (next_seq() % 10)/3)
+
+# bulk tie sync --->
 
 def parseInt(s):
   '''For Extron responses, parses "+0000" or "-000.1" safely'''
@@ -0,0 +1,194 @@
+'''Simulates a storm of flapping members through this recipe and reports member emits per second.'''
+
+# Runs under CPython 2.7 (script.py is Jython 2.7 code), outside Nodel, e.g.
+#
+#   python flapMembers.py --members 150 --rounds 20
+#   python flapMembers.py --members 400 --delay 0
+#   python flapMembers.py --script /tmp/old/script.py     (to compare another version of the recipe)
+#
+# script.py (and memberAggregation.py beside it) is loaded with a minimal stand-in for the toolkit globals it
+# touches (Events, Actions, Parameters, remote events, call_safe). The group is configured with --members
+# members, each with a Power signal and a Status, and Desired Power is set to On. Then, --rounds times over,
+# every member (in a random order) emits a random Power state, and --status of them a random status level,
+# as their remote events would during a power-on storm. The emits are --spacing millis apart on a simulated
+# clock, so the 'Aggregation delay' debounce behaves as it would live.
+#
+# The wall clock time taken gives member emits per second. The emit counts of the group's own Power and
+# Status show how much reaches parents, and their final values are checked against the members' last states.
+
+import argparse
+import os
+import random
+import sys
+import time
+import types
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class StandInEvent:
+  def __init__(self, name, metadata=None):
+    self.name = name
+    self.arg = None
+    self.emits = 0
+    self.handlers = []
+
+  def emit(self, arg=None):
+    self.arg = arg
+    self.emits += 1
+    for handler in self.handlers:
+      handler(arg)
+
+  def emitIfDifferent(self, arg=None):
+    if arg != self.arg:
+      self.emit(arg)
+
+  def getArg(self):
+    return self.arg
+
+  def addEmitHandler(self, handler):
+    self.handlers.append(handler)
+
+class StandInConsole:
+  def log(self, message):
+    pass
+
+  info = warn = error = log
+
+class StandIns:
+  '''The toolkit, on a simulated clock'''
+
+  def __init__(self, params):
+    self.params = params
+    self.events = {}
+    self.remoteEvents = {}
+    self.now = 0.0  # (simulated secs)
+    self.pending = [] # (due, func)
+
+  def event(self, name, metadata=None):
+    event = StandInEvent(name, metadata)
+    self.events[name] = event
+    return event
+
+  def createRemoteEvent(self, name, handler=None, metadata=None, suggestedNode=None, suggestedEvent=None):
+    self.remoteEvents[name] = handler
+
+  def callSafe(self, func, delay=0):
+    self.pending.append((self.now + delay, func))
+
+  def advance(self, secs):
+    self.now += secs
+
+    due = [call for call in self.pending if call[0] <= self.now]
+    if len(due) > 0:
+      self.pending = [call for call in self.pending if call[0] > self.now]
+      for when, func in due:
+        func()
+
+  def globals(self):
+    return {'Parameter': lambda metadata: None, 'Event': self.event, 'LocalEvent': lambda metadata: StandInEvent(None),
+            'Action': lambda name, handler, metadata=None: None, 'create_remote_action': lambda *args, **kwargs: None,
+            'create_remote_event': self.createRemoteEvent, 'lookup_local_event': self.events.get,
+            'lookup_parameter': self.params.get, 'lookup_remote_action': lambda name: None, 'call_safe': self.callSafe,
+            'console': StandInConsole(), 'next_seq': lambda: 0}
+
+def loadRecipe(path, standIns):
+  toolkit = standIns.globals()
+
+  # (memberAggregation.py takes the toolkit from 'nodetoolkit', script.py imports BindingState)
+  nodetoolkit = types.ModuleType('nodetoolkit')
+  nodetoolkit.__dict__.update(toolkit)
+  sys.modules['nodetoolkit'] = nodetoolkit
+
+  for name in ['org', 'org.nodel', 'org.nodel.core']:
+    sys.modules[name] = types.ModuleType(name)
+  sys.modules['org.nodel.core'].BindingState = None
+
+  sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+
+  ns = dict(toolkit)
+  ns['__name__'] = 'recipe'
+  exec(compile(open(path).read(), path, 'exec'), ns)
+  return ns
+
+def expectedStatus(statuses):
+  level = max([status['level'] for status in statuses.values()])
+  message = ', '.join(['%s: [%s]' % (name, status['message']) for name, status in sorted(statuses.items(), key=lambda item: item[0]) if status['level'] > 0])
+  return level, message or 'OK'
+
+def main():
+  parser = argparse.ArgumentParser(description='Flap Group members and time the aggregation')
+  parser.add_argument('--script', default=os.path.join(HERE, 'script.py'))
+  parser.add_argument('--members', type=int, default=150)
+  parser.add_argument('--rounds', type=int, default=20, help='emits per member')
+  parser.add_argument('--status', type=float, default=0.3, help='fraction of members changing status each round')
+  parser.add_argument('--spacing', type=float, default=1, help='simulated millis between member emits')
+  parser.add_argument('--delay', type=float, default=None, help="'Aggregation delay' (secs, default the recipe's)")
+  parser.add_argument('--seed', type=int, default=1)
+  args = parser.parse_args()
+
+  rng = random.Random(args.seed)
+
+  # (zero-padded so configured order and name order agree)
+  names = ['Member%04d' % i for i in range(args.members)]
+
+  params = {'members': [{'name': name, 'hasStatus': True, 'power': {'mode': 'Signal Only'}} for name in names]}
+  if args.delay != None:
+    params['aggregationDelay'] = args.delay
+
+  standIns = StandIns(params)
+  ns = loadRecipe(args.script, standIns)
+  ns['main']()
+
+  standIns.events['Desired Power'].emit('On')
+
+  powerHandlers = [standIns.remoteEvents['Member %s Power' % name] for name in names]
+  statusHandlers = [standIns.remoteEvents['Member %s Status' % name] for name in names]
+
+  # pre-build the storm so only the recipe is timed
+  storm = []
+  for i in range(args.rounds):
+    for index in rng.sample(range(args.members), args.members):
+      storm.append((powerHandlers[index], index, rng.choice(['On', 'On', 'Off', 'Partially On'])))
+
+      if rng.random() < args.status:
+        level = rng.choice([0, 0, 1, 2])
+        storm.append((statusHandlers[index], index, {'level': level, 'message': 'OK' if level == 0 else 'Fault %s' % rng.randint(1, 9)}))
+
+  # (the members all reporting in for the first time isn't part of the storm)
+  for handler in statusHandlers:
+    handler({'level': 0, 'message': 'OK'})
+  standIns.advance(60)
+
+  power = standIns.events['Power']
+  status = standIns.events['Status']
+  power.emits = status.emits = 0
+
+  spacing = args.spacing / 1000.0
+
+  start = time.time()
+  for handler, index, arg in storm:
+    handler(arg)
+    standIns.advance(spacing)
+
+  # (let the last of it settle)
+  standIns.advance(60)
+  secs = time.time() - start
+
+  lastPower = {}
+  lastStatus = dict([(name, {'level': 0, 'message': 'OK'}) for name in names])
+  for handler, index, arg in storm:
+    (lastPower if isinstance(arg, str) else lastStatus)[names[index]] = arg
+
+  expectedPower = 'On' if all([state == 'On' for state in lastPower.values()]) else 'Partially On'
+  level, message = expectedStatus(lastStatus)
+  correct = power.getArg() == expectedPower and status.getArg() == {'level': level, 'message': message}
+
+  print('%s: %s members, %s member emits over %.1f simulated secs' % (os.path.basename(args.script), args.members, len(storm), len(storm) * spacing))
+  print('  %.0f member emits/s (%.1f us per emit)' % (len(storm) / secs, secs / len(storm) * 1000000))
+  print('  group Power emitted %s times, Status %s times, final values %s' % (power.emits, status.emits, 'correct' if correct else 'WRONG'))
+
+  if not correct:
+    sys.exit(1)
+
+if __name__ == '__main__':
+  main()
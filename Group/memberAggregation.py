@@ -0,0 +1,306 @@
+'''Shared member aggregation engine for Group nodes and the "memberStatesAndStatuses" ingredient.'''
+
+from nodetoolkit import *
+
+# Use "from memberAggregation import *" within script.py (or an ingredient) to expose the
+# aggregation Parameter and the snapshot signal.
+#
+# The original lives in "ingredients"; recipes that use it (e.g. Group) carry an identical copy
+# alongside their script.py. Edit the original, then run "python ingredients/syncCopies.py --update".
+#
+# Member states are held in compact arrays indexed by member slot so a member change is O(1) and
+# "how many members are not in the desired state" or "what is the highest status level" are
+# native array reductions. Member signals arrive in storms (e.g. when a whole site powers on) so the
+# resultant signals are only emitted once things have settled.
+#
+# Other nodes can bind to the read-only "Aggregate Snapshot" signal, e.g.
+#
+#   {'members': 150,
+#    'status': {'level': 2, 'levels': {'0': 148, '2': 2}, 'suppressed': 0},
+#    'signals': {'Power': {'desired': 'On', 'members': 150, 'notDesired': 2}}}
+
+from array import array
+
+DEFAULT_AGGREGATION_DELAY = 0.2
+
+param_aggregationDelay = Parameter({'title': 'Aggregation delay (secs)', 'desc': 'How long member changes are allowed to settle before the aggregate signals are emitted (default 0.2, 0 for immediately)',
+                                    'schema': {'type': 'number', 'hint': str(DEFAULT_AGGREGATION_DELAY)}})
+
+EMPTY_SET = {}
+
+# the level assumed for members that have never been seen
+UNSEEN_LEVEL = 99
+
+# (for the level array, members whose status is suppressed hold a level that never wins)
+EXCLUDED_LEVEL = -1
+
+def getAggregationDelay():
+  delay = lookup_parameter('aggregationDelay')
+
+  return DEFAULT_AGGREGATION_DELAY if delay == None else delay
+
+class Debouncer:
+  '''Collapses a burst of requests into a single call once the aggregation delay has passed'''
+
+  def __init__(self, func):
+    self._func = func
+    self._pending = False
+
+  def request(self):
+    delay = getAggregationDelay()
+
+    if delay <= 0:
+      self._func()
+
+    elif not self._pending:
+      self._pending = True
+      call_safe(self._fire, delay)
+
+  def _fire(self):
+    self._pending = False
+    self._func()
+
+class MemberSlots:
+  '''Allocates array slots to member names in configured order'''
+
+  def __init__(self):
+    self._slots = {}
+    self.names = []
+
+  def add(self, name):
+    slot = self._slots.get(name)
+    if slot == None:
+      slot = len(self.names)
+      self._slots[name] = slot
+      self.names.append(name)
+
+    return slot
+
+  def __getitem__(self, name):
+    return self._slots[name]
+
+  def __len__(self):
+    return len(self.names)
+
+class SignalAggregate:
+  '''Aggregates members' state signals (e.g. 'Power') into a resultant signal with 'Partially ...' forms'''
+
+  def __init__(self, signalName, localDesiredSignal, localResultantSignal):
+    self.signalName = signalName
+    self._resultantSignal = localResultantSignal
+    self._slots = MemberSlots()
+
+    # states are interned into small codes so they fit in a compact array
+    self._codes = {None: 0}
+    self._states = array('i')
+
+    self._desired = localDesiredSignal.getArg()
+    self._desiredCode = self._code(self._desired)
+
+    self._emitter = Debouncer(self._emit)
+
+    localDesiredSignal.addEmitHandler(self.desiredChanged)
+
+  def _code(self, state):
+    code = self._codes.get(state)
+    if code == None:
+      code = len(self._codes)
+      self._codes[state] = code
+
+    return code
+
+  def addMember(self, name, state):
+    slot = self._slots.add(name)
+    if slot == len(self._states):
+      self._states.append(self._code(state))
+    else:
+      self._states[slot] = self._code(state)
+
+  def memberChanged(self, name, state):
+    self._states[self._slots[name]] = self._code(state)
+
+    self._emitter.request()
+
+  def desiredChanged(self, desired):
+    self._desired = desired
+    self._desiredCode = self._code(desired)
+
+    self._emitter.request()
+
+  def notDesiredCount(self):
+    return len(self._states) - self._states.count(self._desiredCode)
+
+  def snapshot(self):
+    return {'desired': self._desired, 'members': len(self._states), 'notDesired': self.notDesiredCount()}
+
+  def _emit(self):
+    desired = self._desired
+
+    self._resultantSignal.emitIfDifferent('Partially %s' % desired if self.notDesiredCount() > 0 else desired)
+
+    emitSnapshot()
+
+class StatusAggregate:
+  '''Aggregates members' 'Status' signals, taking suppression into account'''
+
+  def __init__(self, selfStatusSignal):
+    self._statusSignal = selfStatusSignal
+    self._slots = MemberSlots()
+
+    self._statuses = []           # raw member status by slot
+    self._suppressed = array('b') # suppression flag by slot
+    self._levels = array('i')     # effective level by slot
+    self._suppressing = array('b') # whether the suppression is actively hiding a problem, by slot
+    self._msgs = {}               # message fragments of non-OK members by slot
+
+    self._emitter = Debouncer(self._emit)
+
+  def addMember(self, name, status, suppressed):
+    slot = self._slots.add(name)
+    if slot == len(self._statuses):
+      self._statuses.append(None)
+      self._suppressed.append(0)
+      self._levels.append(0)
+      self._suppressing.append(0)
+
+    self._statuses[slot] = status
+    self._suppressed[slot] = 1 if suppressed else 0
+    self._apply(slot)
+
+  def statusChanged(self, name, status):
+    slot = self._slots[name]
+    self._statuses[slot] = status
+    self._apply(slot)
+
+    self._emitter.request()
+
+  def suppressedChanged(self, name, suppressed):
+    slot = self._slots[name]
+    self._suppressed[slot] = 1 if suppressed else 0
+    self._apply(slot)
+
+    self._emitter.request()
+
+  def _apply(self, slot):
+    status = self._statuses[slot] or EMPTY_SET
+
+    level = status.get('level')
+
+    if self._suppressed[slot] and (level == None or level > 0):
+      # suppressed members never raise the level
+      self._levels[slot] = EXCLUDED_LEVEL
+      self._suppressing[slot] = 1
+      self._msgs.pop(slot, None)
+      return
+
+    if level == None: # as opposed to the value '0'
+      level = UNSEEN_LEVEL
+
+    self._levels[slot] = level
+    self._suppressing[slot] = 0
+
+    if level > 0:
+      name = self._slots.names[slot]
+      message = status.get('message') or 'Has never been seen'
+      self._msgs[slot] = name if _isBlank(message) else '%s: [%s]' % (name, message)
+
+    else:
+      self._msgs.pop(slot, None)
+
+  def level(self):
+    return max(0, max(self._levels)) if len(self._levels) > 0 else 0
+
+  def suppressingCount(self):
+    return self._suppressing.count(1)
+
+  def message(self):
+    msgs = self._msgs
+    message = ', '.join([msgs[slot] for slot in sorted(msgs)]) if len(msgs) > 0 else 'OK'
+
+    if self.suppressingCount() > 0:
+      message = '%s (*)' % message
+
+    return message
+
+  def snapshot(self):
+    levels = {}
+    for level in self._levels:
+      if level != EXCLUDED_LEVEL:
+        key = str(level)
+        levels[key] = levels.get(key, 0) + 1
+
+    return {'level': self.level(), 'levels': levels, 'suppressed': self.suppressingCount()}
+
+  def _emit(self):
+    self._statusSignal.emitIfDifferent({'level': self.level(), 'message': self.message()})
+
+    emitSnapshot()
+
+
+# <!--- aggregate registry and snapshot
+
+signalAggregates = {} # by signal name
+
+statusAggregate = None
+
+def getSignalAggregate(signalName, localDesiredSignal, localResultantSignal):
+  aggregate = signalAggregates.get(signalName)
+  if aggregate == None:
+    aggregate = SignalAggregate(signalName, localDesiredSignal, localResultantSignal)
+    signalAggregates[signalName] = aggregate
+
+    initSnapshotSignal()
+
+  return aggregate
+
+def getStatusAggregate(selfStatusSignal):
+  global statusAggregate
+
+  if statusAggregate == None:
+    statusAggregate = StatusAggregate(selfStatusSignal)
+
+    initSnapshotSignal()
+
+  return statusAggregate
+
+def getAggregateSnapshot():
+  '''Returns a read-only copy of the current aggregate state'''
+  members = set()
+  signals = {}
+  for signalName, aggregate in signalAggregates.items():
+    members.update(aggregate._slots.names)
+    signals[signalName] = aggregate.snapshot()
+
+  snapshot = {'signals': signals}
+
+  if statusAggregate != None:
+    members.update(statusAggregate._slots.names)
+    snapshot['status'] = statusAggregate.snapshot()
+
+  snapshot['members'] = len(members)
+
+  return snapshot
+
+SNAPSHOT_SCHEMA = {'type': 'object', 'properties': {
+                     'members': {'type': 'integer', 'order': 1},
+                     'status': {'type': 'object', 'order': 2, 'properties': {
+                       'level': {'type': 'integer', 'order': 1},
+                       'suppressed': {'type': 'integer', 'order': 2}}}
+                  }}
+
+snapshotSignal = None
+
+def initSnapshotSignal():
+  global snapshotSignal
+
+  if snapshotSignal == None:
+    snapshotSignal = Event('Aggregate Snapshot', {'title': 'Aggregate snapshot (read-only)', 'group': '(advanced)', 'order': 9999+next_seq(), 'schema': SNAPSHOT_SCHEMA})
+
+def emitSnapshot():
+  if snapshotSignal != None:
+    snapshotSignal.emitIfDifferent(getAggregateSnapshot())
+
+# aggregate registry and snapshot ---!>
+
+def _isBlank(s):
+  return s == None or len(s.strip()) == 0
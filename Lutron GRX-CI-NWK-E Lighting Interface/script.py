@@ -25,6 +25,13 @@ param_Port = Parameter({'schema': {'type': 'integer', 'hint': '(default %s)' % D
 DEFAULT_LOGIN = 'nwk'
 param_Login = Parameter({'schema': {'type': 'string', 'hint': '(default "%s")' % DEFAULT_LOGIN}})
 
+param_StatusTracking = Parameter({'title': 'Status tracking', 'desc': 'Push-first relies on the monitoring feed (DIP6 and DIP7 ON) and only polls stale values or after a reconnect, Polling polls every 60s',
+                                   'schema': {'type': 'string', 'enum': ['Polling', 'Push-first'], 'hint': '(default Polling)'}})
+
+DEFAULT_MAX_STATUS_AGE = 300 # (secs)
+param_MaxStatusAge = Parameter({'title': 'Max. status age (secs)', 'desc': 'Push-first only, scene status not confirmed within this time is polled',
+                                'schema': {'type': 'integer', 'hint': '(default %s)' % DEFAULT_MAX_STATUS_AGE}})
+
 param_Labelling = Parameter({'schema': {'type': 'array', 'items': {'type': 'object', 'properties': {
           'num':  {'type': 'integer', 'order': 1},
           'name': {'type': 'string', 'order': 2}
@@ -69,7 +76,7 @@ def poll():
   RequestVersion.call()
   RequestSceneStatus.call()
   
-timer_poller = Timer(poll, 60, 5, stopped=True)
+timer_poller = Timer(poll, 60, 5, stopped=True) # ('Polling' status tracking)
 
 SCENES = { '0': 0, '1': 1,  '2': 2,  '3': 3,  '4': 4,
                    '5': 5,  '6': 6,  '7': 7,  '8': 8,
@@ -82,25 +89,29 @@ SCENES_REV = dict([(SCENES[x], x) for x in SCENES])
 # REQUEST SCENE status
 @local_action({'group': 'Scene Status', 'order': next_seq()})
 def RequestSceneStatus():
-  def handleResp(parts):
-    # ~:ss [S1][S2][S3][S4][S5][S6][S7][S8]
-    # [Sx]: scene currently selected on Control Unit at address x
-    # e.g ~:ss 1AMMMMMM  means: - Control Unit at address 1 is in scene 1, 
-    #                           - Control Unit at address 2 is in scene 10,
-    #                           - Control Units at addresses 3 to 8 are missing (M)
-    for i, code in enumerate(parts[1]):
-      # e.g. i=0, value=1
-      if code == 'M': # missing, so ignore
-        continue
-        
-      initAndSetControlUnit(i+1, SCENES[code])
+  tcp.send(':G')
+  
+def handleSceneStatus(parts):
+  # ~:ss [S1][S2][S3][S4][S5][S6][S7][S8]
+  # [Sx]: scene currently selected on Control Unit at address x
+  # e.g ~:ss 1AMMMMMM  means: - Control Unit at address 1 is in scene 1, 
+  #                           - Control Unit at address 2 is in scene 10,
+  #                           - Control Units at addresses 3 to 8 are missing (M)
+  now = system_clock()
+  
+  for i, code in enumerate(parts[1]):
+    # e.g. i=0, value=1
+    if code == 'M': # missing, so ignore
+      continue
       
-    lastReceive[0] = system_clock() # to indicate its alive
+    initAndSetControlUnit(i+1, SCENES[code])
     
-  _callbacks['~:ss'] = handleResp
-  _callbacks[':ss'] = handleResp   # async feedback when scenes are changed outside nodel
+  statusConfirmed(now)
+    
+  lastReceive[0] = now # to indicate its alive
   
-  tcp.send(':G')
+_callbacks['~:ss'] = handleSceneStatus
+_callbacks[':ss'] = handleSceneStatus   # async feedback when scenes are changed outside nodel
   
 def initAndSetControlUnit(i, scene):
   controlUnitSceneName = 'ControlUnit %s Scene' % i
@@ -128,6 +139,8 @@ def initAndSetControlUnit(i, scene):
                                                                    'schema': {'type': 'boolean'}})
       initControlUnitScene(cuAction, i, s, group) # need as separate method because of variable capture issues
       
+    Event('ControlUnit %s Scene Confirmed' % i, {'group': group, 'title': 'Last confirmed', 'order': next_seq(), 'schema': {'type': 'string'}})
+      
   # emit the main one
   controlUnitSignal.emit(scene)
   
@@ -135,6 +148,8 @@ def initAndSetControlUnit(i, scene):
   for s in range(17):
     lookup_local_event('ControlUnit %s Scene %s' % (i, s)).emitIfDifferent(scene == s)
     
+  lookup_local_event('ControlUnit %s Scene Confirmed' % i).emit(str(date_now()))
+    
 def initControlUnitScene(cuAction, cu, scene, group):
   Action('ControlUnit %s Scene %s' % (cu, scene), 
          lambda ignore: cuAction.call(scene),
@@ -169,6 +184,51 @@ def SelectScene(cu, scene): # NOT EXPOSING AS ACTION
 # -->
 
 
+# <!-- status tracking
+
+# In 'Push-first' mode the scene status is kept up to date by the monitoring feed (':ss ...' whenever a scene
+# changes) and is only polled after a (re)connect or once it hasn't been confirmed for the max. status age
+# (which also keeps the connection checked while things are quiet).
+
+POLL_RETRY = 30 # (secs) before re-polling when a poll went unanswered
+
+_lastConfirmed = [0] # when the scene status was last confirmed (system_clock)
+_lastPoll = [0]
+
+def isPushFirst():
+  return param_StatusTracking == 'Push-first'
+  
+def getMaxStatusAge():
+  return param_MaxStatusAge or DEFAULT_MAX_STATUS_AGE
+
+def statusConfirmed(now):
+  _lastConfirmed[0] = now
+  
+def resetStatusTracking():
+  # (nothing has been confirmed in a new session)
+  _lastConfirmed[0] = 0
+  _lastPoll[0] = 0
+
+def checkStatusAge():
+  now = system_clock()
+  
+  if now - _lastPoll[0] < POLL_RETRY*1000:
+    return
+  
+  if _lastConfirmed[0] == 0 and _lastPoll[0] == 0:
+    # first poll of the session (the version only needs to be requested once)
+    RequestVersion.call()
+    
+  if _lastConfirmed[0] == 0 or now - _lastConfirmed[0] > getMaxStatusAge()*1000:
+    log(1, 'scene status is stale; polling')
+    _lastPoll[0] = now
+    RequestSceneStatus.call()
+    
+timer_statusAge = Timer(checkStatusAge, 5, 2, stopped=True) # ('Push-first' status tracking)
+
+# -->
+
+
 # <!-- TCP
 
 def tcp_connected():
@@ -178,6 +238,7 @@ def tcp_disconnected():
   console.warn('tcp_disconnected')
   
   timer_poller.stop()
+  timer_statusAge.stop()
   
   tcp.setReceiveDelimeters(' ') # use space to trap login
   tcp.drop() # start new session
@@ -198,9 +259,15 @@ def tcp_received(data):
   local_event_TCPReceived.emit(data)
   
   if data == 'login:':
-    timer_poller.start()
     tcp.setReceiveDelimeters('\r\n')
     tcp.send(param_Login or DEFAULT_LOGIN)
+    
+    if isPushFirst():
+      resetStatusTracking()
+      timer_statusAge.start()
+      
+    else:
+      timer_poller.start()
   
   else: # assume a callback
     parts = data.split() # e.g. ['~:v', '5', '3', '0', '1', 'OK'] 
@@ -253,7 +320,10 @@ def statusCheck():
   diff = (system_clock() - lastReceive[0])/1000.0 # (in secs)
   now = date_now()
   
-  if diff > status_check_interval+15:
+  # (when push-first, quiet periods can last up to the max. status age)
+  allowed = max(status_check_interval, getMaxStatusAge() if isPushFirst() else 0)
+  
+  if diff > allowed+15:
     previousContactValue = local_event_LastContactDetect.getArg()
     
     if previousContactValue == None:
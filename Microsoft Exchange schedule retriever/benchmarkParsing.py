@@ -0,0 +1,259 @@
+'''Times this recipe's streamed FindItem parsing against the previous DOM parser, with peak memory.'''
+
+# Runs under CPython 2.7 (script.py is Jython 2.7 code), outside Nodel, e.g.
+#
+#   python benchmarkParsing.py                      1k and 10k items
+#   python benchmarkParsing.py --items 1000 50000 --repeat 5
+#
+# A synthetic FindItem response of each size is written to a temporary file (items shaped like the ones in
+# examples.py, some subjects carrying astral characters) and parsed, each parser in a fresh process so the
+# peak resident memory it adds is its own:
+#
+#   stream    iter_query_response() reading the file in 8 KB reads, the way post_ews() hands over the
+#             connection, keeping every item as the callers do
+#   previous  the DOM parser it replaced, given the whole response as one (unicode) string, the way
+#             get_url() handed it over
+#
+# Both must produce the same items. Items per second and the peak memory added while parsing (KB, from
+# ru_maxrss) are printed for each.
+#
+# script.py is loaded with a minimal stand-in for the toolkit globals it touches when loading (Parameters,
+# LocalEvents, Timer) and for the two Java classes post_ews() uses (not called here).
+
+import argparse
+import calendar
+import hashlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'script.py')
+
+READ_SIZE = 8192
+
+class StandInEvent:
+  def __init__(self, metadata=None):
+    self.arg = None
+
+  def emit(self, arg=None):
+    self.arg = arg
+
+  emitIfDifferent = emit
+
+  def getArg(self):
+    return self.arg
+
+class StandInConsole:
+  def log(self, message):
+    pass
+
+  info = warn = error = log
+
+class StandInTimer:
+  def __init__(self, *args, **kwargs):
+    pass
+
+class StandInInstant:
+  def __init__(self, millis):
+    self.millis = millis
+
+  def getMillis(self):
+    return self.millis
+
+def parseDate(s):
+  # (only the Z-suffixed form EWS uses, e.g. 2017-02-02T05:30:00Z)
+  return StandInInstant(calendar.timegm((int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13]), int(s[14:16]), int(s[17:19]))) * 1000)
+
+def loadRecipe():
+  for name in ['java', 'java.net', 'org', 'org.python', 'org.python.core', 'org.python.core.util']:
+    sys.modules.setdefault(name, types.ModuleType(name))
+  sys.modules['java.net'].URL = None
+  sys.modules['org.python.core.util'].FileUtil = None
+
+  ns = {'__name__': 'recipe', 'Parameter': lambda metadata: None, 'LocalEvent': StandInEvent, 'Timer': StandInTimer,
+        'console': StandInConsole(), 'next_seq': lambda: 0, 'date_parse': parseDate, 'date_instant': StandInInstant}
+  exec(compile(open(SCRIPT).read(), SCRIPT, 'exec'), ns)
+  return ns
+
+ITEM_XML = u'''<t:CalendarItem>
+  <t:ItemId Id="AAMkAGVkOTNmM2I5LTkzM2EtNGE2NC05N2JjLTFhOTU2ZmJkOTIzOQFRAAgI1Er%08d" ChangeKey="DwAAABYAAACKlTYVK0L1S4NbyOQ4sSbQAALVH0l1"/>
+  <t:Subject>%s</t:Subject>
+  <t:Sensitivity>Normal</t:Sensitivity>
+  <t:HasAttachments>false</t:HasAttachments>
+  <t:IsAssociated>false</t:IsAssociated>
+  <t:Start>2017-02-%02dT%02d:00:00Z</t:Start>
+  <t:End>2017-02-%02dT%02d:45:00Z</t:End>
+  <t:LegacyFreeBusyStatus>Busy</t:LegacyFreeBusyStatus>
+  <t:Location>Room %s</t:Location>
+  <t:CalendarItemType>%s</t:CalendarItemType>
+  <t:Organizer>
+    <t:Mailbox>
+      <t:Name>Organiser %s</t:Name>
+      <t:EmailAddress>/O=EXCHANGELABS/OU=EXCHANGE ADMINISTRATIVE GROUP (FYDIBOHF23SPDLT)/CN=RECIPIENTS/CN=ORGANISER-%s</t:EmailAddress>
+      <t:RoutingType>EX</t:RoutingType>
+      <t:MailboxType>OneOff</t:MailboxType>
+    </t:Mailbox>
+  </t:Organizer>
+</t:CalendarItem>
+'''
+
+RESPONSE_XML = u'''<?xml version="1.0" encoding="utf-8"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+  <s:Header>
+    <h:ServerVersionInfo MajorVersion="15" MinorVersion="1" MajorBuildNumber="860" MinorBuildNumber="27" Version="V2016_10_10" xmlns:h="http://schemas.microsoft.com/exchange/services/2006/types"/>
+  </s:Header>
+  <s:Body>
+    <m:FindItemResponse xmlns:m="http://schemas.microsoft.com/exchange/services/2006/messages" xmlns:t="http://schemas.microsoft.com/exchange/services/2006/types">
+      <m:ResponseMessages>
+        <m:FindItemResponseMessage ResponseClass="Success">
+          <m:ResponseCode>NoError</m:ResponseCode>
+          <m:RootFolder TotalItemsInView="%s" IncludesLastItemInRange="true">
+            <t:Items>
+%s            </t:Items>
+          </m:RootFolder>
+        </m:FindItemResponseMessage>
+      </m:ResponseMessages>
+    </m:FindItemResponse>
+  </s:Body>
+</s:Envelope>
+'''
+
+def buildResponse(count):
+  '''The response as UTF-8 bytes'''
+  items = []
+  for i in range(count):
+    subject = u'Meeting %s \U0001f4c5 {Power: On}' % i if i % 10 == 0 else u'Meeting %s' % i
+    day, hour = 1 + (i // 24) % 28, i % 24
+    items.append(ITEM_XML % (i, subject, day, hour, day, hour, i % 40, ['Single', 'Occurrence', 'Exception'][i % 3], i % 50, i % 50))
+
+  return (RESPONSE_XML % (count, u''.join(items))).encode('utf-8')
+
+def previousParse(ns, responseXML):
+  '''The DOM parser the streamed one replaced (less its paging info)'''
+  getElement, getElementText, tryGetElement, tryGetElementText, getAttrib, expandPath = [ns[name] for name in
+      ['getElement', 'getElementText', 'tryGetElement', 'tryGetElementText', 'getAttrib', 'expandPath']]
+
+  def parseCalendarItem(item, calendarIndex):
+    itemIDElement = getElement(item, 'type:ItemId')
+    organiserElement = tryGetElement(item, 'type:Organizer')
+    organiserName = tryGetElementText(getElement(organiserElement, 'type:Mailbox'), 'type:Name', default='') if organiserElement != None else ''
+
+    return { 'id': getAttrib(itemIDElement, 'Id'),
+             'type': tryGetElementText(item, 'type:CalendarItemType', default=''),
+             'calendar': calendarIndex,
+             'subject': tryGetElementText(item, 'type:Subject', default=''),
+             'sensitivity': tryGetElementText(item, 'type:Sensitivity', default=''),
+             'start': StandInInstant(parseDate(getElementText(item, 'type:Start')).getMillis()),
+             'end': StandInInstant(parseDate(getElementText(item, 'type:End')).getMillis()),
+             'location': tryGetElementText(item, 'type:Location', default=''),
+             'organiser': organiserName }
+
+  root = ns['ET'].fromstring(responseXML.encode('utf-8'))
+  body = getElement(root, 'env:Body')
+
+  calendarItems = list()
+
+  for responseMessage in body[0]:
+    for responseIndex, findItemResponseMessage in enumerate(responseMessage):
+      if getElementText(findItemResponseMessage, 'message:ResponseCode') != 'NoError':
+        raise Exception("Response code was not 'NoError'")
+
+      for item in getElement(getElement(findItemResponseMessage, 'message:RootFolder'), 'type:Items'):
+        if item.tag == expandPath('type:CalendarItem'):
+          calendarItems.append(parseCalendarItem(item, responseIndex))
+
+  return calendarItems
+
+def digest(items):
+  h = hashlib.md5()
+  for item in items:
+    h.update(repr(sorted([(key, value.getMillis() if isinstance(value, StandInInstant) else value) for key, value in item.items()])).encode('utf-8'))
+  return h.hexdigest()
+
+class ChunkedReader:
+  '''The response read off a "connection" no more than READ_SIZE bytes at a time'''
+
+  def __init__(self, path):
+    self._file = io.open(path, 'rb')
+
+  def read(self, size=-1):
+    return self._file.read(READ_SIZE if size < 0 else min(size, READ_SIZE))
+
+  def close(self):
+    self._file.close()
+
+def runChild(parser, path, repeat):
+  ns = loadRecipe()
+
+  bestSecs = None
+  for i in range(repeat):
+    # (the first round's allocation sets the peak, later rounds only time)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if i == 0 else None
+
+    start = time.time()
+    if parser == 'stream':
+      items = []
+      stream = ChunkedReader(path)
+      try:
+        for item in ns['iter_query_response'](stream):
+          items.append(item)
+      finally:
+        stream.close()
+    else:
+      with io.open(path, 'rb') as f:
+        items = previousParse(ns, f.read().decode('utf-8'))
+    secs = time.time() - start
+
+    if i == 0:
+      peakKB = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+      result = digest(items)
+
+    bestSecs = secs if bestSecs == None else min(bestSecs, secs)
+    del items
+
+  print(json.dumps({'secs': bestSecs, 'peakKB': peakKB, 'digest': result}))
+
+def main():
+  parser = argparse.ArgumentParser(description='Time streamed FindItem parsing against the previous DOM parser')
+  parser.add_argument('--items', type=int, nargs='+', default=[1000, 10000], help='response sizes (items)')
+  parser.add_argument('--repeat', type=int, default=3, help='best of, for the timings')
+  parser.add_argument('--child', nargs=2, metavar=('PARSER', 'PATH'), help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.child:
+    runChild(args.child[0], args.child[1], args.repeat)
+    return
+
+  for count in args.items:
+    data = buildResponse(count)
+
+    fd, path = tempfile.mkstemp(suffix='.xml')
+    try:
+      with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+
+      results = {}
+      for name in ['stream', 'previous']:
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--repeat', str(args.repeat), '--child', name, path])
+        results[name] = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+    finally:
+      os.remove(path)
+
+    print('%s items (%s KB response):' % (count, len(data) // 1024))
+    for name in ['stream', 'previous']:
+      result = results[name]
+      print('  %-8s %8.0f items/s  peak +%6s KB' % (name, count / result['secs'], result['peakKB']))
+
+    if results['stream']['digest'] != results['previous']['digest']:
+      print('  MISMATCH: the parsers produced different items')
+      sys.exit(1)
+
+if __name__ == '__main__':
+  main()
@@ -11,9 +11,12 @@ param_connector = Parameter({'title': 'Connector', 'schema': {'type': 'object',
 
 param_calendars = Parameter({'title': 'Calendars', 'schema': {'type': 'array', 'items': { 'type': 'object', 'properties': {
         'name': {'type': 'string', 'order': 1},
-        'folderName': {'title': 'Folder name (if not default calendar)', 'type': 'string', 'desc': 'If default calendar is not being used, the exact name of the folder holding the group of calendars.', 'order': 2}
+        'folderName': {'title': 'Folder name (if not default calendar)', 'type': 'string', 'desc': 'If default calendar is not being used, the exact name of the folder holding the group of calendars.', 'order': 2},
+        'address': {'title': 'Mailbox address (if not the connector\'s)', 'type': 'string', 'hint': 'e.g. room101@company.com', 'desc': 'For polling many (room) mailboxes from one node; the default calendar of this mailbox is used.', 'order': 3}
   }}}})
 
+param_incrementalSync = Parameter({'title': 'Incremental sync', 'desc': 'Uses EWS SyncFolderItems to only download changed items (the full 7-day window is still refreshed hourly or whenever recurring items change)', 'schema': {'type': 'boolean'}})
+
 local_event_RawItems = LocalEvent({'title': 'Raw Items', 'group': 'Raw', 'schema': {'type': 'array', 'items': {
         'type': 'object', 'properties': {
           'subject': {'type': 'string', 'order': 1},
@@ -45,6 +48,9 @@ ITEM_SCHEMA = { 'type': 'object', 'title': '...', 'properties': {
 import xml.etree.ElementTree as ET
 import base64
 
+from java.net import URL                      # for streamed responses
+from org.python.core.util import FileUtil     # (wraps a Java stream as a Python file)
+
 # (uses a safe default)
 connector = { 'ewsEndPoint': DEFAULT_CONN_ENDPOINT,
               'username': None,
@@ -59,6 +65,9 @@ resolvedFolderElements = {}
 # DistinguishedFolderId element (including mailbox info if relevant)
 distinguishedFolderIdElement = None
 
+# - DistinguishedFolderId elements of other mailboxes (by address)
+mailboxFolderElements = {}
+
 def main():
   username, password = None, None
 
@@ -80,7 +89,7 @@ def main():
     if isEmpty(param_calendars):
       raise Exception('At least one calendar must be configured.')
 
-    # ... and no more than one default calendar is configured
+    # ... and no more than one default calendar is configured (per mailbox)
     # ... and the folder name is not configured twice
     calendarMap = set()
 
@@ -89,8 +98,15 @@ def main():
         raise Exception('A calendar must have a unique name given to it')
 
       folderName = calendarParam.get('folderName')
+      address = calendarParam.get('address')
 
-      if isEmpty(folderName):
+      if not isBlank(address):
+        if not isEmpty(folderName):
+          raise Exception('Only the default calendar of other mailboxes can be used - "%s"' % address)
+
+        folderName = '<DEFAULT %s>' % address.strip().lower()
+
+      elif isEmpty(folderName):
         folderName = '<DEFAULT>'
 
       # raise an error if the calendar is already in the set
@@ -115,15 +131,13 @@ def main():
 
   # pre-construct some of the re-useable XML elements
   global distinguishedFolderIdElement
-  distinguishedFolderIdElement = ET.fromstring('<DistinguishedFolderId Id="calendar" xmlns="http://schemas.microsoft.com/exchange/services/2006/types"></DistinguishedFolderId>')
-
-  # update mailbox and inject if present
-  if not isBlank(connector['address']):
-    mailboxElement = ET.fromstring('<Mailbox xmlns="http://schemas.microsoft.com/exchange/services/2006/types"><EmailAddress>SMTP_ADDRESS_HERE</EmailAddress></Mailbox>')
-    searchElement(mailboxElement, 'type:EmailAddress').text = connector['address']
-
-    distinguishedFolderIdElement.append(mailboxElement)
+  distinguishedFolderIdElement = prepareDistinguishedFolderIdElement(connector['address'])
 
+  # (and for any other mailboxes)
+  for calendarParam in param_calendars:
+    address = calendarParam.get('address')
+    if not isBlank(address):
+      mailboxFolderElements[address] = prepareDistinguishedFolderIdElement(address)
 
   # create signals for each calendar
   for calendarParam in param_calendars:
@@ -144,7 +158,13 @@ def local_action_PollItems(arg=None):
   try:
     now = date_now()
 
-    rawBookings = query_ews(now, now.plusDays(7))
+    # calendars that could not be polled this time (by index)
+    errors = {}
+
+    if param_incrementalSync:
+      rawBookings = query_ews_incremental(now, now.plusDays(7), errors)
+    else:
+      rawBookings = query_ews(now, now.plusDays(7), errors)
   
     trace('Raw:')
     for raw in rawBookings:
@@ -189,24 +209,115 @@ def local_action_PollItems(arg=None):
 
       bookings.append(booking)
 
-    # emit clean bookings
+    # emit clean bookings (one mailbox failing does not hold up the others)
     for index, info in enumerate(param_calendars):
       trace('index:%s, info:%s' % (index, info))
+      
+      if index in errors:
+        console.warn('Failed to poll calendar "%s"; error was [%s]' % (info['name'], errors[index]))
+        continue
     
       lookup_local_event('Calendar %s Items' % info['name']).emitIfDifferent(bookingsByCalendar.get(index) or [])
       
-    # indicate a successful poll cycle
-    lastSuccess[0] = system_clock()
+    # indicate a successful poll cycle (if at least one calendar was polled)
+    if len(errors) < len(param_calendars):
+      lastSuccess[0] = system_clock()
 
   except:
     eType, eValue, eTraceback = sys.exc_info()
     
     console.warn('Failed to poll items; exception was [%s]' % eValue)
   
-def query_ews(start, end):
-  '''Date-range query of calendar items. Returns false if calendar resolution has not been completed yet.'''
+def query_ews(start, end, errors=None):
+  '''Date-range query of calendar items. Failures of individual calendars go in 'errors' (by index) if given.'''
+  folderElements = resolveFolderElements()
+  
+  items = list()
+
+  # many mailboxes' calendars are batched into each request (the response holds a message for each)
+  for offset in range(0, len(folderElements), MAX_FOLDERS_PER_REQUEST):
+    batch = folderElements[offset:offset+MAX_FOLDERS_PER_REQUEST]
+    
+    request = prepareQueryRequest(start, end, resolvedFolders=batch, maxEntries=PAGE_SIZE)
+    
+    rootFolders = list()
+    batchErrors = {}
+    
+    batchItems = list()
+    
+    response = post_ews(request)
+    try:
+      for item in iter_query_response(response, rootFolders, batchErrors if errors != None else None):
+        item['calendar'] += offset
+        batchItems.append(item)
+        
+    finally:
+      response.close()
+      
+    for index in batchErrors:
+      errors[offset + index] = batchErrors[index]
+    
+    # follow up on any folders that were only partially returned
+    for rootFolder in rootFolders:
+      if not rootFolder['includesLastItemInRange']:
+        index = offset + rootFolder['calendar']
+        
+        folderItems = [item for item in batchItems if item['calendar'] == index]
+        
+        batchItems = [item for item in batchItems if item['calendar'] != index] + query_ews_folder(start, end, folderElements[index], index, folderItems)
+        
+    items.extend(batchItems)
+      
+  return items
+
+def query_ews_folder(start, end, folderElement, calendarIndex, items=None):
+  '''Date-range query of a single calendar folder, following "pages" by moving the start of the view along'''
+  items = list(items or [])
+  
+  seen = set([item['id'] for item in items])
+  
+  # (the view cannot be offset so the next "page" starts at the start of the last item seen)
+  cursor = items[-1]['start'] if len(items) > 0 else start
+  
+  while True:
+    request = prepareQueryRequest(cursor, end, resolvedFolders=[folderElement], maxEntries=PAGE_SIZE)
+    
+    rootFolders = list()
+    
+    pageItems = 0
+    newItems = 0
+    lastStart = None
+    
+    response = post_ews(request)
+    try:
+      for item in iter_query_response(response, rootFolders):
+        pageItems += 1
+        lastStart = item['start']
+        
+        if item['id'] not in seen:
+          item['calendar'] = calendarIndex
+          items.append(item)
+          seen.add(item['id'])
+          newItems += 1
+          
+    finally:
+      response.close()
+        
+    if len(rootFolders) == 0 or rootFolders[0]['includesLastItemInRange'] or pageItems == 0:
+      break
+    
+    if newItems == 0:
+      console.warn('More than %s items start at %s in calendar %s; some may be missing' % (PAGE_SIZE, cursor, calendarIndex))
+      break
 
-  # prepare named folder elements if in use
+    cursor = lastStart
+    
+    trace('Calendar %s: following next page from %s' % (calendarIndex, cursor))
+    
+  return items
+  
+def resolveFolderElements():
+  '''Returns the folder elements of all the calendars (by index)'''
   folderElements = list()
   for calendar in param_calendars or '':
     folderName = calendar['folderName']
@@ -220,103 +331,334 @@ def query_ews(start, end):
       folderElements.append(folderElement)
 
     else:
-      # use distinguished folder
-      folderElements.append(distinguishedFolderIdElement)
+      # use distinguished folder (of other mailbox if specified)
+      address = calendar.get('address')
+      folderElements.append(distinguishedFolderIdElement if isBlank(address) else mailboxFolderElements[address])
+      
+  return folderElements
+  
+# (secs)
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
 
-  request = prepareQueryRequest(start, end, resolvedFolders=folderElements)
+def post_ews(request):
+  '''Posts a request, returning the response as a (UTF-8) file-like stream read as it arrives. The caller closes it.'''
   xmlRequest = ET.tostring(request)
   
   trace('Requesting... request:%s' % xmlRequest)
   
-  response = get_url(connector['ewsEndPoint'],
-                       username=connector['username'],
-                       password=connector['password'],
-                       contentType='text/xml',
-                       post=xmlRequest)
+  connection = URL(connector['ewsEndPoint']).openConnection()
+  connection.setConnectTimeout(CONNECT_TIMEOUT*1000)
+  connection.setReadTimeout(READ_TIMEOUT*1000)
+  connection.setRequestMethod('POST')
+  connection.setDoOutput(True)
+  connection.setRequestProperty('Content-Type', 'text/xml; charset=utf-8')
   
-  trace('Got response. data:%s' % response)
+  if not isBlank(connector['username']):
+    credentials = '%s:%s' % (connector['username'], connector['password'] or '')
+    connection.setRequestProperty('Authorization', 'Basic %s' % base64.b64encode(credentials.encode('utf-8')))
   
-  warnings = list()
+  out = connection.getOutputStream()
+  try:
+    out.write(xmlRequest)
+  finally:
+    out.close()
+    
+  statusCode = connection.getResponseCode()
   
-  items = parse_query_response(response, warnings)
-  return items
+  if statusCode == 401:
+    # (Basic was refused, e.g. an on-premise server wanting NTLM, which only 'get_url' negotiates, so that
+    #  response is taken whole)
+    connection.disconnect()
+    
+    trace('Basic authentication refused; requesting through get_url instead')
+    
+    return Utf8Reader(get_url(connector['ewsEndPoint'],
+                                username=connector['username'],
+                                password=connector['password'],
+                                contentType='text/xml',
+                                post=xmlRequest))
   
-def parse_query_response(responseXML, warnHandler):
-  '''Parses a response, given the full envelope (as XML string)'''
-  # no way to specify string encoding using this version of Python APIs
-  # so need to pre-encode UTF8. Inner parser only deals with plain ASCII.
-  root = ET.fromstring(responseXML.encode('utf-8'))
+  if statusCode != 200:
+    reason = connection.getResponseMessage()
+    connection.disconnect()
+    raise Exception('EWS request failed - status %s (%s)' % (statusCode, reason))
+  
+  trace('Got response. status:%s, length:%s' % (statusCode, connection.getContentLength()))
+  
+  return FileUtil.wrap(connection.getInputStream())
 
-  # ensure header exists
-  header = getElement(root, 'env:Header')
+def iter_query_response(stream, rootFolders=None, errors=None):
+  '''Yields the calendar items of a FindItem response (a file-like stream) as they are parsed, the full DOM is
+     never built. Paging info by calendar goes in 'rootFolders' and failed response messages (instead of raising)
+     go in 'errors' (by index) if given.'''
+  responseIndex = -1
+  
+  body = None
+  items = None
+  majorResponseTag = None
+  
+  for event, element in ET.iterparse(stream, events=('start', 'end')):
+    tag = element.tag
+    
+    if event == 'start':
+      if body != None and majorResponseTag == None:
+        # (tag can be {m:FindItemResponse}, etc.)
+        majorResponseTag = tag
+        if tag != TAG_FIND_ITEM_RESPONSE:
+          raise DataException('Unexpected major response element - got %s' % tag)
+        
+      elif tag == TAG_FIND_ITEM_RESPONSE_MESSAGE:
+        responseIndex += 1
+        
+        if element.get('ResponseClass') != 'Success':
+          failMessage(DataException("FindItemResponseMessage response class was not 'Success' (was %s)" % element.get('ResponseClass')), responseIndex, errors)
+        
+      elif tag == TAG_ROOT_FOLDER:
+        # paging info
+        if rootFolders != None:
+          rootFolders.append({'calendar': responseIndex,
+                              'includesLastItemInRange': element.get('IncludesLastItemInRange') != 'false'})
+          
+      elif tag == TAG_ITEMS:
+        items = element
+        
+      elif tag == TAG_BODY:
+        body = element
+        
+    # (end events from here)
+        
+    elif tag == TAG_CALENDAR_ITEM:
+      yield parseCalendarItem(element, responseIndex)
+      
+      # drop what has been read
+      if items != None:
+        items.clear()
+      
+    elif tag == TAG_RESPONSE_CODE:
+      if element.text != 'NoError':
+        failMessage(DataException("Response code was not 'NoError' (was %s)" % element.text), responseIndex, errors)
+      
+    elif tag == TAG_ITEMS:
+      element.clear()
+      
+  if body == None:
+    raise DataException('Missing element env:Body')
+  
+  if majorResponseTag == None:
+    raise DataException('Expected a major response with the Body')
 
-  # ensure body exists
-  body = getElement(root, 'env:Body')
+def failMessage(exc, responseIndex, errors):
+  '''Raises unless failures of individual response messages are being collected'''
+  if errors == None:
+    raise exc
+  
+  # (the first error is the most informative)
+  if responseIndex not in errors:
+    errors[responseIndex] = exc
+
+def parseCalendarItem(item, calendarIndex):
+  itemIDElement = item.find(TAG_ITEM_ID)
+  if itemIDElement == None:
+    raise DataException('Missing element type:ItemId')
+  
+  start = item.findtext(TAG_START)
+  end = item.findtext(TAG_END)
+  if start == None or end == None:
+    raise DataException('Missing element type:Start or type:End')
+  
+  organiserName = item.findtext(TAG_ORGANIZER_NAME) or ''
+
+  return { 'id': getAttrib(itemIDElement, 'Id'),
+           'type': item.findtext(TAG_CALENDAR_ITEM_TYPE) or '',
+           'calendar': calendarIndex,
+           'subject': item.findtext(TAG_SUBJECT) or '',
+           'sensitivity': item.findtext(TAG_SENSITIVITY) or '', # TODO: interpret 'Sensitivity'
+           'start': date_instant(date_parse(start).getMillis()), # trick to convert into local timezone for display convenience (instead of GMT)
+           'end': date_instant(date_parse(end).getMillis()), # trick to convert into local timezone for display convenience (instead of GMT)
+           'location': item.findtext(TAG_LOCATION) or '',
+           'organiser': organiserName }
+
+# <--- incremental sync
+
+# Each calendar folder keeps an EWS sync state so only changes are downloaded. Single (non-recurring)
+# items are patched into the folder's cached window directly. Anything to do with recurring items
+# (which are only expanded by a calendar view), including the delete of an item that isn't cached,
+# causes the folder's window to be re-queried.
+
+# the window is re-queried at least this often anyway (so it keeps sliding along)
+FULL_REFRESH_INTERVAL = 60*60 # secs
+
+# (upper limit allowed by EWS)
+MAX_SYNC_CHANGES = 512
+
+class FolderSync:
+  def __init__(self, calendarIndex):
+    self.calendarIndex = calendarIndex
+    self.syncState = None
+    self.itemsByID = {}
+    self.lastFullRefresh = None # (system clock)
+    
+# by calendar index
+folderSyncs = {}
 
-  # get major response part
-  if len(body) <= 0:
-    raise ParseException('Expected a major response with the Body')
+def query_ews_incremental(start, end, errors=None):
+  '''Like "query_ews" but only downloads what has changed since the last call (SyncFolderItems cannot be batched)'''
+  folderElements = resolveFolderElements()
   
-  majorResponseTag = body[0].tag
+  items = list()
   
-  calendarItems = list()
+  for index, folderElement in enumerate(folderElements):
+    try:
+      items.extend(query_ews_incremental_folder(start, end, folderElement, index))
+      
+    except:
+      if errors == None:
+        raise
+      
+      errors[index] = sys.exc_info()[1]
+      
+  return items
 
-  # (tag can be {m:FindItemResponse}, etc.)
-  if majorResponseTag == expandPath('message:FindItemResponse'):
-    findItemResponse = body[0]
+def query_ews_incremental_folder(start, end, folderElement, index):
+  folderSync = folderSyncs.get(index)
+  if folderSync == None:
+    folderSync = FolderSync(index)
+    folderSyncs[index] = folderSync
+    
+  needsRefresh = folderSync.lastFullRefresh == None or (system_clock() - folderSync.lastFullRefresh) > FULL_REFRESH_INTERVAL*1000
+  
+  # sync first, so anything that changes during the window query is picked up next time
+  changes = sync_folder_items(folderElement, folderSync, idOnly=needsRefresh)
+  
+  if not needsRefresh:
+    for kind, change in changes:
+      if kind == 'delete':
+        # (deleting a recurring series gives the ID of its master, which none of the cached occurrences are
+        #  held under, so anything that isn't a known single item needs the window re-queried)
+        cached = folderSync.itemsByID.get(change)
+        if cached == None or cached['type'] != 'Single':
+          needsRefresh = True
+          break
+        
+      elif change['type'] != 'Single':
+        needsRefresh = True
+        break
+
+  if needsRefresh:
+    folderSync.itemsByID = {}
+    for item in query_ews_folder(start, end, folderElement, index):
+      folderSync.itemsByID[item['id']] = item
+      
+    folderSync.lastFullRefresh = system_clock()
+    
+  else:
+    for kind, change in changes:
+      if kind == 'delete':
+        folderSync.itemsByID.pop(change, None)
+        
+      else:
+        change['calendar'] = index
+        folderSync.itemsByID[change['id']] = change
+      
+  # (the cached window may include items that have ended or have since been moved out of it)
+  startMillis, endMillis = start.getMillis(), end.getMillis()
+  
+  folderItems = [item for item in folderSync.itemsByID.values() if item['end'].getMillis() > startMillis and item['start'].getMillis() < endMillis]
+  folderItems.sort(key=lambda item: item['start'].getMillis())
+  
+  return folderItems
 
-    for responseMessage in findItemResponse:
-      for responseIndex, findItemResponseMessage in enumerate(responseMessage):
-        if getAttrib(findItemResponseMessage, "ResponseClass") != "Success":
-          raise DataException("FindItemResponseMessage response class was not 'Success' (was %s)" % ET.tostring(findItemResponseMessage))
+def sync_folder_items(folderElement, folderSync, idOnly=False):
+  '''Follows the sync state of a folder until up-to-date, returning the changes as ('create'|'update', item) or ('delete', itemID)'''
+  changes = list()
+  
+  # (only committed once every page has been read, otherwise a failure part way through would lose changes)
+  syncState = folderSync.syncState
+  
+  while True:
+    request = prepareSyncRequest(folderElement, syncState, idOnly)
+    
+    response = post_ews(request)
+    try:
+      syncState, includesLastItemInRange, pageChanges = parse_sync_response(response, folderSync.calendarIndex, idOnly)
+      
+    finally:
+      response.close()
+    
+    if not idOnly:
+      changes.extend(pageChanges)
+      
+    if includesLastItemInRange:
+      break
+    
+  folderSync.syncState = syncState
+    
+  return changes
 
-        responseCode = getElementText(findItemResponseMessage, 'message:ResponseCode')
-        if responseCode != 'NoError':
-          raise DataException("Response code was not 'NoError'")
+def parse_sync_response(stream, calendarIndex, idOnly=False):
+  '''Parses a SyncFolderItems response (a file-like stream), returns (syncState, includesLastItemInRange, changes)'''
+  syncState = None
+  includesLastItemInRange = True
+  changes = list()
+  
+  majorResponseTag = None
+  body = None
+  changesElement = None
+  
+  for event, element in ET.iterparse(stream, events=('start', 'end')):
+    tag = element.tag
+    
+    if event == 'start':
+      if body != None and majorResponseTag == None:
+        majorResponseTag = tag
+        if tag != TAG_SYNC_FOLDER_ITEMS_RESPONSE:
+          raise DataException('Unexpected major response element - got %s' % tag)
+        
+      elif tag == TAG_SYNC_FOLDER_ITEMS_RESPONSE_MESSAGE:
+        if element.get('ResponseClass') != 'Success':
+          raise DataException("SyncFolderItemsResponseMessage response class was not 'Success' (was %s)" % element.get('ResponseClass'))
+        
+      elif tag == TAG_CHANGES:
+        changesElement = element
+        
+      elif tag == TAG_BODY:
+        body = element
+        
+    # (end events from here)
+        
+    elif tag == TAG_RESPONSE_CODE:
+      if element.text != 'NoError':
+        raise DataException("Response code was not 'NoError' (was %s)" % element.text)
+      
+    elif tag == TAG_SYNC_STATE:
+      syncState = element.text
+      
+    elif tag == TAG_INCLUDES_LAST_ITEM_IN_RANGE:
+      includesLastItemInRange = element.text != 'false'
+      
+    elif changesElement != None and tag in SYNC_CHANGE_TAGS:
+      if not idOnly:
+        if tag == TAG_DELETE:
+          changes.append(('delete', getAttrib(element.find(TAG_ITEM_ID), 'Id')))
           
-        rootFolder = getElement(findItemResponseMessage, 'message:RootFolder')
+        else:
+          item = element.find(TAG_CALENDAR_ITEM)
+          if item != None:
+            changes.append((SYNC_CHANGE_TAGS[tag], parseCalendarItem(item, calendarIndex)))
+          
+      # drop what has been read
+      changesElement.clear()
+          
+  if majorResponseTag == None:
+    raise DataException('Expected a major response with the Body')
+  
+  if syncState == None:
+    raise DataException('Missing element message:SyncState')
+  
+  return syncState, includesLastItemInRange, changes
 
-        # warning...
-        includesLastItemInRange = rootFolder.get('IncludesLastItemInRange')
-        if includesLastItemInRange == False and warnings:
-          warnings.append('IncludesLastItemInRange=false but this parser does not support paged responses')
-        
-        rootFolderItems = getElement(rootFolder, 'type:Items')
-
-        for item in rootFolderItems:
-          itemTag = item.tag
-
-          # interpret calendar items only
-          if itemTag == expandPath('type:CalendarItem'):
-            itemIDElement = getElement(item, 'type:ItemId')
-            itemID = {'id': getAttrib(itemIDElement, 'Id'),
-                      'changeKey': getAttrib(itemIDElement, 'ChangeKey')}
-            subject = tryGetElementText(item, 'type:Subject', default='')
-            sensitivity = tryGetElementText(item, 'type:Sensitivity', default='') # TODO: interpret 'Sensitivity'
-            start = getElementText(item, 'type:Start')
-            end = getElementText(item, 'type:End')
-            location = tryGetElementText(item, 'type:Location', default='')
-            
-            organiserElement = tryGetElement(item, 'type:Organizer')
-            if organiserElement != None:
-              organiserMailboxElement = getElement(organiserElement, 'type:Mailbox')
-              organiserName = tryGetElementText(organiserMailboxElement, 'type:Name', default='')
-              
-            else:
-              organiserName = ''
-
-            calendarItems.append({ # 'id': itemID,
-                                   'calendar': responseIndex,
-                                   'subject': subject,
-                                   'sensitivity': sensitivity,
-                                   'start': date_instant(date_parse(start).getMillis()), # trick to convert into local timezone for display convenience (instead of GMT)
-                                   'end': date_instant(date_parse(end).getMillis()), # trick to convert into local timezone for display convenience (instead of GMT)
-                                   'location': location,
-                                   'organiser': organiserName })
-  else:
-    raise DataException('Unexpected major response element - got %s' % majorResponseTag)
-            
-  return calendarItems
+# incremental sync --->
 
 def local_action_PollFolders(arg=None):
   try:
@@ -476,7 +818,13 @@ REQ_QUERY_TEMPLATE_XML = '''<?xml version="1.0" encoding="utf-8"?>
 #    </ParentFolderIds>
 # ...
 
-def prepareQueryRequest(start, end, resolvedFolders=None):
+# calendar view "page" size (Exchange Online caps views at 1000 items anyway)
+PAGE_SIZE = 500
+
+# how many calendars (of possibly different mailboxes) are batched into a single FindItem request
+MAX_FOLDERS_PER_REQUEST = 20
+
+def prepareQueryRequest(start, end, resolvedFolders=None, maxEntries=None):
   '''(folders contain XML objects)'''
   # construct a new FindItem request
   request = ET.fromstring(REQ_QUERY_TEMPLATE_XML)
@@ -486,6 +834,9 @@ def prepareQueryRequest(start, end, resolvedFolders=None):
   calendarView.set('StartDate', str(start))
   calendarView.set('EndDate', str(end))
   
+  if maxEntries != None:
+    calendarView.set('MaxEntriesReturned', str(maxEntries))
+  
   # specify folder options
   parentFolderIds = searchElement(request, 'message:ParentFolderIds')
 
@@ -511,6 +862,19 @@ REQ_GETFOLDERS_TEMPLATE_XML = '''<?xml version="1.0" encoding="utf-8"?>
       </s:Body>
   </s:Envelope>'''  
 
+def prepareDistinguishedFolderIdElement(address=None):
+  '''The default calendar folder, of a specific mailbox if given'''
+  element = ET.fromstring('<DistinguishedFolderId Id="calendar" xmlns="http://schemas.microsoft.com/exchange/services/2006/types"></DistinguishedFolderId>')
+
+  # update mailbox and inject if present
+  if not isBlank(address):
+    mailboxElement = ET.fromstring('<Mailbox xmlns="http://schemas.microsoft.com/exchange/services/2006/types"><EmailAddress>SMTP_ADDRESS_HERE</EmailAddress></Mailbox>')
+    searchElement(mailboxElement, 'type:EmailAddress').text = address
+
+    element.append(mailboxElement)
+
+  return element
+
 def prepareGetFoldersRequest(smtpAddress=None):
   # construct a new request type
   request = ET.fromstring(REQ_GETFOLDERS_TEMPLATE_XML)
@@ -523,6 +887,57 @@ def prepareGetFoldersRequest(smtpAddress=None):
 
   return request
 
+REQ_SYNC_TEMPLATE_XML = '''<?xml version="1.0" encoding="utf-8"?>
+  <s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+     <s:Header>
+        <h:DateTimePrecisionType xmlns:h="http://schemas.microsoft.com/exchange/services/2006/types">Seconds</h:DateTimePrecisionType>
+        <h:RequestServerVersion Version="Exchange2010_SP2" xmlns:h="http://schemas.microsoft.com/exchange/services/2006/types"/>
+     </s:Header>
+     <s:Body>
+        <SyncFolderItems xmlns="http://schemas.microsoft.com/exchange/services/2006/messages">
+           <ItemShape>
+              <BaseShape xmlns="http://schemas.microsoft.com/exchange/services/2006/types">Default</BaseShape>
+              <AdditionalProperties xmlns="http://schemas.microsoft.com/exchange/services/2006/types">
+                 <FieldURI FieldURI="item:Subject"/>
+                 <FieldURI FieldURI="item:Sensitivity"/>
+                 <FieldURI FieldURI="calendar:Start"/>
+                 <FieldURI FieldURI="calendar:End"/>
+                 <FieldURI FieldURI="calendar:Location"/>
+                 <FieldURI FieldURI="calendar:Organizer"/>
+                 <FieldURI FieldURI="calendar:CalendarItemType"/>
+              </AdditionalProperties>
+           </ItemShape>
+           <SyncFolderId><!-- folder option ends up here --></SyncFolderId>
+           <!-- SyncState (if any) ends up here -->
+           <MaxChangesReturned>MAX_CHANGES_HERE</MaxChangesReturned>
+        </SyncFolderItems>
+     </s:Body>
+  </s:Envelope>
+'''
+
+def prepareSyncRequest(folderElement, syncState=None, idOnly=False):
+  '''(folder is an XML object; 'idOnly' is for quickly catching up with a fresh sync state)'''
+  request = ET.fromstring(REQ_SYNC_TEMPLATE_XML)
+  
+  syncFolderItems = searchElement(request, 'message:SyncFolderItems')
+  
+  if idOnly:
+    itemShape = getElement(syncFolderItems, 'message:ItemShape')
+    getElement(itemShape, 'type:BaseShape').text = 'IdOnly'
+    itemShape.remove(getElement(itemShape, 'type:AdditionalProperties'))
+  
+  getElement(syncFolderItems, 'message:SyncFolderId').append(folderElement)
+  
+  # (order of elements matters)
+  if syncState != None:
+    syncStateElement = ET.Element(expandPath('message:SyncState'))
+    syncStateElement.text = syncState
+    syncFolderItems.insert(2, syncStateElement)
+    
+  getElement(syncFolderItems, 'message:MaxChangesReturned').text = str(MAX_SYNC_CHANGES)
+  
+  return request
+
 # SOAP/XML operations --->
 
 
@@ -615,6 +1030,68 @@ def expandPath(path):
 
 # XML parsing convenience functions --->
 
+# <--- streaming
+
+# Note: responses are parsed as they arrive off the connection (see 'post_ews') and each item is dropped
+# from the partial tree once read, so neither the response text nor its element tree is ever held whole,
+# only the items the callers keep.
+
+# (iterparse compares tags so these are qualified once, up front)
+TAG_BODY = expandPath('env:Body')
+TAG_FIND_ITEM_RESPONSE = expandPath('message:FindItemResponse')
+TAG_FIND_ITEM_RESPONSE_MESSAGE = expandPath('message:FindItemResponseMessage')
+TAG_SYNC_FOLDER_ITEMS_RESPONSE = expandPath('message:SyncFolderItemsResponse')
+TAG_SYNC_FOLDER_ITEMS_RESPONSE_MESSAGE = expandPath('message:SyncFolderItemsResponseMessage')
+TAG_RESPONSE_CODE = expandPath('message:ResponseCode')
+TAG_ROOT_FOLDER = expandPath('message:RootFolder')
+TAG_SYNC_STATE = expandPath('message:SyncState')
+TAG_INCLUDES_LAST_ITEM_IN_RANGE = expandPath('message:IncludesLastItemInRange')
+TAG_CHANGES = expandPath('message:Changes')
+TAG_ITEMS = expandPath('type:Items')
+TAG_CALENDAR_ITEM = expandPath('type:CalendarItem')
+TAG_ITEM_ID = expandPath('type:ItemId')
+TAG_SUBJECT = expandPath('type:Subject')
+TAG_SENSITIVITY = expandPath('type:Sensitivity')
+TAG_START = expandPath('type:Start')
+TAG_END = expandPath('type:End')
+TAG_LOCATION = expandPath('type:Location')
+TAG_CALENDAR_ITEM_TYPE = expandPath('type:CalendarItemType')
+TAG_ORGANIZER_NAME = '%s/%s/%s' % (expandPath('type:Organizer'), expandPath('type:Mailbox'), expandPath('type:Name'))
+TAG_DELETE = expandPath('type:Delete')
+
+# change kind by tag
+SYNC_CHANGE_TAGS = { expandPath('type:Create'): 'create',
+                     expandPath('type:Update'): 'update',
+                     TAG_DELETE: 'delete' }
+
+class Utf8Reader:
+  '''A file-like UTF-8 view of a (unicode) string, encoded a chunk at a time as the parser reads it
+     (instead of pre-encoding the whole response), for responses 'get_url' hands over whole'''
+
+  def __init__(self, s):
+    self._s = s
+    self._pos = 0
+
+  def read(self, size=-1):
+    if size < 0:
+      size = len(self._s) - self._pos
+
+    end = self._pos + size
+
+    # (a chunk never ends between the two halves of a surrogate pair, each half alone encodes as invalid UTF-8)
+    if end < len(self._s) and u'\ud800' <= self._s[end-1] <= u'\udbff':
+      end += 1
+
+    chunk = self._s[self._pos:end]
+    self._pos += len(chunk)
+
+    return chunk.encode('utf-8')
+
+  def close(self):
+    pass
+
+# streaming --->
+
 # <--- simple parsing
 
 
@@ -0,0 +1,206 @@
+'''A pool of stand-in nodes (their script REST end-points) for trying out and timing surveys and pushes.'''
+
+# Runs under CPython (2.7 or 3), e.g.
+#
+#   python fakeNodes.py --count 400 --hosts 4 --latency 0.03 --announce
+#
+# serves 400 nodes named "Fake Node 1" to "Fake Node 400" spread across 4 "hosts" (ports 8085 to 8088).
+# Each answers
+#
+#   GET  /nodes/NAME/REST/script         {"script": ..., "modified": ...}
+#   POST /nodes/NAME/REST/script/save    {"script": ...}  (replaces the script, updating 'modified')
+#
+# after --latency secs (or --slow-latency for the --slow fraction of nodes). --fail makes that fraction of
+# nodes answer with errors. Scripts are one of --types variants (a few hundred lines each) so surveys find
+# several signatures. With --announce, discovery probes (multicast, as sent by "Probe") are answered the
+# way node hosts do, so a Surveyor node can find the pool on its own.
+#
+# Requests served and scripts saved are printed on exit (Ctrl+C).
+
+import argparse
+import json
+import random
+import socket
+import struct
+import threading
+import time
+
+try:
+  from http.server import BaseHTTPRequestHandler, HTTPServer
+  from socketserver import ThreadingMixIn
+  from urllib.parse import unquote
+except ImportError:
+  from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+  from SocketServer import ThreadingMixIn
+  from urllib import unquote
+
+DISCOVERY_GROUP = '224.0.0.252'
+DISCOVERY_PORT = 5354
+
+def makeScript(variant):
+  '''A recipe-like script, distinct per variant'''
+  lines = ["'''Fake recipe type %s.'''" % variant, '']
+  for i in range(300):
+    lines.append('# action %s' % i)
+    lines.append("def local_action_Fake%s_%s(arg=None):" % (variant, i))
+    lines.append("  console.info('called %s of type %s')" % (i, variant))
+  return '\n'.join(lines)
+
+class Node:
+  def __init__(self, name, script, slow, failing):
+    self.name = name
+    self.script = script
+    self.modified = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(time.time() - random.randint(0, 10**7)))
+    self.slow = slow
+    self.failing = failing
+
+class Pool:
+  def __init__(self, options):
+    self.options = options
+    self.lock = threading.Lock()
+    self.nodesByPort = {}
+    self.stats = {'gets': 0, 'saves': 0, 'errors': 0, 'most concurrent': 0}
+    self.concurrent = 0
+
+    scripts = [makeScript(variant + 1) for variant in range(options.types)]
+
+    for i in range(options.count):
+      port = options.port + i % options.hosts
+      node = Node('Fake Node %s' % (i+1), random.choice(scripts), random.random() < options.slow, random.random() < options.fail)
+      self.nodesByPort.setdefault(port, {})[node.name] = node
+
+  def enter(self):
+    with self.lock:
+      self.concurrent += 1
+      self.stats['most concurrent'] = max(self.stats['most concurrent'], self.concurrent)
+
+  def leave(self):
+    with self.lock:
+      self.concurrent -= 1
+
+class Handler(BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+
+  def lookup(self, suffix):
+    # e.g. /nodes/Fake%20Node%201/REST/script
+    parts = self.path.split('/')
+    if len(parts) < 4 or parts[1] != 'nodes' or '/'.join(parts[3:]) != suffix:
+      return None
+
+    return self.server.pool.nodesByPort[self.server.server_address[1]].get(unquote(parts[2]))
+
+  def serve(self, suffix, respond):
+    pool = self.server.pool
+    pool.enter()
+    try:
+      node = self.lookup(suffix)
+      if node == None:
+        self.reply(404, {'error': 'not found'})
+        return
+
+      time.sleep(pool.options.slow_latency if node.slow else pool.options.latency)
+
+      if node.failing:
+        pool.stats['errors'] += 1
+        self.reply(500, {'error': 'fake failure'})
+        return
+
+      self.reply(200, respond(node))
+
+    finally:
+      pool.leave()
+
+  def do_GET(self):
+    def respond(node):
+      self.server.pool.stats['gets'] += 1
+      return {'script': node.script, 'modified': node.modified}
+
+    self.serve('REST/script', respond)
+
+  def do_POST(self):
+    body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def respond(node):
+      self.server.pool.stats['saves'] += 1
+      node.script = json.loads(body.decode('utf-8'))['script']
+      node.modified = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+      return {}
+
+    self.serve('REST/script/save', respond)
+
+  def reply(self, code, value):
+    data = json.dumps(value).encode('utf-8')
+    self.send_response(code)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(data)))
+    self.end_headers()
+    self.wfile.write(data)
+
+  def log_message(self, format, *args):
+    pass
+
+class Server(ThreadingMixIn, HTTPServer):
+  allow_reuse_address = True
+  daemon_threads = True
+  request_queue_size = 128
+
+def announce(pool, host):
+  '''Answers discovery probes for every node, one response per "host"'''
+  sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+  sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+  sock.bind(('', DISCOVERY_PORT))
+  sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, struct.pack('4sl', socket.inet_aton(DISCOVERY_GROUP), socket.INADDR_ANY))
+
+  while True:
+    data, src = sock.recvfrom(4096)
+    try:
+      probe = json.loads(data.decode('utf-8'))
+    except ValueError:
+      continue
+
+    if probe.get('discovery') == None:
+      continue
+
+    for port, nodes in pool.nodesByPort.items():
+      response = {'present': list(nodes), 'addresses': ['http://%s:%s/nodes/%%NODE%%/' % (host, port)]}
+      sock.sendto(json.dumps(response).encode('utf-8'), src)
+
+def main():
+  parser = argparse.ArgumentParser(description='Fake pool of nodes')
+  parser.add_argument('--count', type=int, default=400, help='nodes')
+  parser.add_argument('--hosts', type=int, default=1, help='ports to spread the nodes across')
+  parser.add_argument('--port', type=int, default=8085, help='the first port')
+  parser.add_argument('--types', type=int, default=12, help='distinct scripts')
+  parser.add_argument('--latency', type=float, default=0.03, help='secs before each response')
+  parser.add_argument('--slow', type=float, default=0, help='fraction of nodes answering after --slow-latency instead')
+  parser.add_argument('--slow-latency', type=float, default=2)
+  parser.add_argument('--fail', type=float, default=0, help='fraction of nodes answering with errors')
+  parser.add_argument('--announce', action='store_true', help='answer discovery probes')
+  parser.add_argument('--host', default=None, help='the address announced (default is this host\'s)')
+  args = parser.parse_args()
+
+  pool = Pool(args)
+
+  for port in sorted(pool.nodesByPort):
+    server = Server(('', port), Handler)
+    server.pool = pool
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+  if args.announce:
+    thread = threading.Thread(target=announce, args=(pool, args.host or socket.gethostbyname(socket.gethostname())))
+    thread.daemon = True
+    thread.start()
+
+  print('Serving %s nodes on port(s) %s to %s' % (args.count, args.port, args.port + args.hosts - 1))
+
+  try:
+    while True:
+      time.sleep(1)
+  except KeyboardInterrupt:
+    print(pool.stats)
+
+if __name__ == '__main__':
+  main()
@@ -32,8 +32,12 @@ Step 2: Use the 'Probe' operation to determine which node
         (give at least 10s to allow all node hosts to answer)
         
 
-Step 3: Use 'Begin Survey' to interrogate the nodes in one 
-        sequential sweep.
+Step 3: Use 'Begin Survey' to interrogate the nodes (several
+        at a time, see 'Survey workers').
+        
+        Script signatures are cached so later surveys (including
+        after a restart) can use 'Begin survey (new or changed
+        nodes only)' to skip nodes that have been seen before.
         
         WAIT...
         
@@ -51,6 +55,10 @@ Step 4: Refresh the Node page to show up additional actions and signals.
 Step 5: Compose a list of node names (one per line) and use
         the 'Push' actions group to push scripts out to a 
         collection of nodes.
+        
+        Nodes already running the script are skipped (unless
+        'Force' is used) and 'Dry run' only lists the nodes that 
+        would change.
 
 
 
@@ -79,6 +87,11 @@ from org.nodel.io import Stream
 # to determine working directory
 import os 
 
+# for querying nodes in parallel
+import sys
+import threading
+import Queue
+
 param_NodeNameFilter = Parameter({'title': 'Node name filter', 'desc': 'If blank or missing includes all nodes.', 'schema': {'type': 'string'}})
 
 param_Interface = Parameter({'title': 'Network interface for multicasting', 'desc': 'Optional - if blank, will use the OS "bind all" default (0.0.0.0) which can have inconsistent results depending on the state of the topology.', 
@@ -87,6 +100,12 @@ param_Interface = Parameter({'title': 'Network interface for multicasting', 'des
 CURRENT_RECIPES = NodelHost.instance().recipes().getRoot()
 param_RecipesFolder = Parameter({'title': 'Recipes folder', 'schema': {'type': 'string', 'hint': CURRENT_RECIPES.getAbsolutePath()}})
 
+DEFAULT_SURVEY_WORKERS = 8
+param_SurveyWorkers = Parameter({'title': 'Survey workers', 'desc': 'The most nodes queried at once', 'schema': {'type': 'integer', 'hint': str(DEFAULT_SURVEY_WORKERS)}})
+
+DEFAULT_PUSH_WORKERS = 16
+param_PushWorkers = Parameter({'title': 'Push workers', 'desc': 'The most nodes pushed to at once', 'schema': {'type': 'integer', 'hint': str(DEFAULT_PUSH_WORKERS)}})
+
 param_ScriptTypes = Parameter({'title': 'Custom script types', 'schema': {'type': 'array', 'items': {
         'type': 'object', 'properties': {
           'type':      { 'type': 'string', 'order': 1},
@@ -120,7 +139,9 @@ def main():
   items = load_existing_scripts(recipesFolder)
   console.info('loaded %s scripts' % len(items))
   for item in items:
-    scriptTypes_bySignature[item['signature']] = {'type': item['path'], 'signature': item['signature']}
+    scriptTypes_bySignature[item['signature']] = {'type': item['path'], 'signature': item['signature'], 'scriptFile': item['scriptFile']}
+    
+  saveSurveyCache()
     
   if len(param_Interface or '') > 0:
     udp.setIntf(param_Interface)
@@ -154,7 +175,7 @@ def traverse(path, pathFile, items):
       traverse(newPath, f, items)
       
     if f.isFile() and name.lower() == 'script.py':
-      signature = getSignature(Stream.readFully(f))
+      signature = getFileSignature(f)
                                  
       items.append({'path': path, 
                     'scriptFile': f,
@@ -163,6 +184,22 @@ def traverse(path, pathFile, items):
     
     # otherwise, keep traversing
   
+def getFileSignature(f):
+  '''Uses the cached signature unless the file has been modified since'''
+  cache = getSurveyCache()
+  key = 'file:%s' % f.getAbsolutePath()
+  modified = f.lastModified()
+  
+  cached = cache.get(key)
+  if cached is not None and cached['modified'] == modified:
+    return cached['signature']
+  
+  signature = getSignature(Stream.readFully(f))
+  cache[key] = {'modified': modified, 'signature': signature}
+  surveyCacheDirty[0] = True
+  
+  return signature
+  
 def udp_ready():
   console.info('udp is ready. Can probe now.')
   
@@ -219,41 +256,108 @@ def local_action_Probe(arg=None):
   
   udp.send(json_encode({"discovery": "*", "types": ["tcp", "http"]}))
   
-surveyed = False
+surveying = [False]
   
 def local_action_BeginSurvey(arg=None):
   '''{"title": "2. Begin survey", "group": "Operations", "order": 2}'''
+  survey(incremental=False)
   
-  errors = list()
+def local_action_BeginIncrementalSurvey(arg=None):
+  '''{"title": "2. Begin survey (new or changed nodes only)", "group": "Operations", "order": 3}'''
+  survey(incremental=True)
   
-  global surveyed
-  if surveyed:
-    console.warn('Can only survey once per session. Restart node to repeat.')
+def survey(incremental):
+  if surveying[0]:
+    console.warn('A survey is already in progress')
     return
   
-  surveyed = True
-  
-  for nodeName in nodeAddressesByName:
-    try:
-      queryNode(nodeName)
+  surveying[0] = True
+  try:
+    cache = getSurveyCache()
+    
+    nodeNames = list(nodeAddressesByName)
+    
+    # incremental surveys only query nodes whose announced address hasn't been seen before
+    # (the address includes the node name and host so a moved or renamed node is also re-queried)
+    if incremental:
+      toQuery = [nodeName for nodeName in nodeNames if nodeAddressesByName[nodeName] not in cache]
+    else:
+      toQuery = nodeNames
+      
+    console.info('Querying %s of %s nodes...' % (len(toQuery), len(nodeNames)))
+      
+    results = queryNodes(toQuery, cache)
+    
+    # update the cache from this thread (workers only read it)
+    for nodeName in toQuery:
+      result = results[nodeName]
+      if not isinstance(result, Exception):
+        cache[nodeAddressesByName[nodeName]] = {'modified': result['modified'], 'signature': result['signature']}
+        surveyCacheDirty[0] = True
         
-    except BaseException, exc:
-      errors.append([nodeName, exc])
+    saveSurveyCache()
+    
+    applySurvey(nodeNames, results, cache)
+    
+  finally:
+    surveying[0] = False
+    
+def queryNodes(nodeNames, cache):
+  '''Queries the nodes using a bounded pool of workers, returns the results (or exceptions) by node name'''
+  return forEachConcurrently(nodeNames, lambda nodeName: queryNode(nodeAddressesByName[nodeName], cache),
+                             param_SurveyWorkers or DEFAULT_SURVEY_WORKERS, 'Survey worker')
+
+def forEachConcurrently(items, func, workerCount, workerName):
+  '''Calls 'func' for each item using at most 'workerCount' threads, returns the results (or exceptions) by item'''
+  results = {}
+  
+  pending = Queue.Queue()
+  for item in items:
+    pending.put(item)
+  
+  def worker():
+    while True:
+      try:
+        item = pending.get_nowait()
+      except Queue.Empty:
+        return
       
-    except JavaException, exc:
-      errors.append([nodeName, exc])
+      try:
+        result = func(item)
+        
+      except:
+        # may not be native Python exception, so capture using 'sys'
+        eType, eValue, eTraceback = sys.exc_info()
+        result = eValue if isinstance(eValue, Exception) else Exception(str(eValue))
+        
+      # (single assignments into a dict are thread-safe)
+      results[item] = result
       
-  for error in errors:
-    console.warn('("%s" failed)' % error)
+  workers = list()
+  for i in range(min(workerCount, len(items))):
+    thread = threading.Thread(target=worker, name='%s %s' % (workerName, i+1))
+    thread.daemon = True
+    thread.start()
+    workers.append(thread)
     
-  console.info('> %s nodes detected (%s with errors)' % (len(nodeAddressesByName), len(errors)))
-  console.info('> %s signatures' % len(signatures))
+  for thread in workers:
+    thread.join()
+    
+  return results
   
-  types = [t for t in countByType]
-  types.sort()
+def queryNode(address, cache):
+  '''Fetches a node's script, only re-hashing it if it has been modified since it was cached'''
+  scriptInfo = json_decode(get_url('%sREST/script' % address))
   
-  for t in types:
-    console.info('> %s of type "%s"' % (countByType[t], t))
+  modified = scriptInfo['modified']
+  
+  cached = cache.get(address)
+  if cached is not None and cached['modified'] == modified:
+    signature = cached['signature']
+  else:
+    signature = getSignature(scriptInfo['script'])
+    
+  return {'modified': modified, 'signature': signature, 'script': scriptInfo['script']}
     
 SCRIPT_SCHEMA = {'type': 'object', 'properties': {
                     'type':  { 'type': 'string', 'title': 'Type', 'order': 1 },
@@ -265,29 +369,41 @@ SCRIPT_SCHEMA = {'type': 'object', 'properties': {
 signatures = set()
 
 countByType = {}
-    
-def queryNode(nodeName):
-  # create an event if one isn't already set up
-  key = 'Node %s' % nodeName
-  event = lookup_local_event(key)
-  if event is None:
-    event = Event(key, {'title': '"%s"' % nodeName, 'group': 'Nodes', 'schema': NODESINFO_SCHEMA})
-    
-  info = {}
+
+nodeSignatures = {} # the last known script signature by node name (SimpleName)
+
+def applySurvey(nodeNames, results, cache):
+  '''Updates the node and script signals (rebuilt each survey so it can be repeated)'''
+  errors = list()
   
-  address = nodeAddressesByName[nodeName]
+  nodesBySignature = {}
   
-  scriptUrl = '%sREST/script' % address
+  signatures.clear()
+  countByType.clear()
   
-  try:
-    scriptInfo = json_decode(get_url(scriptUrl))
+  for nodeName in nodeNames:
+    # create an event if one isn't already set up
+    key = 'Node %s' % nodeName
+    event = lookup_local_event(key)
+    if event is None:
+      event = Event(key, {'title': '"%s"' % nodeName, 'group': 'Nodes', 'schema': NODESINFO_SCHEMA})
+      
+    address = nodeAddressesByName[nodeName]
     
-    info['scriptModified'] = scriptInfo['modified']
+    # (nodes not queried this time are taken from the cache)
+    result = results.get(nodeName) or cache[address]
     
-    signature = getSignature(scriptInfo['script'])
+    if isinstance(result, Exception):
+      errors.append([nodeName, result])
+      nodeSignatures.pop(nodeName, None)
+      event.emit({'httpAddress': address, 'scriptModified': ''})
+      continue
+    
+    signature = result['signature']
     signatures.add(signature)
+    nodeSignatures[nodeName] = signature
     
-    info['scriptSignature'] = signature
+    event.emit({'httpAddress': address, 'scriptModified': result['modified'], 'scriptSignature': signature})
     
     ttype = 'Unknown'
     scriptTypeInfo = scriptTypes_bySignature.get(signature)
@@ -297,65 +413,207 @@ def queryNode(nodeName):
       
       # update the script (once) and set up a 'push' action
       if not signature in scripts_bySignature:
-        script = scriptInfo['script']
+        try:
+          script = result.get('script') or getKnownScript(scriptTypeInfo, address)
+          
+        except:
+          eType, eValue, eTraceback = sys.exc_info()
+          errors.append([nodeName, eValue])
+          continue
+          
         scripts_bySignature[signature] = script
         
-        createPusher(ttype, script)
+        createPusher(ttype, signature, script)
+        
+    nodesBySignature.setdefault(signature, (ttype, list()))[1].append(str(nodeName))
     
+    countByType[ttype] = countByType.get(ttype, 0) + 1
+    
+  for signature, (ttype, nodes) in nodesBySignature.items():
     signatureEvent = lookup_local_event('Script %s' % signature)
     if signatureEvent is None:
       signatureEvent = Event('Script %s' % signature, {'group': '"%s" scripts' % ttype, 'title': signature, 'schema': SCRIPT_SCHEMA})
-      arg = {'signature': signature, 'nodes': ''}
-      signatureEvent.emit(arg)
-      
-    arg = signatureEvent.getArg()
       
-    # add another node (need to do reconstruction instead of a direct '.append' in case of a locked list (from persistence)
-    newNodes = arg['nodes'] or ''
+    arg = dict(signatureEvent.getArg() or {})
+    arg['signature'] = signature
+    arg['type'] = ttype
+    arg['nodes'] = '\r\n'.join(nodes)
     
-    if len(newNodes) == 0:
-      newNodes = str(nodeName)
-      
-    else:
-      newNodes = newNodes + "\r\n" + str(nodeName)
+    signatureEvent.emit(arg)
+    
+  for error in errors:
+    console.warn('("%s" failed)' % error)
+    
+  console.info('> %s nodes detected (%s with errors)' % (len(nodeNames), len(errors)))
+  console.info('> %s signatures' % len(signatures))
+  
+  types = [t for t in countByType]
+  types.sort()
+  
+  for t in types:
+    console.info('> %s of type "%s"' % (countByType[t], t))
+    
+def getKnownScript(scriptTypeInfo, address):
+  '''The script of a well-known type, from the recipes folder if it came from there, otherwise from the node'''
+  scriptFile = scriptTypeInfo.get('scriptFile')
+  if scriptFile is not None:
+    return Stream.readFully(scriptFile)
+  
+  return json_decode(get_url('%sREST/script' % address))['script']
+
+PUSH_SCHEMA = {'type': 'object', 'properties': {
+                  'nodes':  { 'type': 'string', 'title': 'Nodes', 'format': 'long', 'order': 1, 'desc': 'One node name per line' },
+                  'dryRun': { 'type': 'boolean', 'title': 'Dry run', 'order': 2, 'desc': 'Only show which nodes would change' },
+                  'force':  { 'type': 'boolean', 'title': 'Force', 'order': 3, 'desc': 'Push even if the node already has this script' }
+              }}
+
+local_event_LastPush = LocalEvent({'title': 'Last push', 'group': 'Push', 'order': 9999, 'schema': {'type': 'object', 'properties': {
+                                     'type':     { 'type': 'string', 'order': 1 },
+                                     'pushed':   { 'type': 'integer', 'order': 2 },
+                                     'skipped':  { 'type': 'integer', 'order': 3 },
+                                     'failed':   { 'type': 'integer', 'order': 4 },
+                                     'dryRun':   { 'type': 'boolean', 'order': 5 },
+                                     'millis':   { 'type': 'integer', 'order': 6 }
+                                 }}})
+
+def createPusher(ttype, signature, script):
+  
+  def handler(arg):
+    # (a plain list of node names is still accepted)
+    if isinstance(arg, basestring):
+      arg = {'nodes': arg}
       
-    arg['nodes'] = newNodes
-    arg['type'] = ttype
+    nodes = [x.strip() for x in (arg.get('nodes') or '').splitlines() if len(x.strip())>0]
     
-    typeCount = countByType.get(ttype)
-    if typeCount is None:
-      countByType[ttype] = 1
-    else:
-      countByType[ttype] = typeCount + 1
+    pushScript(ttype, signature, script, nodes, dryRun=arg.get('dryRun') == True, force=arg.get('force') == True)
+  
+  Action('Push script type %s' % ttype, handler, 
+         {'title': 'Push "%s"' % ttype, 'group': 'Push', 'caution': 'Are you sure?', 'schema': PUSH_SCHEMA})
+  
+def pushScript(ttype, signature, script, nodes, dryRun=False, force=False):
+  '''Pushes the script to the nodes that don't already have it, several at a time'''
+  start = system_clock()
+  
+  toPush = list()
+  skipped = 0
+  
+  seen = set()
+  
+  for nodeName in nodes:
+    simpleName = SimpleName(nodeName)
     
-    signatureEvent.emit(arg)
+    # (a node listed more than once is only pushed to once)
+    if simpleName in seen:
+      continue
     
-  except:
-    info['scriptModified'] = ''
+    seen.add(simpleName)
     
-    raise
+    if simpleName not in nodeAddressesByName:
+      console.warn('"%s": unknown node (probe and survey first?)' % nodeName)
+      continue
     
-  finally:
-    event.emit(info)
+    if not force and nodeSignatures.get(simpleName) == signature:
+      console.info('"%s": already up to date, skipping' % nodeName)
+      skipped += 1
+      continue
     
-def createPusher(ttype, script):
+    toPush.append(simpleName)
+    
+  if dryRun:
+    for simpleName in toPush:
+      console.info('"%s": would be pushed (currently %s)' % (simpleName, nodeSignatures.get(simpleName) or 'unknown'))
+      
+    console.info('> Dry run: %s node(s) would be pushed, %s already up to date' % (len(toPush), skipped))
+    local_event_LastPush.emit({'type': ttype, 'pushed': len(toPush), 'skipped': skipped, 'failed': 0, 'dryRun': True, 'millis': system_clock() - start})
+    return
   
-  def handler(arg):
-    nodes = [x.strip() for x in arg.splitlines() if len(x.strip())>0]
+  console.info('Pushing "%s" to %s node(s) (%s already up to date)...' % (ttype, len(toPush), skipped))
+  
+  body = json_encode({'script': script})
+  
+  def push(simpleName):
+    pushStart = system_clock()
     
-    console.info('Pushing to %s...' % nodes)
+    try:
+      result = get_url('%sREST/script/save' % nodeAddressesByName[simpleName], post=body)
+      
+    except:
+      eType, eValue, eTraceback = sys.exc_info()
+      console.warn('"%s": push failed after %s ms - %s' % (simpleName, system_clock() - pushStart, eValue))
+      raise
     
-    for nodeName in nodes:
-      address = nodeAddressesByName[SimpleName(nodeName)]
+    console.info('"%s": pushed in %s ms, result: %s' % (simpleName, system_clock() - pushStart, result))
+      
+  results = forEachConcurrently(toPush, push, param_PushWorkers or DEFAULT_PUSH_WORKERS, 'Push worker')
   
-      scriptUrl = '%sREST/script/save' % address
+  failed = 0
+  cache = getSurveyCache()
+  
+  for simpleName in toPush:
+    if isinstance(results[simpleName], Exception):
+      failed += 1
+      continue
     
-      result = get_url(scriptUrl, post=json_encode({'script': script}))
-      console.info('result: %s' % result)
+    nodeSignatures[simpleName] = signature
+    
+    # (the node's script has changed so its next incremental survey needs to query it again)
+    if cache.pop(nodeAddressesByName[simpleName], None) is not None:
+      surveyCacheDirty[0] = True
+      
+  saveSurveyCache()
   
-  Action('Push script type %s' % ttype, handler, 
-         {'title': 'Push "%s"' % ttype, 'group': 'Push', 'caution': 'Are you sure?', 'schema': {'type': 'string', 'format': 'long'}})
+  millis = system_clock() - start
   
+  console.info('> Pushed "%s" to %s node(s) in %s ms (%s failed, %s skipped)' % (ttype, len(toPush) - failed, millis, failed, skipped))
+  local_event_LastPush.emit({'type': ttype, 'pushed': len(toPush) - failed, 'skipped': skipped, 'failed': failed, 'dryRun': False, 'millis': millis})
+
+
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+
+# signature cache (kept between sessions), keyed by node address (or recipe script path), e.g.
+#   { 'http://192.168.1.50:8085/nodes/Projector%201/': {'modified': '2026-10-01T...', 'signature': 'loc:...'},
+#     'file:/nodel/recipes/pjlink/script.py': {'modified': 1759300000000, 'signature': 'loc:...'} }
+
+SURVEY_CACHE_FILE = os.path.join(os.getcwd(), 'surveyCache.json')
+
+_surveyCache = None
+
+surveyCacheDirty = [False]
+
+def getSurveyCache():
+  global _surveyCache
+  
+  if _surveyCache is None:
+    _surveyCache = {}
+    
+    if os.path.exists(SURVEY_CACHE_FILE):
+      try:
+        f = open(SURVEY_CACHE_FILE, 'r')
+        try:
+          _surveyCache = json_decode(f.read()) or {}
+        finally:
+          f.close()
+          
+      except Exception, e:
+        console.warn('Survey cache could not be loaded (will be recreated) - %s' % e)
+        
+  return _surveyCache
+
+def saveSurveyCache():
+  if not surveyCacheDirty[0]:
+    return
+  
+  try:
+    f = open(SURVEY_CACHE_FILE, 'w')
+    try:
+      f.write(json_encode(getSurveyCache()))
+    finally:
+      f.close()
+      
+    surveyCacheDirty[0] = False
+    
+  except Exception, e:
+    console.warn('Survey cache could not be saved - %s' % e)
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
 
@@ -0,0 +1,240 @@
+'''A stand-in PJLink (class 1) projector, or a fleet of them, for trying out this recipe without hardware.'''
+
+# Runs under CPython (2.7 or 3), e.g.
+#
+#   python fakeProjector.py --port 4352 --password secret --latency 0.05
+#   python fakeProjector.py --port 14352 --count 40 --unresponsive 2   (for "Fleet" polling)
+#
+# Each projector answers POWR, INPT, AVMT, ERST, LAMP, INST, NAME, INF1, INF2, INFO and CLSS queries, and
+# POWR, INPT and AVMT sets. Power goes through 'warm-up' and 'cooling' for a couple of seconds and input
+# queries answer ERR3 while the projector is off, as the real thing does. Like many projectors, idle
+# connections are dropped after --idle-timeout and (with --single) only one connection is served at a time.
+#
+# The connections, authentications and commands per projector are printed on exit (Ctrl+C), which shows
+# whether a node is reusing its sessions.
+
+import argparse
+import hashlib
+import random
+import socket
+import threading
+import time
+
+try:
+  import socketserver
+except ImportError:
+  import SocketServer as socketserver
+
+TRANSITION_TIME = 2 # (secs) warm-up and cooling
+
+INPUTS = ['11', '12', '31', '32', '51']
+
+class Projector:
+  def __init__(self, name, password, unresponsive):
+    self.name = name
+    self.password = password
+    self.unresponsive = unresponsive
+
+    self.power = '0'
+    self.transitionEnds = 0
+    self.input = '31'
+    self.mute = '30'
+    self.lampHours = random.randint(100, 5000)
+
+    self.lock = threading.Lock()
+    self.active = 0 # connections
+    self.stats = {'connections': 0, 'refused': 0, 'auths': 0, 'failed auths': 0, 'commands': 0, 'idle drops': 0}
+
+  def powerState(self):
+    # (warm-up and cooling end on their own)
+    if self.power in '23' and time.time() >= self.transitionEnds:
+      self.power = '1' if self.power == '3' else '0'
+    return self.power
+
+  def handle(self, body, param):
+    with self.lock:
+      self.stats['commands'] += 1
+      power = self.powerState()
+
+      if body == 'POWR':
+        if param == '?':
+          return power
+        if param not in '01':
+          return 'ERR2'
+        if param == '1' and power == '0':
+          self.power, self.transitionEnds = '3', time.time() + TRANSITION_TIME
+        elif param == '0' and power == '1':
+          self.power, self.transitionEnds = '2', time.time() + TRANSITION_TIME
+        return 'OK'
+
+      elif body == 'INPT':
+        if power != '1':
+          return 'ERR3'
+        if param == '?':
+          return self.input
+        if param not in INPUTS:
+          return 'ERR2'
+        self.input = param
+        return 'OK'
+
+      elif body == 'AVMT':
+        if param == '?':
+          return self.mute
+        if param not in ['10', '11', '20', '21', '30', '31']:
+          return 'ERR2'
+        self.mute = param
+        return 'OK'
+
+      elif param != '?':
+        return 'ERR2' if body in ['ERST', 'LAMP', 'INST', 'NAME', 'INF1', 'INF2', 'INFO', 'CLSS'] else 'ERR1'
+
+      elif body == 'ERST':
+        return '000000'
+      elif body == 'LAMP':
+        return '%s %s' % (self.lampHours, 1 if power in '13' else 0)
+      elif body == 'INST':
+        return ' '.join(INPUTS)
+      elif body == 'NAME':
+        return self.name
+      elif body == 'INF1':
+        return 'Fake'
+      elif body == 'INF2':
+        return 'PJLink projector'
+      elif body == 'INFO':
+        return ''
+      elif body == 'CLSS':
+        return '1'
+      else:
+        return 'ERR1'
+
+class Handler(socketserver.BaseRequestHandler):
+  def handle(self):
+    projector = self.server.projector
+    options = self.server.options
+
+    with projector.lock:
+      if options.single and projector.active > 0:
+        # (busy with another connection)
+        projector.stats['refused'] += 1
+        return
+
+      projector.active += 1
+      projector.stats['connections'] += 1
+
+    try:
+      self.serve(projector, options)
+    except (IOError, OSError):
+      pass
+    finally:
+      with projector.lock:
+        projector.active -= 1
+
+  def serve(self, projector, options):
+    sock = self.request
+    sock.settimeout(options.idle_timeout)
+
+    if projector.unresponsive:
+      # accepts the connection and says nothing
+      time.sleep(options.idle_timeout)
+      return
+
+    self.buf = b''
+
+    if projector.password == None:
+      self.reply('PJLINK 0')
+      digest = None
+    else:
+      salt = '%08x' % random.getrandbits(32)
+      self.reply('PJLINK 1 %s' % salt)
+      digest = hashlib.md5((salt + projector.password).encode('latin-1')).hexdigest()
+
+    authenticated = digest == None
+
+    while True:
+      try:
+        line = self.readLine()
+      except socket.timeout:
+        projector.stats['idle drops'] += 1
+        return
+
+      if line == None:
+        return
+
+      if not authenticated:
+        # the digest prefixes the first command
+        if line[:32] != digest:
+          projector.stats['failed auths'] += 1
+          self.reply('PJLINK ERRA')
+          return
+
+        projector.stats['auths'] += 1
+        authenticated = True
+        line = line[32:]
+
+      if len(line) < 7 or line[:2] != '%1' or line[6] != ' ':
+        continue
+
+      body = line[2:6].upper()
+      time.sleep(options.latency)
+      self.reply('%%1%s=%s' % (body, projector.handle(body, line[7:])))
+
+  def readLine(self):
+    while b'\r' not in self.buf:
+      data = self.request.recv(1024)
+      if not data:
+        return None
+      self.buf += data
+
+    line, self.buf = self.buf.split(b'\r', 1)
+    return line.decode('latin-1')
+
+  def reply(self, line):
+    data = (line + '\r').encode('latin-1')
+
+    if not self.server.options.fragment:
+      self.request.sendall(data)
+      return
+
+    while len(data) > 0:
+      n = random.randint(1, len(data))
+      self.request.sendall(data[:n])
+      data = data[n:]
+
+class Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+  allow_reuse_address = True
+  daemon_threads = True
+
+def main():
+  parser = argparse.ArgumentParser(description='Fake PJLink projector(s)')
+  parser.add_argument('--port', type=int, default=4352, help='the (first) port to listen on')
+  parser.add_argument('--count', type=int, default=1, help='projectors to run, on consecutive ports')
+  parser.add_argument('--password', default=None, help='enables authentication')
+  parser.add_argument('--latency', type=float, default=0, help='secs before each response')
+  parser.add_argument('--fragment', action='store_true', help='write responses in random pieces')
+  parser.add_argument('--idle-timeout', type=float, default=30, help='secs before an idle connection is dropped')
+  parser.add_argument('--single', action='store_true', help='serve only one connection at a time')
+  parser.add_argument('--unresponsive', type=int, default=0, help='this many of the projectors (the last ones) never answer')
+  args = parser.parse_args()
+
+  servers = list()
+  for i in range(args.count):
+    server = Server(('', args.port + i), Handler)
+    server.projector = Projector('Projector %s' % (i+1), args.password, i >= args.count - args.unresponsive)
+    server.options = args
+    servers.append(server)
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+  print('Listening on TCP port(s) %s to %s' % (args.port, args.port + args.count - 1))
+
+  try:
+    while True:
+      time.sleep(1)
+  except KeyboardInterrupt:
+    for server in servers:
+      print('%s: %s' % (server.server_address[1], server.projector.stats))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,241 @@
+'''Fleet polling: polls a list of PJLink projectors from the one node.'''
+
+from nodetoolkit import *
+
+# Use "from fleet import param_fleet, param_fleetPolling, initFleet" within script.py to expose the fleet
+# Parameters.
+#
+# Each projector gets its own group of signals ('Power', 'Input', 'Errors', 'Lamp Hours' and 'Status',
+# prefixed by its name). Polls are spread evenly across the poll interval (so a host restart doesn't produce
+# a burst), at most 'workers' projectors are probed at once and projectors that stop responding are polled
+# less and less often (up to MAX_BACKOFF) until they come back.
+#
+# The workers are daemon threads tied to the dispatch Timer of the script load that started them. Nodel stops
+# a script's Timers when the node is restarted or its script is edited, so once dispatching has stopped for
+# STALE_DISPATCH the workers quit instead of polling on behalf of a script that is no longer loaded.
+#
+# The "Fleet Poll Latency" signal holds a histogram of poll round-trip times to help size the fleet, e.g.
+#
+#   {'polls': 480, 'failures': 3, 'meanMillis': 212,
+#    'buckets': [{'le': 50, 'count': 0}, {'le': 100, 'count': 31}, ... {'le': None, 'count': 0}]}
+
+import pjlink
+import sys
+import random
+import threading
+import Queue
+
+DEFAULT_INTERVAL = 60 # (secs)
+DEFAULT_WORKERS = 4
+
+MAX_BACKOFF = 15*60 # (secs)
+
+JITTER = 0.1 # (fraction of the backoff, spreads out retries of projectors that failed together)
+
+STALE_DISPATCH = 10 # (secs) workers quit once polls haven't been dispatched for this long
+
+# upper bounds of the latency histogram buckets (millis), the last bucket catches the rest
+LATENCY_BUCKETS = [50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+param_fleet = Parameter({'title': 'Fleet', 'order': next_seq(), 'desc': 'Other projectors to poll from this node', 'schema': {'type': 'array', 'items': {
+        'type': 'object', 'properties': {
+          'name': {'type': 'string', 'title': 'Name', 'order': 1, 'desc': 'e.g. "Gallery 1 Projector"'},
+          'ipAddress': {'type': 'string', 'title': 'IP address', 'order': 2},
+          'port': {'type': 'integer', 'title': 'Port', 'order': 3, 'hint': '4352'},
+          'password': {'type': 'string', 'title': 'Password', 'order': 4}
+        }}}})
+
+param_fleetPolling = Parameter({'title': 'Fleet polling', 'order': next_seq(), 'schema': {'type': 'object', 'properties': {
+        'interval': {'type': 'integer', 'title': 'Interval (secs)', 'order': 1, 'hint': str(DEFAULT_INTERVAL)},
+        'workers': {'type': 'integer', 'title': 'Workers', 'order': 2, 'hint': str(DEFAULT_WORKERS), 'desc': 'The most projectors probed at once'}
+      }}})
+
+class FleetProjector:
+  '''A projector in the fleet along with its signals and poll schedule'''
+
+  def __init__(self, info, nextDue):
+    self.name = info['name']
+    self.host = info['ipAddress']
+    self.port = info.get('port') or 4352
+    self.password = info.get('password')
+
+    self.nextDue = nextDue # (system_clock millis)
+    self.busy = False      # queued or being polled
+    self.failures = 0      # consecutive
+
+    group = self.name
+    self.powerSignal = Event('%s Power' % self.name, {'title': 'Power', 'group': group, 'order': next_seq(), 'schema': {'type': 'string', 'enum': ['off', 'on', 'cooling', 'warm-up']}})
+    self.inputSignal = Event('%s Input' % self.name, {'title': 'Input', 'group': group, 'order': next_seq(), 'schema': {'type': 'object', 'properties': {
+                                'number': {'type': 'integer', 'order': 1},
+                                'source': {'type': 'string', 'order': 2}}}})
+    self.errorsSignal = Event('%s Errors' % self.name, {'title': 'Errors', 'group': group, 'order': next_seq(), 'schema': {'type': 'object'}})
+    self.lampHoursSignal = Event('%s Lamp Hours' % self.name, {'title': 'Lamp hours', 'group': group, 'order': next_seq(), 'schema': {'type': 'string'}})
+    self.statusSignal = Event('%s Status' % self.name, {'title': 'Status', 'group': group, 'order': next_seq(), 'schema': {'type': 'object', 'properties': {
+                                'level': {'type': 'integer', 'order': 1},
+                                'message': {'type': 'string', 'order': 2}}}})
+
+  def poll(self):
+    '''Polls power, input, errors and lamps on one connection (blocking)'''
+    conn = pjlink.Connection(self.host, self.port, timeout=10)
+    try:
+      p = pjlink.Projector(conn)
+      if p.authenticate(lambda: self.password) == False:
+        raise pjlink.ProjectorError('authentication error')
+
+      results = p.get_many(['POWR', 'INPT', 'ERST', 'LAMP'])
+
+    finally:
+      conn.close()
+
+    power = results['POWR']
+    if isinstance(power, Exception):
+      raise power
+
+    self.powerSignal.emitIfDifferent(pjlink.parse_power(power))
+
+    # (input is unavailable while the projector is off)
+    inp = results['INPT']
+    if not isinstance(inp, Exception):
+      source, number = pjlink.parse_input(inp)
+      self.inputSignal.emitIfDifferent({'source': source, 'number': number})
+
+    errors = results['ERST']
+    if not isinstance(errors, Exception):
+      self.errorsSignal.emitIfDifferent(pjlink.describe_errors(errors))
+
+    lamps = results['LAMP']
+    if not isinstance(lamps, Exception):
+      self.lampHoursSignal.emitIfDifferent(pjlink.describe_lamp_hours(lamps))
+
+  def polled(self, now, interval):
+    self.failures = 0
+    self.statusSignal.emitIfDifferent({'level': 0, 'message': 'OK'})
+
+    # keep the phase, unless running behind
+    self.nextDue = max(self.nextDue + interval*1000, now)
+
+  def failed(self, now, interval, error):
+    self.failures += 1
+    self.statusSignal.emit({'level': 2, 'message': 'Not responding (%s failed polls) - %s' % (self.failures, error)})
+
+    backoff = min(interval * 2**(self.failures-1), MAX_BACKOFF)
+    self.nextDue = now + int(backoff * (1 + random.uniform(-JITTER, JITTER)) * 1000)
+
+class LatencyHistogram:
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+    self.failures = 0
+    self.total = 0
+
+  def add(self, millis, failed):
+    self._lock.acquire()
+    try:
+      i = 0
+      while i < len(LATENCY_BUCKETS) and millis > LATENCY_BUCKETS[i]:
+        i += 1
+
+      self.counts[i] += 1
+      self.total += millis
+
+      if failed:
+        self.failures += 1
+
+    finally:
+      self._lock.release()
+
+  def snapshot(self):
+    self._lock.acquire()
+    try:
+      polls = sum(self.counts)
+      buckets = [{'le': bound, 'count': count} for (bound, count) in zip(LATENCY_BUCKETS + [None], self.counts)]
+      return {'polls': polls, 'failures': self.failures, 'meanMillis': self.total / polls if polls > 0 else None, 'buckets': buckets}
+
+    finally:
+      self._lock.release()
+
+fleet = list()
+
+latencies = LatencyHistogram()
+
+pollQueue = Queue.Queue()
+
+workerThreads = list()
+
+lastDispatch = [None] # (system_clock millis)
+
+latencySignal = None
+
+def fleetSettings():
+  settings = param_fleetPolling or {}
+  return (settings.get('interval') or DEFAULT_INTERVAL, settings.get('workers') or DEFAULT_WORKERS)
+
+@after_main
+def initFleet():
+  if len(param_fleet or []) == 0:
+    return
+
+  interval, workers = fleetSettings()
+
+  # spread the first polls evenly across the interval
+  now = system_clock()
+  count = len(param_fleet)
+  for i, info in enumerate(param_fleet):
+    fleet.append(FleetProjector(info, now + interval*1000*i/count))
+
+  global latencySignal
+  latencySignal = Event('Fleet Poll Latency', {'title': 'Poll latency', 'group': 'Fleet', 'order': next_seq(), 'schema': {'type': 'object', 'properties': {
+                          'polls': {'type': 'integer', 'order': 1},
+                          'failures': {'type': 'integer', 'order': 2},
+                          'meanMillis': {'type': 'integer', 'order': 3}}}})
+
+  console.info('Polling %s fleet projector(s) every %ss using %s worker(s)' % (count, interval, workers))
+
+  Timer(dispatchPolls, 0.5)
+  Timer(lambda: latencySignal.emitIfDifferent(latencies.snapshot()), 10)
+
+def dispatchPolls():
+  now = system_clock()
+  lastDispatch[0] = now
+
+  # (starts the workers, or replaces any that quit while dispatching was held up)
+  startWorkers(fleetSettings()[1])
+
+  for projector in fleet:
+    if not projector.busy and now >= projector.nextDue:
+      projector.busy = True
+      pollQueue.put(projector)
+
+def startWorkers(count):
+  for worker in [worker for worker in workerThreads if not worker.isAlive()]:
+    workerThreads.remove(worker)
+
+  while len(workerThreads) < count:
+    worker = threading.Thread(target=pollWorker, name='PJLink fleet worker %s' % (len(workerThreads)+1))
+    worker.daemon = True
+    workerThreads.append(worker)
+    worker.start()
+
+def pollWorker():
+  interval = fleetSettings()[0]
+
+  while system_clock() - lastDispatch[0] < STALE_DISPATCH*1000:
+    try:
+      projector = pollQueue.get(timeout=1)
+    except Queue.Empty:
+      continue
+
+    start = system_clock()
+    try:
+      projector.poll()
+      latencies.add(system_clock() - start, False)
+      projector.polled(system_clock(), interval)
+
+    except:
+      # may not be native Python exception, so capture using 'sys'
+      eType, eValue, eTraceback = sys.exc_info()
+      latencies.add(system_clock() - start, True)
+      projector.failed(system_clock(), interval, eValue)
+
+    finally:
+      projector.busy = False
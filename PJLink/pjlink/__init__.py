@@ -1,4 +1,7 @@
 from pjlink.projector import (
-    Projector,
+    Projector, ProjectorError,
     MUTE_VIDEO, MUTE_AUDIO,
+    parse_power, parse_input, parse_errors, parse_lamps,
+    describe_errors, describe_lamp_hours,
 )
+from pjlink.connection import Connection
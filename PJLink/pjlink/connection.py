@@ -0,0 +1,44 @@
+import socket
+
+class Connection(object):
+    '''A buffered socket connection with the file-like calls the protocol uses.
+
+    Reads are served from a receive buffer filled a chunk at a time rather
+    than one byte per call, and 'read_until' searches the buffer directly.
+    '''
+
+    def __init__(self, host, port, timeout=10):
+        self.sock = socket.create_connection((host, port), timeout)
+        self._buf = ''
+
+    def _fill(self):
+        data = self.sock.recv(4096)
+        if not data:
+            raise IOError('connection closed by projector')
+        self._buf += data
+
+    def read(self, size):
+        while len(self._buf) < size:
+            self._fill()
+        data = self._buf[:size]
+        self._buf = self._buf[size:]
+        return data
+
+    def read_until(self, term):
+        i = self._buf.find(term)
+        while i < 0:
+            start = len(self._buf)
+            self._fill()
+            i = self._buf.find(term, start)
+        data = self._buf[:i]
+        self._buf = self._buf[i + len(term):]
+        return data
+
+    def write(self, data):
+        self.sock.sendall(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.sock.close()
@@ -93,6 +93,15 @@ class Projector(object):
             raise ProjectorError(response)
         return response
 
+    def get_many(self, bodies):
+        """Queries several bodies in one go, returning the responses by body
+        (or a ProjectorError for any that failed)."""
+        results = protocol.send_commands(self.f, [(body, '?') for body in bodies])
+        ret = {}
+        for body, (success, response) in zip(bodies, results):
+            ret[body] = response if success else ProjectorError(response)
+        return ret
+
     def set(self, body, param):
         success, response = protocol.send_command(self.f, body, param)
         if not success:
@@ -102,8 +111,7 @@ class Projector(object):
     # Power
 
     def get_power(self):
-        param = self.get('POWR')
-        return POWER_STATES_REV[param]
+        return parse_power(self.get('POWR'))
 
     def set_power(self, status, force=False):
         if not force:
@@ -113,11 +121,7 @@ class Projector(object):
     # Input
 
     def get_input(self):
-        param = self.get('INPT')
-        source, number = param
-        source = SOURCE_TYPES_REV[source]
-        number = int(number)
-        return (source, number)
+        return parse_input(self.get('INPT'))
 
     def set_input(self, source, number):
         source = SOURCE_TYPES[source]
@@ -141,30 +145,12 @@ class Projector(object):
     # Errors
 
     def get_errors(self):
-        param = self.get('ERST')
-        errors = 'fan lamp temperature cover filter other'.split()
-        assert len(param) == len(errors)
-        ret = {}
-        for key, value in zip(errors, param):
-          ret[key] = value
-        return ret
+        return parse_errors(self.get('ERST'))
 
     # Lamps
 
     def get_lamps(self):
-        param = self.get('LAMP')
-        assert len(param) <= 65
-        values = param.split(' ')
-        assert len(values) <= 16 and len(values) % 2 == 0
-
-        lamps = []
-        for time, state in zip(values[::2], values[1::2]):
-            time = int(time)
-            state = bool(int(state))
-            lamps.append((time, state))
-
-        assert len(lamps) <= 8
-        return lamps
+        return parse_lamps(self.get('LAMP'))
 
     # Input list
 
@@ -211,3 +197,52 @@ class Projector(object):
 
     # TODO: def get_class(self): self.get('CLSS')
     # once we know that class 2 is, and how to deal with it
+
+# response parsing (also used for the responses from 'get_many')
+
+def parse_power(param):
+    return POWER_STATES_REV[param]
+
+def parse_input(param):
+    source, number = param
+    source = SOURCE_TYPES_REV[source]
+    number = int(number)
+    return (source, number)
+
+def parse_errors(param):
+    errors = 'fan lamp temperature cover filter other'.split()
+    assert len(param) == len(errors)
+    ret = {}
+    for key, value in zip(errors, param):
+      ret[key] = value
+    return ret
+
+def parse_lamps(param):
+    assert len(param) <= 65
+    values = param.split(' ')
+    assert len(values) <= 16 and len(values) % 2 == 0
+
+    lamps = []
+    for time, state in zip(values[::2], values[1::2]):
+        time = int(time)
+        state = bool(int(state))
+        lamps.append((time, state))
+
+    assert len(lamps) <= 8
+    return lamps
+
+# presentation (shared by the recipe and its fleet polling)
+
+ERROR_LEVELS = {0: 'OK', 1: 'Warning', 2: 'Error'}
+
+def describe_errors(param):
+    '''Parses the errors, resolving each level into its text ('Unknown' if unrecognised)'''
+    errors = parse_errors(param)
+    for key in errors:
+        # (note: 'parse_errors' wraps the integer values as strings)
+        errors[key] = ERROR_LEVELS.get(int(errors[key]), 'Unknown')
+    return errors
+
+def describe_lamp_hours(param):
+    '''Parses the lamps into their hours, comma separated'''
+    return ', '.join([str(time) for (time, state) in parse_lamps(param)])
@@ -1,4 +1,8 @@
 def read_until(f, term):
+    # buffered connections can search for the terminator directly
+    if hasattr(f, 'read_until'):
+        return f.read_until(term)
+
     data = []
     c = f.read(1)
     while c != term:
@@ -46,14 +50,22 @@ ERRORS = {
 }
 
 def send_command(f, req_body, req_param):
-    data = to_binary(req_body, req_param)
-    f.write(data)
+    return send_commands(f, [(req_body, req_param)])[0]
+
+def send_commands(f, commands):
+    """Sends the (body, param) commands back-to-back and then reads their
+    responses in order, returning a (success, param) tuple for each."""
+    f.write(''.join([to_binary(body, param) for body, param in commands]))
     f.flush()
 
-    resp_body, resp_param = parse_response(f)
-    assert resp_body == req_body
+    results = []
+    for req_body, req_param in commands:
+        resp_body, resp_param = parse_response(f)
+        assert resp_body == req_body
 
-    if resp_param in ERRORS:
-        return False, ERRORS[resp_param]
-    return True, resp_param
+        if resp_param in ERRORS:
+            results.append((False, ERRORS[resp_param]))
+        else:
+            results.append((True, resp_param))
+    return results
 
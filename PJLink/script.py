@@ -2,8 +2,10 @@
 # This software is released under the MIT license (see license.txt for details)
 
 import pjlink
-import socket
 import sys
+from threading import RLock # for the shared session
+
+from fleet import param_fleet, param_fleetPolling, initFleet # (other projectors can be polled from this node)
 
 DEFAULT_PORT = 4352
 
@@ -51,134 +53,194 @@ def main():
 
 def local_action_RawPowerOn(arg=None):
   '''{"desc": "Turns projector on.", "group": "Power"}'''
-  p = get_projector()
-  if(p):
-    try:
-      p.set_power('on')
-    except Exception, e:
-      local_event_LastCommsError.emit(e)
-    finally:
-      p.f.close()
+  call_projector(lambda p: p.set_power('on'))
 
 def local_action_RawPowerOff(arg=None):
   '''{"desc": "Turns the projector off.", "group": "Power" }'''
-  p = get_projector()
-  if(p):
-    try:
-      p.set_power('off')
-    except Exception, e:
-      local_event_LastCommsError.emit(e)
-    finally:
-      p.f.close()
+  call_projector(lambda p: p.set_power('off'))
 
 def local_action_GetPower(arg=None):
   '''{"desc": "Get power state of projector.", "group": "Power" }'''
-  p = get_projector()
-  if(p):
-    try:
-      pwr = p.get_power()
-      local_event_PowerState.emit(pwr)
-      
-      # for status reporting
-      lastReceive[0] = system_clock()
+  pwr = call_projector(lambda p: p.get_power())
+  if pwr != None:
+    local_event_PowerState.emit(pwr)
       
-    except Exception, e:
-      local_event_LastCommsError.emit(e)
-    finally:
-      p.f.close()
+    # for status reporting
+    lastReceive[0] = system_clock()
 
 def local_action_RawSetInput(arg):
   '''{"desc": "Set projector input.", "group": "Inputs", "schema": { "type":"object", "required":true, "title": "Input", "properties":{ 
           "number": { "type":"integer", "title": "Number", "required":true }, 
           "source": { "type":"string", "title": "Source", "required":true, "enum": ["RGB", "VIDEO", "DIGITAL", "STORAGE", "NETWORK"] } } } }'''
-  p = get_projector()
-  if(p):
-    try:
-      p.set_input(arg['source'], arg['number'])
-    except Exception, e:
-      local_event_LastCommsError.emit(e)
-    finally:
-      p.f.close()
+  call_projector(lambda p: p.set_input(arg['source'], arg['number']))
 
 def local_action_GetInput(arg=None):
   '''{"desc": "Get current input.", "group": "Inputs" }'''
-  p = get_projector()
-  if(p):
-    try:
-      inp = p.get_input()
-      local_event_InputState.emit(inp) # legacy
-      local_event_Input.emit({'source': inp[0], 'number': inp[1]}) # managed
-      
-    except Exception, e:
-      local_event_LastCommsError.emit(e)
-    finally:
-      p.f.close()
+  inp = call_projector(lambda p: p.get_input())
+  if inp != None:
+    emitInput(inp)
+    
+def emitInput(inp):
+  local_event_InputState.emit(inp) # legacy
+  local_event_Input.emit({'source': inp[0], 'number': inp[1]}) # managed
 
 def local_action_Mute(what):
   '''{"schema": { "title": "What", "type": "string", "required": true, "enum" : ["video", "audio", "all"] }, "group": "Mute" }'''
-  p = get_projector()
-  if(p):
-    try:
-      what = { 'video': 1, 'audio': 2, 'all': 3, }[what]
-      p.set_mute(what, True)
-    except Exception, e:
-      local_event_LastCommsError.emit(e)
-    finally:
-      p.f.close()
+  what = { 'video': 1, 'audio': 2, 'all': 3, }[what]
+  call_projector(lambda p: p.set_mute(what, True))
 
 def local_action_Unmute(what):
   '''{"schema": { "title": "What", "type": "string", "required": true, "enum" : ["video", "audio", "all"] }, "group": "Mute" }'''
-  p = get_projector()
-  if(p):
-    try:
-      what = { 'video': 1, 'audio': 2, 'all': 3, }[what]
-      p.set_mute(what, False)
-    except Exception, e:
-      local_event_LastCommsError.emit(e)
-    finally:
-      p.f.close()
-
-PJLINK_ERRORBYLEVEL = {0: 'OK', 1: 'Warning', 2: 'Error'}
+  what = { 'video': 1, 'audio': 2, 'all': 3, }[what]
+  call_projector(lambda p: p.set_mute(what, False))
 
 def local_action_LampsAndErrors(x = None):
   '''{"desc": "Get lamp and errors info", "group": "Information" }'''
-  p = get_projector()
-  if(p):
-    try:
-      # get errors first in case lamps fails
-      errors = p.get_errors()
+  # (both queries go out back-to-back on the one connection)
+  results = call_projector(lambda p: p.get_many(['ERST', 'LAMP']))
+  if results != None:
+    emitLampsAndErrors(results)
+    
+def emitLampsAndErrors(results):
+  # errors first in case lamps fails
+  errors = results['ERST']
+  if isinstance(errors, Exception):
+    local_event_LastCommsError.emit(errors)
+  else:
+    errors = parse_reply(pjlink.describe_errors, errors)
+    if errors != None:
+      local_event_Errors.emit(errors)
+    
+  lamps = results['LAMP']
+  if isinstance(lamps, Exception):
+    local_event_LastCommsError.emit(lamps)
+  else:
+    lampHours = parse_reply(pjlink.describe_lamp_hours, lamps)
+    if lampHours != None:
+      local_event_LampHours.emit(lampHours)
+    
+def parse_reply(parser, reply):
+  '''Parses a (batched) reply, returning None if it's malformed (the error is emitted)'''
+  try:
+    return parser(reply)
+  
+  except:
+    # may not be native Python exception, so capture using 'sys'
+    eType, eValue, eTraceback = sys.exc_info()
+    local_event_LastCommsError.emit(eValue)
+    return None
+    
+def local_action_Poll(arg=None):
+  '''{"desc": "Gets power, input, lamp and errors info in one go", "group": "Information" }'''
+  results = call_projector(lambda p: p.get_many(['POWR', 'INPT', 'ERST', 'LAMP']))
+  if results == None:
+    return
+  
+  power = results['POWR']
+  if isinstance(power, Exception):
+    local_event_LastCommsError.emit(power)
+  else:
+    power = parse_reply(pjlink.parse_power, power)
+    if power != None:
+      local_event_PowerState.emit(power)
+      lastReceive[0] = system_clock()
+    
+  # (input is unavailable while the projector is off)
+  inp = results['INPT']
+  if not isinstance(inp, Exception):
+    inp = parse_reply(pjlink.parse_input, inp)
+    if inp != None:
+      emitInput(inp)
+    
+  emitLampsAndErrors(results)
+
+# <!--- persistent session
+#
+# The connection (and its authentication) is reused for consecutive calls, as long as it's not idle for
+# long; projectors typically drop connections idle for 30s and many only allow one connection at a time
+# so idle sessions are closed.
+
+SESSION_IDLE_TIMEOUT = 15 # (secs)
+
+sessionLock = RLock()
+
+# the authenticated projector and when it was last used
+session = { 'projector': None, 'lastUsed': 0 }
+
+def call_projector(func):
+  '''Calls 'func' with an authenticated projector, returning its result, or None on failure (the error is emitted).
+     A call that fails on a reused connection is retried once on a new one.'''
+  sessionLock.acquire()
+  try:
+    for attempt in range(2):
+      p = session['projector']
+      reused = p != None
       
-      for key in errors:
-        # resolve (overwrite) the error levels into text
-        # (note: 'get_errors' wraps the integer values as strings
-        errors[key] = PJLINK_ERRORBYLEVEL.get(int(errors[key]), 'Unknown')
+      if p == None:
+        p = get_projector()
+        if not p:
+          return None
+        
+        session['projector'] = p
       
-      local_event_Errors.emit(errors)
+      try:
+        result = func(p)
+        session['lastUsed'] = system_clock()
+        return result
+      
+      except pjlink.ProjectorError, e:
+        # (the projector responded with an error so the session itself is fine)
+        session['lastUsed'] = system_clock()
+        local_event_LastCommsError.emit(e)
+        return None
+      
+      except:
+        # may not be native Python exception, so capture using 'sys'
+        eType, eValue, eTraceback = sys.exc_info()
+        
+        close_session()
+        
+        if not reused:
+          local_event_LastCommsError.emit(eValue)
+          return None
+        
+        # otherwise the connection may have gone stale, so retry...
       
-      lampHours = list()
-      for i, (time, state) in enumerate(p.get_lamps()):
-          lampHours.append(str(time))
-          
-      local_event_LampHours.emit(', '.join(lampHours))
-          
-    except Exception, e:
-      local_event_LastCommsError.emit(e)
-    finally:
-      p.f.close()
+  finally:
+    sessionLock.release()
+
+def close_session():
+  sessionLock.acquire()
+  try:
+    p = session['projector']
+    if p != None:
+      session['projector'] = None
+      try:
+        p.f.close()
+      except:
+        pass
+      
+  finally:
+    sessionLock.release()
+    
+def closeIdleSession():
+  if session['projector'] != None and system_clock() - session['lastUsed'] > SESSION_IDLE_TIMEOUT*1000:
+    close_session()
+    
+timer_idleSession = Timer(closeIdleSession, 5)
 
 def get_projector():
+  conn = None
   try:
-    sock = socket.socket()
-    sock.settimeout(10) # envorce a conservative timeout to avoid 
-                        # any accidental lingering connections
-    sock.connect((param_ipAddress, param_port or DEFAULT_PORT))
-    f = sock.makefile()
-    proj = pjlink.Projector(f)
+    # envorce a conservative timeout to avoid any accidental lingering connections
+    conn = pjlink.Connection(param_ipAddress, param_port or DEFAULT_PORT, timeout=10)
+    proj = pjlink.Projector(conn)
     rv = proj.authenticate(lambda: param_password)
     if(rv or rv is None):
       return proj
     else:
       local_event_LastCommsError.emit('authentication error')
+      conn.close()
       return False
   except:
     # may not be native Python exception, so capture using 'sys'
@@ -186,9 +248,12 @@ def get_projector():
 
     local_event_LastCommsError.emit('connection error - %s' % eValue)
     
+    if conn != None:
+      conn.close()
+    
     return False
-  finally:
-    sock.close()
+
+# persistent session --->
 
 # managed power and input select
 
@@ -3,6 +3,8 @@
 DEFAULT_TCP_PORT = 1515 # Samsung's default port
 DEFAULT_SETID = 0
 
+from frameScanner import * # (for the fragmented binary protocol)
+
 param_ipAddress = Parameter({"value":"192.168.100.1","title":"IP address","order":0, "schema":{"type":"string"}})
 param_port = Parameter({"title": "TCP port", "order":0, "schema": {"type": "integer", 'hint': DEFAULT_TCP_PORT}})
 param_id = Parameter({"title": "Set ID", "order": 0, "schema": {"type":"integer", 'hint': 0}})
@@ -80,53 +82,30 @@ def connected():
   # wait a second and poll
   timer_deviceStatus.setDelay(1.0)
   
-recvBuffer = list()
-
 # data can be fragmented so need a special request queue to manage the protocol
+
+# aa-ff-00-09-41-00-01-00-00-14-10-00-00-6e
+#
+# aa   ff   00   09      41 ('A')    00       ...   6e
+# HDR  CMD  ID   length  ACK         R->Cmd   ...   checksum
+# +0   1    2    3       4           5  
+SAMSUNG_FRAME = FrameFormat(header='\xaa', lengthOffset=3, lengthAdjust=5, checksum=sum8Checksum)
   
 def received(data):
   lastReceive[0] = system_clock()
   log(3, 'tcp_recv [%s]' % data.encode('hex'))
-    
-  # aa-ff-00-09-41-00-01-00-00-14-10-00-00-6e
-  #
-  # aa   ff   00   09      41 ('A')    00
-  # HDR  CMD  ID   length  ACK         R->Cmd
-  # +0   1    2    3       4           5  
-  
-  if len(recvBuffer) == 0:
-    if data[0] != chr(0xaa):
-      console.log('bad header; throwing away...')
-      return
   
-  recvBuffer.extend(data)
-  
-  processBuffer()
+  scanner.feed(data)
       
-def processBuffer():
-  for x in range(300): # avoiding an infinite loop
-    bufferLen = len(recvBuffer)
-    if bufferLen < 5:
-      # not big enough yet
-      return
+def handleFrame(message):
+  log(2, 'recv_samsung [%s]' % message.encode('hex'))
   
-    # got at least 4 bytes (fourth holds the length)
-    messageLen = ord(recvBuffer[3])
+  queue.handle(message)
   
-    fullLen = 4 + messageLen + 1
+def handleDiscard(data, reason):
+  log(1, 'throwing away [%s] (%s)' % (data.encode('hex'), reason))
   
-    if len(recvBuffer) >= fullLen:
-      message = ''.join(recvBuffer[:fullLen])
-      del recvBuffer[:fullLen]
-      
-      log(2, 'recv_samsung [%s]' % message.encode('hex'))
-      
-      queue.handle(message)
-      
-      # might be more, so continue...
-      
-    else:
-      return
+scanner = FrameScanner(SAMSUNG_FRAME, handleFrame, onDiscard=handleDiscard)
   
 def sent(data):
   log(3, 'tcp_sent [%s]' % data.encode('hex'))
@@ -150,7 +129,7 @@ tcp = TCP(connected=connected, received=received, sent=sent, disconnected=discon
 def protocolTimeout():
   console.log('protocol timeout; flushing buffer')
   queue.clearQueue()
-  del recvBuffer[:]
+  scanner.clear()
   
 
 queue = request_queue(timeout=protocolTimeout)
@@ -0,0 +1,163 @@
+'''A stand-in VISCA over IP camera with configurable packet loss, for exercising the recipe's command channel.'''
+
+# Runs under CPython (2.7 or 3), e.g.
+#
+#   python fakeCamera.py --port 52381 --loss 0.2 --late-ack 0.1
+#
+# then point the node's 'IP address' and 'Port' at it. Commands are ACKed ('90 41 ff') and, after
+# --exec-time, completed ('90 51 ff'); inquiries are answered straight away. Retransmissions (the same
+# sequence number again) are ACKed again without re-executing. Each executed command is printed, so a
+# drive 'stop' that made it through is easy to spot.
+#
+# Loss applies independently to every packet in each direction. With --late-ack, that fraction of commands
+# has its ACK held back until after the Completion (as if the ACK were delayed in the network).
+
+import argparse
+import random
+import socket
+import threading
+import time
+
+TYPE_COMMAND = b'\x01\x00'
+TYPE_INQUIRY = b'\x01\x10'
+TYPE_REPLY = b'\x01\x11'
+TYPE_CONTROL = b'\x02\x00'
+TYPE_CONTROL_REPLY = b'\x02\x01'
+
+ACK = bytearray(b'\x90\x41\xff')
+COMPLETION = bytearray(b'\x90\x51\xff')
+
+PANTILT_DIRS = {(0x01, 0x03): 'left', (0x02, 0x03): 'right', (0x03, 0x01): 'up', (0x03, 0x02): 'down', (0x03, 0x03): 'stop'}
+
+class FakeCamera:
+  def __init__(self, port, loss, lateAck, execTime, verbose):
+    self.loss = loss
+    self.lateAck = lateAck
+    self.execTime = execTime
+    self.verbose = verbose
+
+    self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    self.sock.bind(('', port))
+
+    self.lastSeq = None # (retransmissions are re-ACKed, not re-executed)
+    self.focusMode = 0x02 # auto
+
+    self.stats = {'received': 0, 'dropped in': 0, 'dropped out': 0, 'duplicates': 0, 'executed': 0}
+    self.lock = threading.Lock()
+
+  def serve(self):
+    while True:
+      data, src = self.sock.recvfrom(1024)
+      data = bytearray(data)
+      self.stats['received'] += 1
+
+      if random.random() < self.loss:
+        self.stats['dropped in'] += 1
+        self.trace('x in  %s' % hexed(data))
+        continue
+
+      self.trace('<-    %s' % hexed(data))
+
+      if len(data) < 8:
+        continue
+
+      msgType = bytes(data[0:2])
+      seq = data[4:8]
+      payload = data[8:]
+
+      if msgType == TYPE_CONTROL:
+        if payload == bytearray(b'\x01'):
+          self.lastSeq = None
+          self.send(src, TYPE_CONTROL_REPLY, seq, bytearray(b'\x01'))
+
+      elif msgType == TYPE_INQUIRY:
+        self.send(src, TYPE_REPLY, seq, self.inquire(payload))
+
+      elif msgType == TYPE_COMMAND:
+        if seq == self.lastSeq:
+          self.stats['duplicates'] += 1
+          self.send(src, TYPE_REPLY, seq, ACK)
+          continue
+
+        self.lastSeq = seq
+
+        ackLate = random.random() < self.lateAck
+        if not ackLate:
+          self.send(src, TYPE_REPLY, seq, ACK)
+
+        timer = threading.Timer(self.execTime, self.execute, (src, seq, payload, ackLate))
+        timer.daemon = True
+        timer.start()
+
+  def execute(self, src, seq, payload, ackLate):
+    self.stats['executed'] += 1
+    print('%s  seq %s  %s' % (time.strftime('%H:%M:%S'), seqNo(seq), describe(payload)))
+
+    if payload[1:4] == bytearray(b'\x01\x04\x38'):
+      self.focusMode = payload[4]
+
+    self.send(src, TYPE_REPLY, seq, COMPLETION)
+    if ackLate:
+      self.send(src, TYPE_REPLY, seq, ACK)
+
+  def inquire(self, payload):
+    if payload[1:4] == bytearray(b'\x09\x04\x00'): # power
+      return bytearray(b'\x90\x50\x02\xff')
+    elif payload[1:4] == bytearray(b'\x09\x04\x38'): # focus mode
+      return bytearray([0x90, 0x50, self.focusMode, 0xff])
+    else:
+      return bytearray(b'\x90\x60\x02\xff') # syntax error
+
+  def send(self, dest, msgType, seq, payload):
+    packet = bytearray(msgType) + bytearray([len(payload) >> 8, len(payload) & 0xff]) + seq + payload
+
+    if random.random() < self.loss:
+      self.stats['dropped out'] += 1
+      self.trace('x out %s' % hexed(packet))
+      return
+
+    self.trace('->    %s' % hexed(packet))
+    with self.lock:
+      self.sock.sendto(bytes(packet), dest)
+
+  def trace(self, msg):
+    if self.verbose:
+      print(msg)
+
+def describe(payload):
+  if payload[1:4] == bytearray(b'\x01\x06\x01'):
+    return 'pantilt %s (speeds %s, %s)' % (PANTILT_DIRS.get((payload[6], payload[7]), 'diagonal'), payload[4], payload[5])
+  elif payload[1:4] == bytearray(b'\x01\x06\x04'):
+    return 'home'
+  elif payload[1:4] == bytearray(b'\x01\x04\x07'):
+    return 'zoom %02x' % payload[4]
+  elif payload[1:4] == bytearray(b'\x01\x04\x3f'):
+    return 'preset %s %s' % (['reset', 'set', 'recall'][payload[4]], payload[5])
+  else:
+    return hexed(payload)
+
+def seqNo(seq):
+  return (seq[0] << 24) + (seq[1] << 16) + (seq[2] << 8) + seq[3]
+
+def hexed(data):
+  return ':'.join(['%02x' % b for b in data])
+
+def main():
+  parser = argparse.ArgumentParser(description='Fake VISCA over IP camera')
+  parser.add_argument('--port', type=int, default=52381)
+  parser.add_argument('--loss', type=float, default=0.0, help='fraction of packets dropped in each direction')
+  parser.add_argument('--late-ack', type=float, default=0.0, help='fraction of commands whose ACK follows their Completion')
+  parser.add_argument('--exec-time', type=float, default=0.05, help='secs between ACK and Completion')
+  parser.add_argument('--verbose', action='store_true', help='trace every packet')
+  args = parser.parse_args()
+
+  camera = FakeCamera(args.port, args.loss, args.late_ack, args.exec_time, args.verbose)
+  print('Listening on UDP port %s (loss %s, late ACKs %s)' % (args.port, args.loss, args.late_ack))
+
+  try:
+    camera.serve()
+  except KeyboardInterrupt:
+    print(camera.stats)
+
+if __name__ == '__main__':
+  main()
@@ -38,6 +38,25 @@ def main():
 
 def udp_received(src, data):
     log(2, 'udp_recv %s (from %s)' % (':'.join([b.encode('hex') for b in data]), src))
+    
+    if len(data) < 8:
+        return
+    
+    msgType = data[0:2]
+    seq = (ord(data[4]) << 24) + (ord(data[5]) << 16) + (ord(data[6]) << 8) + ord(data[7])
+    payload = data[8:]
+    
+    if msgType == TYPE_REPLY:
+        handleReply(seq, payload)
+        
+    elif msgType == TYPE_CONTROL_REPLY:
+        handleControlReply(seq, payload)
+        
+    else:
+        return
+    
+    global _lastReceive
+    _lastReceive = system_clock()
 
 def udp_sent(data):
     log(1, 'udp_sent %s' % ':'.join([b.encode('hex') for b in data]))
@@ -131,6 +150,18 @@ def get_command_string(cmd_type, visca_addr, seq_number, data=None):
     elif cmd_type == 'focus_near':  # Standard
         msg_payload = address_to_hex(visca_addr) + '\x01\x04\x08\x03' + '\xff'
         msg_header = '\x01\x00' + payload_len_to_hex(msg_payload) + seq_to_hex(seq_number)
+    elif cmd_type == 'pantilt_drive':  # data is (pan speed, tilt speed, pan direction, tilt direction)
+        msg_payload = address_to_hex(visca_addr) + '\x01\x06\x01' + chr(data[0]) + chr(data[1]) + chr(data[2]) + chr(data[3]) + '\xff'
+        msg_header = '\x01\x00' + payload_len_to_hex(msg_payload) + seq_to_hex(seq_number)
+    elif cmd_type == 'zoom_drive':  # Variable, data is 0x2p (tele), 0x3p (wide) or 0x00 (stop)
+        msg_payload = address_to_hex(visca_addr) + '\x01\x04\x07' + chr(data) + '\xff'
+        msg_header = '\x01\x00' + payload_len_to_hex(msg_payload) + seq_to_hex(seq_number)
+    elif cmd_type == 'inq_power':
+        msg_payload = address_to_hex(visca_addr) + '\x09\x04\x00' + '\xff'
+        msg_header = '\x01\x10' + payload_len_to_hex(msg_payload) + seq_to_hex(seq_number)
+    elif cmd_type == 'inq_focus_mode':
+        msg_payload = address_to_hex(visca_addr) + '\x09\x04\x38' + '\xff'
+        msg_header = '\x01\x10' + payload_len_to_hex(msg_payload) + seq_to_hex(seq_number)
     else:
         raise Exception('Unsupported command type')
 
@@ -139,12 +170,225 @@ def get_command_string(cmd_type, visca_addr, seq_number, data=None):
 
 # -->
 
+# <!-- reliable channel
+
+# Commands go out one at a time: each is retransmitted (same sequence number, backing off) until the camera
+# ACKs it, then the next one is sent. ACKed commands are tracked until their Completion (or Error) arrives.
+#
+# Drive commands (pan/tilt, zoom, focus) supersede each other within their group so a burst of moves only
+# sends the latest and a 'stop' never waits behind a move that is being retransmitted.
+
+from collections import deque
+
+ACK_TIMEOUT = 0.25      # (secs) before the first retransmission, doubles each attempt
+MAX_ATTEMPTS = 4
+COMPLETION_TIMEOUT = 30 # (secs) ACKed commands are forgotten if their Completion never arrives
+
+# message types (VISCA over IP header)
+TYPE_COMMAND = '\x01\x00'
+TYPE_INQUIRY = '\x01\x10'
+TYPE_REPLY = '\x01\x11'
+TYPE_CONTROL = '\x02\x00'
+TYPE_CONTROL_REPLY = '\x02\x01'
+
+# error codes (from '90 6y ee ff' replies)
+ERROR_BUFFER_FULL = 0x03
+ERRORS = {0x01: 'message length error', 0x02: 'syntax error', 0x03: 'command buffer full', 0x04: 'command canceled',
+          0x05: 'no socket', 0x41: 'command not executable'}
+
+# commands that supersede each other, by group
+DRIVE_GROUPS = {'up': 'pantilt', 'down': 'pantilt', 'left': 'pantilt', 'right': 'pantilt', 'stop': 'pantilt', 'home': 'pantilt', 'pantilt_drive': 'pantilt',
+                'zoom_stop': 'zoom', 'zoom_tele': 'zoom', 'zoom_wide': 'zoom', 'zoom_drive': 'zoom',
+                'focus_stop': 'focus', 'focus_far': 'focus', 'focus_near': 'focus'}
+
+class ViscaCommand:
+    def __init__(self, cmd_type, data=None, onReply=None, onDone=None):
+        self.cmd_type = cmd_type
+        self.data = data
+        self.onReply = onReply   # (inquiries) called with the reply payload
+        self.onDone = onDone     # (optional) called with True once ACKed, False if it failed or was superseded
+        self.group = DRIVE_GROUPS.get(cmd_type)
+        self.seq = None
+        self.attempts = 0
+        self.sentAt = 0
+        self.timeout = 0         # (millis)
+
+_waiting = deque() # commands not sent yet
+_inFlight = [None] # the command awaiting its ACK (or inquiry reply)
+_executing = {}    # ACKed commands awaiting their Completion, by sequence number
+
+_seqNo = [0]
+_failedCommands = [0] # since the last status check
+
+def send_command(cmd_type, data=None, onReply=None, onDone=None):
+    cmd = ViscaCommand(cmd_type, data, onReply, onDone)
+    
+    if cmd.group != None:
+        # replace a superseded move that hasn't been sent yet (keeping its place)...
+        for i, waiting in enumerate(_waiting):
+            if waiting.group == cmd.group:
+                log(2, 'coalescing %s into %s' % (waiting.cmd_type, cmd_type))
+                _waiting[i] = cmd
+                done(waiting, False)
+                pump()
+                return
+            
+        # ...or stop retransmitting one that hasn't been ACKed
+        inFlight = _inFlight[0]
+        if inFlight != None and inFlight.group == cmd.group:
+            log(2, '%s supersedes unacknowledged %s' % (cmd_type, inFlight.cmd_type))
+            _inFlight[0] = None
+            done(inFlight, False)
+        
+    _waiting.append(cmd)
+    pump()
+    
+def pump():
+    if _inFlight[0] != None or len(_waiting) == 0:
+        return
+    
+    cmd = _waiting.popleft()
+    
+    if cmd.cmd_type == 'reset_seq':
+        cmd.seq = 0
+    else:
+        cmd.seq = _seqNo[0]
+        _seqNo[0] = (_seqNo[0] + 1) & 0xffffffff
+        
+    _inFlight[0] = cmd
+    transmit(cmd)
+    
+def transmit(cmd):
+    cmd.attempts += 1
+    cmd.sentAt = system_clock()
+    cmd.timeout = int(ACK_TIMEOUT * 1000 * 2 ** (cmd.attempts - 1))
+    
+    if cmd.attempts > 1:
+        log(1, 'retransmitting %s (seq %s, attempt %s)' % (cmd.cmd_type, cmd.seq, cmd.attempts))
+    
+    udp.send(get_command_string(cmd.cmd_type, _viscaAddress, cmd.seq, cmd.data))
+    
+def checkChannel():
+    now = system_clock()
+    
+    cmd = _inFlight[0]
+    if cmd != None and now - cmd.sentAt > cmd.timeout:
+        if cmd.attempts < MAX_ATTEMPTS:
+            transmit(cmd)
+        else:
+            failCommand(cmd, 'no reply after %s attempts' % cmd.attempts)
+            
+    for seq, cmd in _executing.items():
+        if now - cmd.sentAt > COMPLETION_TIMEOUT * 1000:
+            log(1, '%s (seq %s) never completed' % (cmd.cmd_type, seq))
+            del _executing[seq]
+    
+timer_checkChannel = Timer(checkChannel, 0.1)
+
+def failCommand(cmd, reason):
+    warn(1, '%s (seq %s) failed - %s' % (cmd.cmd_type, cmd.seq, reason))
+    _failedCommands[0] += 1
+    
+    if _inFlight[0] == cmd:
+        _inFlight[0] = None
+        done(cmd, False)
+        pump()
+        
+def done(cmd, acked):
+    if cmd.onDone != None:
+        onDone = cmd.onDone
+        cmd.onDone = None # (only once)
+        onDone(acked)
+    
+def handleReply(seq, payload):
+    # e.g. '90 41 ff' (ACK), '90 51 ff' (Completion), '90 50 02 ff' (inquiry reply), '90 60 03 ff' (Error)
+    if len(payload) < 3:
+        return
+    
+    kind = ord(payload[1]) & 0xf0
+    
+    cmd = _inFlight[0]
+    if cmd != None and cmd.seq == seq:
+        if kind == 0x40: # ACK
+            _inFlight[0] = None
+            _executing[seq] = cmd
+            done(cmd, True)
+            pump()
+        
+        elif kind == 0x50: # Completion (or inquiry reply)
+            _inFlight[0] = None
+            if cmd.onReply != None:
+                cmd.onReply(payload)
+            else:
+                # the ACK was lost or is running late, the Completion implies it
+                # (a late ACK then arrives as a stray reply)
+                log(2, '%s (seq %s) completed before its ACK' % (cmd.cmd_type, seq))
+                done(cmd, True)
+            pump()
+            
+        elif kind == 0x60: # Error
+            code = ord(payload[2])
+            if code == ERROR_BUFFER_FULL and cmd.attempts < MAX_ATTEMPTS:
+                # camera is busy, try again after the backoff
+                cmd.sentAt = system_clock()
+            else:
+                failCommand(cmd, ERRORS.get(code, 'error %02x' % code))
+                
+        return
+    
+    executing = _executing.get(seq)
+    if executing != None:
+        if kind == 0x50:
+            log(2, '%s (seq %s) completed' % (executing.cmd_type, seq))
+            del _executing[seq]
+            
+        elif kind == 0x60:
+            code = ord(payload[2])
+            del _executing[seq]
+            
+            if code != 0x04: # (superseded commands are canceled, that's expected)
+                failCommand(executing, ERRORS.get(code, 'error %02x' % code))
+                
+        return
+        
+    log(2, 'ignoring stray reply (seq %s)' % seq)
+    
+def handleControlReply(seq, payload):
+    if payload == '\x01':
+        cmd = _inFlight[0]
+        if cmd != None and cmd.cmd_type == 'reset_seq':
+            log(1, 'sequence number reset')
+            _seqNo[0] = 0
+            _inFlight[0] = None
+            pump()
+    
+    elif payload == '\x0f\x01':
+        warn(1, 'camera reports abnormal sequence number; resetting')
+        resetSequenceNo()
+        
+    elif payload == '\x0f\x02':
+        warn(1, 'camera reports abnormal message')
+    
+# -->
+
+
 # <!-- actions
 
 def resetSequenceNo():
     console.log('[resetSequenceNo] called')
-    ctrlCmd_reset_seq = get_command_string('reset_seq', _viscaAddress, next_seq() + 20000)
-    udp.send(ctrlCmd_reset_seq)
+    
+    # the reset goes out before anything else, an unacknowledged command is re-sent after it
+    inFlight = _inFlight[0]
+    _inFlight[0] = None
+    
+    if inFlight != None and inFlight.cmd_type != 'reset_seq':
+        inFlight.attempts = 0
+        _waiting.appendleft(inFlight)
+        
+    if not any([cmd.cmd_type == 'reset_seq' for cmd in _waiting]):
+        _waiting.appendleft(ViscaCommand('reset_seq'))
+        
+    pump()
 
     
 # -- drive related --
@@ -186,38 +430,32 @@ def TiltSpeed(arg):
 @local_action({'group': 'PTZ Drive', 'title': 'Home', 'order': next_seq()})
 def ptz_home(ignore):
     console.log('[ptz_home] called')
-    inquery_ptdHome = get_command_string('home', _viscaAddress, next_seq() + 20000)
-    udp.send(inquery_ptdHome)
+    send_command('home')
 
 @local_action({'group': 'PTZ Drive', 'title': 'Up', 'order': next_seq()})
 def ptz_up(data):
     console.log('[ptz_up] called')
-    inquery_ptdUp = get_command_string('up', _viscaAddress, next_seq() + 20000)
-    udp.send(inquery_ptdUp)
+    send_command('up')
 
 @local_action({'group': 'PTZ Drive', 'title': 'Down', 'order': next_seq()})
 def ptz_down(data):
     console.log('[ptz_down] called')
-    inquery_ptdDown = get_command_string('down', _viscaAddress, next_seq() + 20000)
-    udp.send(inquery_ptdDown)
+    send_command('down')
 
 @local_action({'group': 'PTZ Drive', 'title': 'Left', 'order': next_seq()})
 def ptz_left(data):
     console.log('[ptz_left] called')
-    inquery_ptdLeft = get_command_string('left', _viscaAddress, next_seq() + 20000)
-    udp.send(inquery_ptdLeft)
+    send_command('left')
 
 @local_action({'group': 'PTZ Drive', 'title': 'Right', 'order': next_seq()})
 def ptz_right(data):
     console.log('[ptz_right] called')
-    inquery_ptdRight = get_command_string('right', _viscaAddress, next_seq() + 20000)
-    udp.send(inquery_ptdRight)
+    send_command('right')
 
 @local_action({'group': 'PTZ Drive', 'title': 'Stop', 'order': next_seq()})
 def ptz_stop(data):
     console.log('[ptz_stop] called')
-    inquery_ptdStop = get_command_string('stop', _viscaAddress, next_seq() + 20000)
-    udp.send(inquery_ptdStop)
+    send_command('stop')
 
     
 # -- preset related --
@@ -225,40 +463,179 @@ def ptz_stop(data):
 @local_action({'group': 'PTZ Preset', 'title': 'Preset Reset', 'order': next_seq(), 'schema': {'type': 'integer'}})
 def ptz_preset_reset(data):
     console.log('[ptz_preset_reset] called')
-    inquery_presetReset = get_command_string('preset_reset', _viscaAddress, next_seq() + 20000, data)
-    udp.send(inquery_presetReset)
+    send_command('preset_reset', data)
 
 @local_action({'group': 'PTZ Preset', 'title': 'Preset Set', 'order': next_seq(), 'schema': {'type': 'integer'}})
 def ptz_preset_set(data):
     console.log('[ptz_preset_set] called')
-    inquery_presetSet = get_command_string('preset_set', _viscaAddress, next_seq() + 20000, data)
-    udp.send(inquery_presetSet)
+    send_command('preset_set', data)
 
 @local_action({'group': 'PTZ Preset', 'title': 'Preset Recall', 'order': next_seq(), 'schema': {'type': 'integer'}})
 def ptz_preset_recall(arg):
     console.log('[ptz_preset_recall] called')
-    inquery_presetRecall = get_command_string('preset_recall', _viscaAddress, next_seq() + 20000, arg)
-    udp.send(inquery_presetRecall)
+    send_command('preset_recall', arg)
 
 
 # -- Zoom related --
 @local_action({'group': 'PTZ Zoom', 'title': 'Zoom Stop', 'order': next_seq()})
 def ptz_zoom_stop(arg):
     console.log('[ptz_zoom_stop] called')
-    inquery_zoomStop = get_command_string('zoom_stop', _viscaAddress, next_seq() + 20000)
-    udp.send(inquery_zoomStop)
+    send_command('zoom_stop')
 
 @local_action({'group': 'PTZ Zoom', 'title': 'Zoom Tele', 'order': next_seq()})
 def ptz_zoom_tele(arg):
     console.log('[ptz_zoom_tele] called')
-    inquery_zoomTele = get_command_string('zoom_tele', _viscaAddress, next_seq() + 20000)
-    udp.send(inquery_zoomTele)
+    send_command('zoom_tele')
 
 @local_action({'group': 'PTZ Zoom', 'title': 'Zoom Wide', 'order': next_seq()})
 def ptz_zoom_wide(arg):
     console.log('[ptz_zoom_wide] called')
-    inquery_zoomWide = get_command_string('zoom_wide', _viscaAddress, next_seq() + 20000)
-    udp.send(inquery_zoomWide)
+    send_command('zoom_wide')
+
+# -- Streaming (joystick) --
+
+# A joystick can drive 'Drive Vector' at 20-50 Hz; samples are only ever sent at the stream rate and
+# only once the camera has ACKed the previous one (so its command buffer never floods). Samples that
+# arrive in between are dropped in favour of the latest. A stop is sent straight away and, like all
+# commands, retransmitted until it is ACKed.
+
+DEFAULT_STREAM_RATE = 10 # (Hz)
+
+param_streamRate = Parameter({'title': 'PTZ stream rate (Hz)', 'desc': 'The most drive commands per second sent from "Drive Vector" (default %s)' % DEFAULT_STREAM_RATE,
+                              'schema': {'type': 'integer', 'hint': str(DEFAULT_STREAM_RATE)}})
+
+DEADZONE = 0.02 # (velocities below this are treated as zero)
+
+MAX_PANTILT_SPEED = 24
+MAX_ZOOM_SPEED = 7
+
+class StreamAxis:
+    '''The latest (sampled) command for one drive group and what was last sent'''
+    
+    def __init__(self, stopCommand):
+        self.stopCommand = stopCommand
+        self.latest = stopCommand # (cmd_type, data)
+        self.stamp = 0            # when 'latest' was sampled (system_clock)
+        self.sent = stopCommand
+        self.busy = False         # sent and not ACKed yet
+        self.sends = 0            # identifies the outstanding send
+        
+    def sample(self, command, now):
+        if self.latest != self.sent:
+            # the previous sample was never sent
+            _streamStats['dropped'] += 1
+            
+        self.latest = command
+        self.stamp = now
+        
+        # stops go out immediately
+        if command == self.stopCommand and self.sent != command:
+            self.send()
+        
+    def tick(self):
+        if not self.busy and self.latest != self.sent:
+            self.send()
+            
+    def send(self):
+        command = self.latest
+        stamp = self.stamp
+        
+        self.sent = command
+        self.busy = True
+        self.sends += 1
+        _streamStats['sent'] += 1
+        
+        sendNo = self.sends
+        
+        def onDone(acked):
+            # (a superseded send completes after its replacement has gone out)
+            if sendNo != self.sends:
+                return
+            
+            self.busy = False
+            if acked:
+                recordLatency(system_clock() - stamp)
+            else:
+                # (failed, so the next tick sends the latest again, a final stop must never be lost)
+                self.sent = None
+            
+        send_command(command[0], command[1], onDone=onDone)
+        
+_panTiltAxis = StreamAxis(('pantilt_drive', (1, 1, 0x03, 0x03)))
+_zoomAxis = StreamAxis(('zoom_drive', 0x00))
+
+_streamStats = {'samples': 0, 'sent': 0, 'dropped': 0, 'lastLatency': None, 'meanLatency': None, 'maxLatency': None}
+_latencyTotal = [0, 0] # (sum, count)
+
+def recordLatency(millis):
+    _latencyTotal[0] += millis
+    _latencyTotal[1] += 1
+    
+    _streamStats['lastLatency'] = millis
+    _streamStats['meanLatency'] = _latencyTotal[0] / _latencyTotal[1]
+    _streamStats['maxLatency'] = max(_streamStats['maxLatency'] or 0, millis)
+
+def toSpeed(velocity, maxSpeed):
+    return max(1, min(maxSpeed, int(round(abs(velocity) * maxSpeed))))
+
+@local_action({'group': 'PTZ Drive', 'title': 'Drive Vector', 'order': next_seq(), 'desc': 'For joysticks, velocities from -1 to 1, any left out are unchanged',
+               'schema': {'type': 'object', 'properties': {
+                   'pan':  {'type': 'number', 'order': 1, 'desc': '-1 (left) to 1 (right)'},
+                   'tilt': {'type': 'number', 'order': 2, 'desc': '-1 (down) to 1 (up)'},
+                   'zoom': {'type': 'number', 'order': 3, 'desc': '-1 (wide) to 1 (tele)'}}}})
+def ptz_vector(arg):
+    now = system_clock()
+    _streamStats['samples'] += 1
+    
+    pan = arg.get('pan')
+    tilt = arg.get('tilt')
+    
+    if pan != None or tilt != None:
+        # (an axis left out keeps its current velocity)
+        prevPanTilt = _panTiltAxis.latest[1]
+        
+        if pan == None:       panSpeed, panDir = prevPanTilt[0], prevPanTilt[2]
+        elif pan <= -DEADZONE: panSpeed, panDir = toSpeed(pan, MAX_PANTILT_SPEED), 0x01
+        elif pan >= DEADZONE:  panSpeed, panDir = toSpeed(pan, MAX_PANTILT_SPEED), 0x02
+        else:                  panSpeed, panDir = 1, 0x03
+        
+        if tilt == None:       tiltSpeed, tiltDir = prevPanTilt[1], prevPanTilt[3]
+        elif tilt >= DEADZONE:  tiltSpeed, tiltDir = toSpeed(tilt, MAX_PANTILT_SPEED), 0x01
+        elif tilt <= -DEADZONE: tiltSpeed, tiltDir = toSpeed(tilt, MAX_PANTILT_SPEED), 0x02
+        else:                   tiltSpeed, tiltDir = 1, 0x03
+        
+        # (speeds are irrelevant for a stopped axis, normalise them so a stop is always the same command)
+        if panDir == 0x03:  panSpeed = 1
+        if tiltDir == 0x03: tiltSpeed = 1
+        
+        _panTiltAxis.sample(('pantilt_drive', (panSpeed, tiltSpeed, panDir, tiltDir)), now)
+        
+    zoom = arg.get('zoom')
+    if zoom != None:
+        if zoom >= DEADZONE:    _zoomAxis.sample(('zoom_drive', 0x20 + toSpeed(zoom, MAX_ZOOM_SPEED)), now)
+        elif zoom <= -DEADZONE: _zoomAxis.sample(('zoom_drive', 0x30 + toSpeed(zoom, MAX_ZOOM_SPEED)), now)
+        else:                   _zoomAxis.sample(('zoom_drive', 0x00), now)
+        
+def streamTick():
+    _panTiltAxis.tick()
+    _zoomAxis.tick()
+
+@after_main
+def startStreaming():
+    timer_stream.setInterval(1.0 / (param_streamRate or DEFAULT_STREAM_RATE))
+    timer_stream.start()
+
+timer_stream = Timer(streamTick, 1.0 / DEFAULT_STREAM_RATE, 0, stopped=True)
+
+local_event_StreamStats = LocalEvent({'group': 'PTZ Drive', 'title': 'Stream Stats', 'order': next_seq(), 'desc': 'Latencies are from sample to ACK in millis', 'schema': {'type': 'object', 'properties': {
+                                        'samples':     {'type': 'integer', 'order': 1},
+                                        'sent':        {'type': 'integer', 'order': 2},
+                                        'dropped':     {'type': 'integer', 'order': 3},
+                                        'lastLatency': {'type': 'integer', 'order': 4},
+                                        'meanLatency': {'type': 'integer', 'order': 5},
+                                        'maxLatency':  {'type': 'integer', 'order': 6}}}})
+
+timer_streamStats = Timer(lambda: local_event_StreamStats.emitIfDifferent(dict(_streamStats)), 2)
 
 # -- Focus related --
 le_Focus_Mode = create_local_event(
@@ -276,57 +653,52 @@ le_Focus_Mode = create_local_event(
 @local_action({'group': 'PTZ Focus', 'title': 'Focus Mode - Auto', 'order': next_seq()})
 def ptz_focus_mode_auto(arg):
     console.log('[ptz_focus_mode_auto] called')
-    inquery_focusModeAuto = get_command_string('focus_auto', _viscaAddress, next_seq() + 20000)
-    udp.send(inquery_focusModeAuto)
+    send_command('focus_auto')
     le_Focus_Mode.emit('AUTO')
 
 @local_action({'group': 'PTZ Focus', 'title': 'Focus Mode - Manual', 'order': next_seq()})
 def ptz_focus_mode_manual(arg):
     console.log('[ptz_focus_mode_manual] called')
-    inquery_focusModeManual = get_command_string('focus_manual', _viscaAddress, next_seq() + 20000)
-    udp.send(inquery_focusModeManual)
+    send_command('focus_manual')
     le_Focus_Mode.emit('MANUAL')
 
 @local_action({'group': 'PTZ Focus', 'title': 'Focus - Stop', 'order': next_seq()})
 def ptz_focus_stop(arg):
     console.log('[ptz_focus_stop] called')
-    inquery_focusStop = get_command_string('focus_stop', _viscaAddress, next_seq() + 20000)
-    udp.send(inquery_focusStop)
+    send_command('focus_stop')
 
 @local_action({'group': 'PTZ Focus', 'title': 'Focus - Far', 'order': next_seq()})
 def ptz_focus_far(arg):
     console.log('[ptz_focus_far] called')
-    inquery_focusFar = get_command_string('focus_far', _viscaAddress, next_seq() + 20000)
-    udp.send(inquery_focusFar)
+    send_command('focus_far')
 
 @local_action({'group': 'PTZ Focus', 'title': 'Focus - Near', 'order': next_seq()})
 def ptz_focus_near(arg):
     console.log('[ptz_focus_near] called')
-    inquery_focusNear = get_command_string('focus_near', _viscaAddress, next_seq() + 20000)
-    udp.send(inquery_focusNear)
+    send_command('focus_near')
+
+# -- Status related --
+local_event_Power = LocalEvent({'group': 'Status', 'title': 'Power', 'order': next_seq(), 'schema': {'type': 'string', 'enum': ['On', 'Standby']}})
 
 @local_action({'group': 'Status', 'order': next_seq()})
-def httpPoll():
-  # look for this token if result to be sure
-  TOKEN = 'birddog_p200.png'
+def poll():
+  # inquiry replies also count as contact (see 'udp_received')
+  send_command('inq_power', onReply=handlePowerReply)
+  send_command('inq_focus_mode', onReply=handleFocusModeReply)
   
-  url = 'http://%s/login' % param_ipAddress
-
-  try:
-    log(2, 'httpPoll %s' % url)
-    resp = get_url(url, connectTimeout=5)
-    
-    if TOKEN not in resp:
-      console.warn('unexpected response! did not find token [%s] in response from %s' % (TOKEN, url))
-      return
-    
-    global _lastReceive
-    _lastReceive = system_clock()
-   
-  except:
-    log(1, 'problem polling %s' % url)
+def handlePowerReply(payload):
+  # e.g. '90 50 02 ff' (on) or '90 50 03 ff' (standby)
+  state = ord(payload[2])
+  if state == 0x02:   local_event_Power.emit('On')
+  elif state == 0x03: local_event_Power.emit('Standby')
+  
+def handleFocusModeReply(payload):
+  # e.g. '90 50 02 ff' (auto) or '90 50 03 ff' (manual)
+  mode = ord(payload[2])
+  if mode == 0x02:   le_Focus_Mode.emitIfDifferent('AUTO')
+  elif mode == 0x03: le_Focus_Mode.emitIfDifferent('MANUAL')
 
-timer_poller = Timer(lambda: httpPoll.call(), 30, 5) # every 30s, first after 5    
+timer_poller = Timer(lambda: poll.call(), 30, 5) # every 30s, first after 5    
 
 # -->
 
@@ -357,7 +729,13 @@ def statusCheck():
     local_event_Status.emit({'level': 2, 'message': message})
     return
     
-  local_event_Status.emit({'level': 0, 'message': 'OK'})
+  failed = _failedCommands[0]
+  _failedCommands[0] = 0
+  
+  if failed > 0:
+    local_event_Status.emit({'level': 1, 'message': '%s command(s) failed or were not acknowledged recently' % failed})
+  else:
+    local_event_Status.emit({'level': 0, 'message': 'OK'})
   
   local_event_LastContactDetect.emit(str(now))
   
@@ -0,0 +1,176 @@
+'''Replays captured meter broadcasts through this recipe and reports packets per second.'''
+
+# Runs under CPython 2.7 (script.py is Jython 2.7 code), outside Nodel, e.g.
+#
+#   python replayMeters.py --packets 20000
+#   python replayMeters.py --capture meters.txt --change 0.5 --interval 50
+#   python replayMeters.py --script /tmp/old/script.py     (to compare another version of the recipe)
+#
+# Captured packets are read from --capture, one packet per line as hex bytes (separators are ignored, so the
+# ':'-separated dumps the recipe can print work as they are). Without it, the meter broadcasts captured in
+# "neutrino protocol.txt" are used.
+#
+# script.py is loaded with a minimal stand-in for the toolkit globals it touches (Parameters, Events, UDP, TCP,
+# Timer). The packets are fed to handleMetersBroadcastUDP() as if each arrived --interval millis after the
+# last, on a simulated clock so the rate limiting behaves as it would live. Between packets, --change of the
+# meters take a random step of up to --step dB (the rest hold their level, as idle channels do). The wall
+# clock time taken gives the packets (and meters) per second and the emit counts show how much reaches clients.
+
+import argparse
+import os
+import random
+import re
+import struct
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+HEADER_SIZE = 19  # up to and including the result code
+PAYLOAD_SIZE = 18 # the value is the last 4 bytes
+
+class StandInEvent:
+  def __init__(self, name=None, metadata=None):
+    self.name = name
+    self.emits = 0
+
+  def emit(self, arg=None):
+    self.emits += 1
+
+  def getArg(self):
+    return None
+
+class StandInConsole:
+  def log(self, message):
+    pass
+
+  info = warn = error = log
+
+class StandInTimer:
+  def __init__(self, *args, **kwargs):
+    pass
+
+  def start(self):
+    pass
+
+  def stop(self):
+    pass
+
+class StandIns:
+  def __init__(self):
+    self.now = 0 # (simulated millis)
+    self.events = []
+
+  def event(self, name, metadata=None):
+    event = StandInEvent(name)
+    self.events.append(event)
+    return event
+
+def loadRecipe(path, standIns):
+  ns = {'__name__': 'recipe', 'Parameter': lambda metadata: None, 'LocalEvent': StandInEvent, 'Event': standIns.event,
+        'UDP': lambda **kwargs: None, 'TCP': lambda **kwargs: None, 'Timer': StandInTimer, 'console': StandInConsole(),
+        'system_clock': lambda: standIns.now}
+  exec(compile(open(path).read(), path, 'exec'), ns)
+  return ns
+
+def readPackets(path):
+  '''Meter broadcasts (connection type 3) from a file of hex dumps, one packet per line'''
+  packets = []
+
+  for line in open(path):
+    data = ''.join([chr(int(b, 16)) for b in re.findall(r'(?<![0-9a-fA-Fx])[0-9a-fA-F]{2}(?![0-9a-fA-F])', line)])
+
+    if len(data) < HEADER_SIZE + 1 or data[0] != '\x04' or data[4] != '\x03':
+      continue
+
+    if struct.unpack('>H', data[1:3])[0] + 2 != len(data):
+      # (not a whole packet, the length leaves out the start and stop flags)
+      continue
+
+    packets.append(data)
+
+  return packets
+
+def valueOffsets(packet):
+  '''The offsets of each payload's value'''
+  i = HEADER_SIZE
+  count = 1
+
+  if ord(packet[17]) == 2: # (multiple control, prefixed by a count)
+    count = struct.unpack('>H', packet[i:i+2])[0]
+    i += 2
+
+  return [i + n * PAYLOAD_SIZE + PAYLOAD_SIZE - 4 for n in range(count)]
+
+def main():
+  parser = argparse.ArgumentParser(description='Replay Neutrino meter broadcasts through the recipe')
+  parser.add_argument('--script', default=os.path.join(HERE, 'script.py'))
+  parser.add_argument('--capture', default=os.path.join(HERE, 'neutrino protocol.txt'))
+  parser.add_argument('--packets', type=int, default=20000, help='to replay')
+  parser.add_argument('--interval', type=float, default=100, help='simulated millis between packets')
+  parser.add_argument('--change', type=float, default=0.3, help='fraction of meters moving between packets')
+  parser.add_argument('--step', type=float, default=3, help='largest move (dB)')
+  parser.add_argument('--seed', type=int, default=1)
+  args = parser.parse_args()
+
+  rng = random.Random(args.seed)
+
+  captured = readPackets(args.capture)
+  if len(captured) == 0:
+    print('No meter packets found in %s' % args.capture)
+    return
+
+  standIns = StandIns()
+  ns = loadRecipe(args.script, standIns)
+
+  # (accept the captured unit's broadcasts)
+  srcMac = captured[0][5:11]
+  ns['param_mac'] = ':'.join(['%02x' % ord(c) for c in srcMac])
+  if 'lateInit' in ns:
+    ns['lateInit']()
+  ns['srcMacDecoded'] = srcMac
+
+  # pre-build the replayed packets so only the recipe is timed
+  levels = {}
+  packets = []
+  for n in range(args.packets):
+    packet = bytearray(captured[n % len(captured)])
+
+    for offset in valueOffsets(str(packet)):
+      key = (n % len(captured), offset)
+      if key not in levels:
+        levels[key] = struct.unpack('>i', str(packet[offset:offset+4]))[0]
+      elif rng.random() < args.change:
+        levels[key] += int(rng.uniform(-args.step, args.step) * 1000) # (milli dB)
+
+      packet[offset:offset+4] = struct.pack('>i', levels[key])
+
+    packets.append(str(packet))
+
+  meters = sum([len(valueOffsets(packet)) for packet in packets])
+
+  handle = ns['handleMetersBroadcastUDP']
+  flush = ns.get('flushMeters')
+  nextFlush = 100
+
+  start = time.time()
+  for packet in packets:
+    standIns.now += args.interval
+    handle('192.168.178.66:10006', packet)
+
+    # (the recipe's 100 ms flush timer, on the simulated clock)
+    if flush is not None and standIns.now >= nextFlush:
+      flush()
+      nextFlush += 100
+
+  secs = time.time() - start
+
+  emits = sum([event.emits for event in standIns.events])
+  simulatedSecs = standIns.now / 1000.0
+
+  print('%s: %s packets (%s meters each on average) from %s capture(s)' % (os.path.basename(args.script), len(packets), meters / len(packets), len(captured)))
+  print('  %.0f packets/s, %.0f meters/s (%.1f us per packet)' % (len(packets) / secs, meters / secs, secs / len(packets) * 1000000))
+  print('  %s meter events, %s emits over %.0f simulated secs (%.2f per meter per sec)' % (
+        len(standIns.events), emits, simulatedSecs, emits / simulatedSecs / max(1, len(standIns.events))))
+
+if __name__ == '__main__':
+  main()
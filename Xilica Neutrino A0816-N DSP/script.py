@@ -2,9 +2,22 @@
 
 # TODO: check 'dst' address to ensure packet's from correct unit.
 
+import struct
+
+DEFAULT_METER_DEADBAND = 0.5 # (dB)
+DEFAULT_METER_MAX_RATE = 5   # (emits per second, per meter)
+
 param_debugDumpTCP = Parameter({"title": "Dump TCP data", "group": "Debugging", "order": 0,
                        "schema": { "type": "boolean" } })
 
+param_meterDeadband = Parameter({"title": "Meter deadband (dB)", "group": "Meters", "order": 1,
+                       "desc": "Meter changes smaller than this are not emitted (default %s dB)" % DEFAULT_METER_DEADBAND,
+                       "schema": { "type": "number", "hint": str(DEFAULT_METER_DEADBAND) } })
+
+param_meterMaxRate = Parameter({"title": "Meter max. emit rate (per sec)", "group": "Meters", "order": 2,
+                       "desc": "The most often any one meter is emitted, the latest level is always emitted eventually (default %s)" % DEFAULT_METER_MAX_RATE,
+                       "schema": { "type": "number", "hint": str(DEFAULT_METER_MAX_RATE) } })
+
 param_mac = Parameter({"title": "MAC address", 
                        "desc": "The MAC address of the Neutrino unit which is used in broadcast protocols, e.g. '00:aa:bb:cc:dd:ee'",
                        "schema": { "type": "string", "hint": "00:aa:bb:cc:dd:ee"}, "order": 0})
@@ -29,8 +42,12 @@ srcMacDecoded = '000000000000'.decode('hex')
     
 # Driver section:    
     
-# holds the meter events by full ID ('$MODNAME_$MOD_NUM.$CH_NUM.$AUX')
-meterEventsByFullId = {}
+# holds the meters by full ID ('$MODNAME_$MOD_NUM.$CH_NUM.$AUX')
+metersByFullId = {}
+
+# (from the parameters, see 'lateInit')
+meterDeadband = DEFAULT_METER_DEADBAND
+minEmitGap = 1000 / DEFAULT_METER_MAX_RATE # (millis)
 
 controlEventsByFullId = {}
 
@@ -124,6 +141,13 @@ def lateInit():
     global srcMacDecoded
     srcMacDecoded = macToBits(param_mac)
 
+    global meterDeadband, minEmitGap
+    meterDeadband = DEFAULT_METER_DEADBAND if param_meterDeadband is None else param_meterDeadband
+
+    # (0 for no limit)
+    maxRate = DEFAULT_METER_MAX_RATE if param_meterMaxRate is None else param_meterMaxRate
+    minEmitGap = 1000.0 / maxRate if maxRate > 0 else 0
+
 def main(arg = None):
     # Start your script here.
     print 'Nodel script started.'
@@ -139,7 +163,7 @@ def composeID(packet):
 def processNeutrinoPacket(packet):
     if packet.connType == CONN_TYPE_UDP_METER:
         for meterPacket in packet.packets:
-        	processMeterPacket(meterPacket)
+            processMeterPacket(meterPacket)
 
     elif packet.connType == CONN_TYPE_TCP:
         for controlPacket in packet.packets:
@@ -151,15 +175,63 @@ def processMeterPacket(meterPacket):
     # create events
     fullId = composeID(meterPacket)
     
-    # get event if it exists
-    event = meterEventsByFullId.get(fullId)
-    if event is None:
-        event = bindMeter(meterPacket, fullId)
+    # get meter if it exists
+    meter = metersByFullId.get(fullId)
+    if meter is None:
+        meter = bindMeter(meterPacket, fullId)
     
-    event.emit(meterPacket.value)
+    meter.update(meterPacket.value, system_clock())
     # not adding 'units' as below
     # event.emit('%s %s' % (meterPacket.value, meterPacket.unit))
 
+# Holds the last emitted level of a meter so packets that barely change it (within
+# the deadband) or arrive faster than the max. rate don't fan out to every client.
+class Meter:
+    def __init__(self, fullId, event, unit):
+        self.fullId = fullId
+        self.event = event
+        self.useDeadband = unit == 'dB'
+        self.emitted = None
+        self.lastEmit = 0 # (system_clock millis)
+
+    def update(self, value, now):
+        emitted = self.emitted
+        if emitted is None:
+            self.emit(value, now)
+            return
+
+        if value == emitted or (self.useDeadband and abs(value - emitted) < meterDeadband):
+            # (drifted back, any held level is no longer needed)
+            pendingMeters.pop(self.fullId, None)
+            return
+
+        if now - self.lastEmit < minEmitGap:
+            # hold the latest level, 'flushMeters' emits it once the gap is up
+            pendingMeters[self.fullId] = (self, value)
+            return
+
+        self.emit(value, now)
+
+    def emit(self, value, now):
+        pendingMeters.pop(self.fullId, None)
+        self.emitted = value
+        self.lastEmit = now
+        self.event.emit(value)
+
+# held levels by full ID, (meter, value)
+pendingMeters = {}
+
+def flushMeters():
+    if len(pendingMeters) == 0:
+        return
+
+    now = system_clock()
+    for meter, value in pendingMeters.values():
+        if now - meter.lastEmit >= minEmitGap:
+            meter.emit(value, now)
+
+timer_flushMeters = Timer(flushMeters, 0.1)
+
 # create an event and action for a given meter
 # (assumes not previously bound)
 def bindMeter(meterPacket, fullId):
@@ -169,9 +241,10 @@ def bindMeter(meterPacket, fullId):
                                         'group': meterPacket.group,
                                         'schema': {'type': 'string'}})
 
-    meterEventsByFullId[fullId] = event
+    meter = Meter(fullId, event, meterPacket.unit)
+    metersByFullId[fullId] = meter
     
-    return event
+    return meter
   
 def processControlPacket(packet):
     # create events
@@ -324,36 +397,25 @@ def buildWritePacket(mac, moduleName, moduleNum, channelNum, aux, param, value=0
     
     return ''.join(parts)
   
+# Packet layouts (big-endian), unpacked in one go rather than field by field:
+#
+#   header:  START_FLAG, length, CRC, conn. type, source MAC, dest MAC, payload type, result code
+#   count:   number of payloads (multiple control payloads only)
+#   payload: module name, action type, module num., channel, aux, param, value (signed)
+HEADER_LAYOUT = struct.Struct('>cHBB6s6sBB')
+COUNT_LAYOUT = struct.Struct('>H')
+PAYLOAD_LAYOUT = struct.Struct('>8sBHBBBi')
+
 class NeutrinoPacket:
     def __init__(self, data):
         self.parse(data)
 
     def parse(self, data):
-        i = 0
-        
-        checkFlag(data, i, START_FLAG, 'START_FLAG')
-        i += 1
-        
-        self.length = read16(data, i)
-        i += 2
-
-        self.crc = read8(data, i)
-        i += 1
+        checkFlag(data, 0, START_FLAG, 'START_FLAG')
 
-        self.connType = read8(data, i)
-        i += 1
-
-        self.srcMac = readMac(data, i)
-        i += 6
-
-        self.dstMac = readMac(data, i)
-        i += 6
-
-        self.payloadType = read8(data, i)
-        i += 1
-        
-        self.resultCode = read8(data, i)
-        i += 1
+        (startFlag, self.length, self.crc, self.connType, self.srcMac, self.dstMac,
+         self.payloadType, self.resultCode) = HEADER_LAYOUT.unpack_from(data, 0)
+        i = HEADER_LAYOUT.size
         
         if self.length <= 18:
             # this is just an acknowledgement packet
@@ -363,29 +425,27 @@ class NeutrinoPacket:
         else:
             if self.payloadType == PAYLOAD_TYPE_MULTIPLE_CONTROL:
                 # read the length byte
-                self.count = read16(data, i)
-                i += 2
+                self.count = COUNT_LAYOUT.unpack_from(data, i)[0]
+                i += COUNT_LAYOUT.size
             else:
                 # skip the length byte
                 self.count = 1
 
-            self.packets = list()
-
-            for controlIndex in range(self.count):
-                if self.connType == CONN_TYPE_UDP_METER:
-                    meterPacket = MeterPacket(data, i)
-                    i += 18
-
-                    self.packets.append(meterPacket)
+            if self.connType == CONN_TYPE_UDP_METER:
+                payloadClass = MeterPacket
+            elif self.connType == CONN_TYPE_TCP:
+                payloadClass = ControlReadPacket
+            else:
+                payloadClass = None
 
-                elif self.connType == CONN_TYPE_TCP:
-                    controlPacket = ControlReadPacket(data, i)
-                    i += 18
+            self.packets = list()
 
-                    self.packets.append(controlPacket)
+            if payloadClass is not None:
+                for controlIndex in xrange(self.count):
+                    self.packets.append(payloadClass(data, i))
+                    i += PAYLOAD_LAYOUT.size
                 
         checkFlag(data, i, STOP_FLAG, 'STOP_FLAG')
-        i += 1
 
     # Returns True if the source is correct
     def isFrom(self, srcMac):
@@ -403,26 +463,8 @@ class MeterPacket:
         self.parse(data, index)
 
     def parse(self, data, i):
-        self.module = read8chars(data, i)
-        i += 8
-
-        self.actType = read8(data, i)
-        i += 1
-
-        self.modNum = read16(data, i)
-        i += 2
-
-        self.chanNum = read8(data, i)
-        i += 1
-
-        self.auxNum = read8(data, i)
-        i += 1
-
-        self.paramNum = read8(data, i)
-        i += 1
-
-        value = read32signed(data, i)
-        i += 4
+        (self.module, self.actType, self.modNum, self.chanNum, self.auxNum,
+         self.paramNum, value) = PAYLOAD_LAYOUT.unpack_from(data, i)
         
         # print 'meter: value:%s' % value
         
@@ -445,33 +487,8 @@ class ControlReadPacket:
         self.parse(data, index)
 
     def parse(self, data, i):
-        self.module = read8chars(data, i)
-        i += 8
-        print 'mod:%s' % self.module
-        
-        self.actType = read8(data, i)
-        i += 1
-        print 'act:%s' % self.actType
-
-        self.modNum = read16(data, i)
-        i += 2
-        print 'modNum:%s' % self.modNum
-
-        self.chanNum = read8(data, i)
-        i += 1
-        print 'chanNum:%s' % self.chanNum
-
-        self.auxNum = read8(data, i)
-        i += 1
-        print 'auxNum:%s' % self.auxNum
-
-        self.paramNum = read8(data, i)
-        i += 1
-        print 'paramNum:%s' % self.paramNum
-
-        value = read32signed(data, i)
-        i += 4
-        print 'value:%s' % value
+        (self.module, self.actType, self.modNum, self.chanNum, self.auxNum,
+         self.paramNum, value) = PAYLOAD_LAYOUT.unpack_from(data, i)
         
         paramGroupData = GROUP_LOOKUP(self.paramNum)
         
@@ -516,29 +533,6 @@ def hexDump(data):
 def checkFlag(data, i, flag, name):
     if data[i] != flag: raise Exception(name + ' missing')
 
-def read8(data, i):    
-    return ord(data[i])
-
-def read16(data, i):
-    return (ord(data[i]) << 8) + ord(data[i+1])
-
-def read32(data, i):
-    return (ord(data[i]) << 24) + (ord(data[i+1]) << 16) + (ord(data[i+2]) << 8) + ord(data[i+3])
-
-# signed 32-bits
-def read32signed(data, i):
-    x = read32(data, i)
-    if x & 0x80000000:
-        return -0x100000000 + x
-    else:
-        return x
-
-def readMac(data, i):
-    return '%s%s%s%s%s%s' % (data[i], data[i+1], data[i+2], data[i+3], data[i+4], data[i+5])
-  
-def read8chars(data, i):
-    return '%s%s%s%s%s%s%s%s' % (data[i], data[i+1], data[i+2], data[i+3], data[i+4], data[i+5], data[i+6], data[i+7])  
-
 seqCounter = [-1]
 
 def nextSeq():
@@ -172,16 +172,20 @@ def handleNotifyMtr(options):
   option3 = options[2]
   
   if option3 == INPUT_METER_ADDR:
-    metersSignals = inputMeterSignals
+    meterHistories = inputMeterHistories
     
   elif option3 == OUTPUT_METER_ADDR:
-    metersSignals = outputMeterSignals
+    meterHistories = outputMeterHistories
     
-  offset = 0
-  for levelCode in options[4:]:
+  else:
+    return
+    
+  now = date_now().getMillis()
+    
+  # (signals are emitted by 'emitMeterPeaks')
+  for history, levelCode in zip(meterHistories, options[4:]):
     # see page 58
-    metersSignals[offset].emitIfDifferent(-126 + int(levelCode, 16))
-    offset += 1
+    history.add(now, METER_FLOOR + int(levelCode, 16))
 
 def parseResp(resp, option=-1, converter=None, signal=None):
   # Example responses:
@@ -305,6 +309,162 @@ def local_action_meterStart(arg=None):
 
 # --- protocol>
 
+# <meter history ---
+
+# Meter levels arrive every 333 ms per channel; they are kept in fixed-size rings at a few resolutions
+# so clipping or drop-outs can be looked at after the fact, e.g. 'Get Meter History' with
+#
+#   {"meter": "Output 3", "resolution": 10, "count": 6}
+#
+# returns (levels in dB, oldest first, null where there were no levels, 'end' is epoch millis):
+#
+#   {"meter": "Output 3", "resolution": 10, "end": 1760000000000,
+#    "min": [-126, -40.2, ...], "max": [-12.5, -3.1, ...], "rms": [-30.1, -18.7, ...]}
+#
+# The meter signals themselves are emitted on a timer (the peak since the last emit) rather than per level.
+
+import math
+from array import array
+
+# (resolution in secs, number of buckets kept) i.e. 10 mins, 1 hour and 24 hours
+METER_RESOLUTIONS = [ (1, 600), (10, 360), (60, 1440) ]
+
+METER_EMIT_INTERVAL = 1.0 # (secs)
+
+METER_FLOOR = -126 # (dB, the lowest level the device reports)
+
+class MeterRing:
+  '''Min, max and RMS of levels per bucket over a fixed number of buckets'''
+  
+  def __init__(self, secs, size):
+    self.millis = secs * 1000
+    self.size = size
+    
+    self.buckets = array('l', [-1] * size) # the bucket number held by each slot
+    self.mins = array('f', [0] * size)
+    self.maxs = array('f', [0] * size)
+    self.powers = array('d', [0] * size)  # sum of linear power
+    self.counts = array('i', [0] * size)
+    
+  def add(self, now, level, power):
+    bucket = now / self.millis
+    slot = bucket % self.size
+    
+    if self.buckets[slot] != bucket:
+      # slot is being reused (or was never used)
+      self.buckets[slot] = bucket
+      self.mins[slot] = level
+      self.maxs[slot] = level
+      self.powers[slot] = power
+      self.counts[slot] = 1
+      return
+    
+    if level < self.mins[slot]:
+      self.mins[slot] = level
+    if level > self.maxs[slot]:
+      self.maxs[slot] = level
+    self.powers[slot] += power
+    self.counts[slot] += 1
+    
+  def series(self, now, count):
+    '''Returns the (min, max, rms) lists of the last 'count' buckets, oldest first'''
+    mins, maxs, rmss = list(), list(), list()
+    
+    last = now / self.millis
+    for bucket in range(last - min(count, self.size) + 1, last + 1):
+      slot = bucket % self.size
+      n = self.counts[slot]
+      
+      if bucket < 0 or self.buckets[slot] != bucket or n == 0:
+        mins.append(None)
+        maxs.append(None)
+        rmss.append(None)
+        continue
+        
+      mins.append(round(self.mins[slot], 1))
+      maxs.append(round(self.maxs[slot], 1))
+      rmss.append(round(toDB(self.powers[slot] / n), 1))
+      
+    return mins, maxs, rmss
+  
+class MeterHistory:
+  '''The level history of one meter and the peak since its signal was last emitted'''
+  
+  def __init__(self, signal):
+    self.signal = signal
+    self.rings = dict([ (secs, MeterRing(secs, size)) for secs, size in METER_RESOLUTIONS ])
+    self.peak = None
+    
+  def add(self, now, level):
+    power = 10 ** (level / 10.0)
+    for ring in self.rings.values():
+      ring.add(now, level, power)
+      
+    if self.peak == None or level > self.peak:
+      self.peak = level
+      
+  def emitPeak(self):
+    if self.peak != None:
+      self.signal.emitIfDifferent(self.peak)
+      self.peak = None
+      
+def toDB(power):
+  return max(METER_FLOOR, 10 * math.log10(power)) if power > 0 else METER_FLOOR
+
+meterHistoriesByName = {} # e.g. { 'Input 1': `a MeterHistory` }
+
+inputMeterHistories = [ MeterHistory(signal) for signal in inputMeterSignals ]
+outputMeterHistories = [ MeterHistory(signal) for signal in outputMeterSignals ]
+
+for i, history in enumerate(inputMeterHistories):
+  meterHistoriesByName['Input %s' % (i+1)] = history
+
+for i, history in enumerate(outputMeterHistories):
+  meterHistoriesByName['Output %s' % (i+1)] = history
+  
+def emitMeterPeaks():
+  for history in inputMeterHistories:
+    history.emitPeak()
+    
+  for history in outputMeterHistories:
+    history.emitPeak()
+
+meter_emit_timer = Timer(emitMeterPeaks, METER_EMIT_INTERVAL)
+
+local_event_MeterHistory = LocalEvent({'title': 'Meter History (last query)', 'group': 'Meter', 'order': 3, 'schema': {'type': 'object'}})
+
+def local_action_GetMeterHistory(arg=None):
+  '''{"title": "Get Meter History", "group": "Meter", "order": 2, "schema": {"type": "object", "properties": {
+                                               "meter":      {"type": "string", "order": 1, "desc": "e.g. Input 1 or Output 3"},
+                                               "resolution": {"type": "integer", "order": 2, "desc": "secs, 1, 10 or 60", "enum": [1, 10, 60]},
+                                               "count":      {"type": "integer", "order": 3, "desc": "number of buckets, e.g. 60"}}}}'''
+  arg = arg or {}
+  
+  name = arg.get('meter')
+  history = meterHistoriesByName.get(name)
+  if history == None:
+    console.warn('Get Meter History: unknown meter [%s]' % name)
+    return
+  
+  resolution = arg.get('resolution') or METER_RESOLUTIONS[0][0]
+  ring = history.rings.get(resolution)
+  if ring == None:
+    console.warn('Get Meter History: resolution must be one of %s' % [secs for secs, size in METER_RESOLUTIONS])
+    return
+  
+  now = date_now().getMillis()
+  mins, maxs, rmss = ring.series(now, arg.get('count') or ring.size)
+  
+  result = {'meter': name, 'resolution': resolution, 'end': (now / ring.millis + 1) * ring.millis,
+            'min': mins, 'max': maxs, 'rms': rmss}
+  
+  local_event_MeterHistory.emit(result)
+  
+  return result
+
+# --- meter history>
+
+
   
 # <tcp ---
   
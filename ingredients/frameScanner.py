@@ -0,0 +1,225 @@
+'''Receive buffer and frame scanner for length-delimited binary protocols.'''
+
+# Use "from frameScanner import *" within script.py (copy this file alongside it).
+#
+# The original lives in "ingredients"; recipes that use it (e.g. Samsung display, Advantech ADAM Mk2)
+# carry an identical copy. Edit the original, then run "python ingredients/syncCopies.py --update".
+# "python ingredients/fuzzFrameScanner.py" fuzzes and benchmarks it.
+#
+# Binary protocols (Modbus TCP, Samsung MDC, etc.) can arrive fragmented or with several packets
+# concatenated so received bytes need to be buffered and complete frames picked out. The buffer here
+# is a fixed-size ring of bytes: each received byte is copied in once, consuming just moves the read
+# position and searches use native bytearray operations over (at most) two segments, so nothing
+# already buffered is copied again and scanning is linear in the bytes received.
+#
+# A frame format is declared once, e.g. for Samsung MDC:
+#
+#   aa   ff   00   09      41 ('A') ...  6e
+#   HDR  CMD  ID   length  data...       checksum (sum of all but HDR)
+#
+#   SAMSUNG_FRAME = FrameFormat(header='\xaa', lengthOffset=3, lengthAdjust=5, checksum=sum8Checksum)
+#
+#   scanner = FrameScanner(SAMSUNG_FRAME, lambda frame: queue.handle(frame))
+#
+#   def received(data):
+#     scanner.feed(data)
+
+DEFAULT_CAPACITY = 4096
+
+class FrameBuffer:
+  '''A bounded ring buffer of bytes with append, peek, consume and find operations'''
+
+  def __init__(self, capacity=DEFAULT_CAPACITY):
+    self.capacity = capacity
+    self._ring = bytearray(capacity)
+    self._head = 0  # where the unread data starts in '_ring'
+    self._count = 0 # unread bytes, which may wrap around the end of '_ring'
+
+  def __len__(self):
+    return self._count
+
+  def append(self, data):
+    '''Appends the data, returning False (having appended nothing) if the capacity would be exceeded'''
+    size = len(data)
+
+    if self._count + size > self.capacity:
+      return False
+
+    tail = (self._head + self._count) % self.capacity
+    first = min(size, self.capacity - tail)
+
+    if first == size:
+      self._ring[tail:tail+size] = data
+    else:
+      # wraps around
+      self._ring[tail:] = data[:first]
+      self._ring[:size-first] = data[first:]
+
+    self._count += size
+
+    return True
+
+  def peek(self, count, offset=0):
+    count = max(0, min(count, self._count - offset))
+    start = (self._head + offset) % self.capacity
+
+    if start + count <= self.capacity:
+      return str(self._ring[start:start+count])
+
+    return str(self._ring[start:]) + str(self._ring[:start+count-self.capacity])
+
+  def byteAt(self, offset):
+    return self._ring[(self._head + offset) % self.capacity]
+
+  def consume(self, count):
+    count = min(count, self._count)
+
+    self._head = (self._head + count) % self.capacity
+    self._count -= count
+
+    if self._count == 0:
+      self._head = 0
+
+  def find(self, sub, offset=0):
+    '''Returns the offset of 'sub' (relative to the unread data) or -1'''
+    size = len(sub)
+    remaining = self._count - offset
+
+    if remaining < size:
+      return -1
+
+    start = (self._head + offset) % self.capacity
+    firstEnd = min(self.capacity, start + remaining)
+
+    i = self._ring.find(sub, start, firstEnd)
+    if i >= 0:
+      return offset + i - start
+
+    if firstEnd == start + remaining:
+      # (doesn't wrap)
+      return -1
+
+    # where the unread data continues at the start of '_ring'
+    wrapOffset = offset + firstEnd - start
+
+    # a match straddling the end of '_ring'
+    if size > 1:
+      spanOffset = max(offset, wrapOffset - size + 1)
+      i = self.peek(min(self._count, wrapOffset + size - 1) - spanOffset, spanOffset).find(sub)
+      if i >= 0:
+        return spanOffset + i
+
+    i = self._ring.find(sub, 0, self._count - wrapOffset)
+    return -1 if i < 0 else wrapOffset + i
+
+  def clear(self):
+    self._head = 0
+    self._count = 0
+
+class FrameFormat:
+  '''Declares how frames are delimited: an optional header, a big-endian length field and an optional checksum'''
+
+  def __init__(self, header='', lengthOffset=0, lengthSize=1, lengthAdjust=0, minLength=None, maxLength=None, checksum=None):
+    self.header = header
+    self.lengthOffset = lengthOffset # where the length field starts
+    self.lengthSize = lengthSize     # in bytes
+    self.lengthAdjust = lengthAdjust # added to the length field to give the full frame length
+    self.minLength = max(minLength or 0, lengthOffset + lengthSize, len(header))
+    self.maxLength = maxLength
+    self.checksum = checksum         # e.g. 'sum8Checksum', takes the full frame, returns True if valid
+
+  def frameLength(self, buf):
+    '''Returns the full frame length using the buffer's length field'''
+    length = 0
+    for i in range(self.lengthOffset, self.lengthOffset + self.lengthSize):
+      length = length * 256 + buf.byteAt(i)
+
+    return length + self.lengthAdjust
+
+class FrameScanner:
+  '''Buffers received data and calls 'onFrame' for each complete, valid frame'''
+
+  def __init__(self, frameFormat, onFrame, capacity=DEFAULT_CAPACITY, onDiscard=None):
+    self.format = frameFormat
+    self.onFrame = onFrame
+    self.onDiscard = onDiscard # (optional) called with (data, reason) when bytes are thrown away
+    self.buffer = FrameBuffer(capacity)
+
+  def feed(self, data):
+    if not self.buffer.append(data):
+      self._discard(len(self.buffer), 'buffer full')
+
+      if not self.buffer.append(data):
+        self._discardData(data, 'buffer full')
+        return
+
+    self.scan()
+
+  def scan(self):
+    fmt = self.format
+    buf = self.buffer
+    header = fmt.header
+
+    while True:
+      if header:
+        # find the start of a frame
+        i = buf.find(header)
+        if i < 0:
+          # (hold onto what could be the start of a split header)
+          self._discard(len(buf) - len(header) + 1, 'no header')
+          return
+
+        if i > 0:
+          self._discard(i, 'no header')
+
+      if len(buf) < fmt.minLength:
+        # not big enough yet, let it grow
+        return
+
+      length = fmt.frameLength(buf)
+
+      if length < fmt.minLength or (fmt.maxLength != None and length > fmt.maxLength):
+        self._resync('bad length')
+        continue
+
+      if len(buf) < length:
+        # wait for the rest
+        return
+
+      frame = buf.peek(length)
+
+      if fmt.checksum != None and not fmt.checksum(frame):
+        self._resync('bad checksum')
+        continue
+
+      buf.consume(length)
+
+      self.onFrame(frame)
+
+  def clear(self):
+    self.buffer.clear()
+
+  def _resync(self, reason):
+    # with a header, skip past it and look for the next one, otherwise there's nothing to sync on
+    self._discard(len(self.format.header) if self.format.header else len(self.buffer), reason)
+
+  def _discard(self, count, reason):
+    if count <= 0:
+      return
+
+    if self.onDiscard:
+      self.onDiscard(self.buffer.peek(count), reason)
+
+    self.buffer.consume(count)
+
+  def _discardData(self, data, reason):
+    if self.onDiscard:
+      self.onDiscard(data, reason)
+
+def sum8Checksum(frame, start=1):
+  '''True if the last byte is the 8-bit sum of the bytes from 'start' (i.e. after a 1-byte header) up to it'''
+  total = 0
+  for c in frame[start:-1]:
+    total += ord(c)
+
+  return (total & 0xff) == ord(frame[-1])
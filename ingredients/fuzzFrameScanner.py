@@ -0,0 +1,243 @@
+'''Fuzzes and benchmarks frameScanner.py outside of Nodel.'''
+
+# Runs under CPython 2.7 (the scanner works on Jython byte strings, as Python 2 'str'), e.g.
+#
+#   python fuzzFrameScanner.py                    fuzz for 20 secs then benchmark
+#   python fuzzFrameScanner.py --fuzz 120 --seed 7
+#   python fuzzFrameScanner.py --fuzz 0 --megabytes 20
+#
+# Fuzzing: random Samsung MDC and Modbus TCP frames, mixed with junk (bad lengths, bad checksums, stray
+# bytes), are fed in random fragments to a scanner (with a small capacity so the ring wraps and fills often)
+# and, in lockstep, to the same scanner using the previous string buffer as the reference. The frames and
+# discards from both must match exactly and, without junk, every frame must come out intact and in order.
+#
+# Benchmark: a stream of Samsung, Modbus and large (2 to 4 KB) frames is fed in fragments of a few sizes (as
+# TCP delivers them) and the MB/s and frames/s are printed for the ring buffer and for the reference.
+
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from frameScanner import FrameBuffer, FrameFormat, FrameScanner, sum8Checksum, DEFAULT_CAPACITY
+
+SAMSUNG_FRAME = FrameFormat(header='\xaa', lengthOffset=3, lengthAdjust=5, checksum=sum8Checksum)
+MODBUS_TCP_FRAME = FrameFormat(lengthOffset=4, lengthSize=2, lengthAdjust=6, minLength=8, maxLength=260)
+
+# (large frames, e.g. bulk transfers, where a long partial frame sits in the buffer while the rest arrives)
+BULK_FRAME = FrameFormat(header='\x02', lengthOffset=1, lengthSize=2, lengthAdjust=3)
+
+class ReferenceBuffer:
+  '''The previous buffer: a string with a read offset, the unread tail is copied on every append'''
+
+  def __init__(self, capacity=DEFAULT_CAPACITY):
+    self.capacity = capacity
+    self._buf = ''
+    self._pos = 0
+
+  def __len__(self):
+    return len(self._buf) - self._pos
+
+  def append(self, data):
+    if len(self) + len(data) > self.capacity:
+      return False
+
+    self._buf = self._buf[self._pos:] + data if self._pos > 0 else self._buf + data
+    self._pos = 0
+    return True
+
+  def peek(self, count, offset=0):
+    start = self._pos + offset
+    return self._buf[start:start+count]
+
+  def byteAt(self, offset):
+    return ord(self._buf[self._pos + offset])
+
+  def consume(self, count):
+    self._pos = min(len(self._buf), self._pos + count)
+
+    if self._pos == len(self._buf):
+      self.clear()
+
+  def find(self, sub, offset=0):
+    i = self._buf.find(sub, self._pos + offset)
+    return -1 if i < 0 else i - self._pos
+
+  def clear(self):
+    self._buf = ''
+    self._pos = 0
+
+def randomBytes(rng, count):
+  return ''.join([chr(rng.randint(0, 255)) for i in range(count)])
+
+def samsungFrame(rng):
+  body = chr(rng.randint(0, 255)) + chr(rng.randint(0, 255))
+  data = randomBytes(rng, rng.randint(0, 40))
+  body += chr(len(data)) + data
+  return '\xaa' + body + chr(sum([ord(c) for c in body]) & 0xff)
+
+def modbusFrame(rng):
+  pdu = chr(rng.randint(1, 6)) + randomBytes(rng, rng.randint(1, 60))
+  return struct.pack('>HHHB', rng.randint(0, 0xffff), 0, len(pdu) + 1, 1) + pdu
+
+def bulkFrame(rng):
+  data = randomBytes(rng, rng.randint(2000, 4000))
+  return '\x02' + struct.pack('>H', len(data)) + data
+
+def samsungJunk(rng):
+  kind = rng.randint(0, 2)
+  frame = samsungFrame(rng)
+
+  if kind == 0:
+    # bad checksum
+    return frame[:-1] + chr((ord(frame[-1]) + 1) & 0xff)
+  elif kind == 1:
+    # truncated, so what follows is read as its tail
+    return frame[:rng.randint(1, len(frame) - 1)]
+  else:
+    return randomBytes(rng, rng.randint(1, 10))
+
+def fragments(rng, data, largest):
+  i = 0
+  while i < len(data):
+    n = rng.randint(1, largest)
+    yield data[i:i+n]
+    i += n
+
+def makeScanner(frameFormat, capacity, bufferClass):
+  result = {'frames': [], 'discards': []}
+  scanner = FrameScanner(frameFormat, result['frames'].append, capacity=capacity,
+                         onDiscard=lambda data, reason: result['discards'].append((data, reason)))
+  scanner.buffer = bufferClass(capacity)
+  return scanner, result
+
+def fuzzRound(rng, frameFormat, makeFrame, makeJunk):
+  capacity = rng.choice([32, 64, 100, 300, DEFAULT_CAPACITY])
+  largest = rng.choice([1, 3, 16, 64, capacity])
+
+  sent = []
+  stream = ''
+  for i in range(rng.randint(1, 60)):
+    if makeJunk != None and rng.random() < 0.2:
+      stream += makeJunk(rng)
+    else:
+      frame = makeFrame(rng)
+      sent.append(frame)
+      stream += frame
+
+  ring, ringResult = makeScanner(frameFormat, capacity, FrameBuffer)
+  ref, refResult = makeScanner(frameFormat, capacity, ReferenceBuffer)
+
+  for data in fragments(rng, stream, largest):
+    ring.feed(data)
+    ref.feed(data)
+
+    if len(ring.buffer) != len(ref.buffer) or ring.buffer.peek(len(ring.buffer)) != ref.buffer.peek(len(ref.buffer)):
+      return 'buffers differ after feeding %r' % data
+
+  if ringResult != refResult:
+    return 'frames or discards differ from the reference'
+
+  # (a fragment that doesn't fit beside a partial frame flushes the buffer, by design)
+  if makeJunk == None and largest + max([len(frame) for frame in sent]) <= capacity and ringResult['frames'] != sent:
+    return 'frames lost or mangled (%s sent, %s received)' % (len(sent), len(ringResult['frames']))
+
+  return None
+
+def fuzzFind(rng):
+  '''Compares FrameBuffer.find directly, with the unread data placed anywhere in the ring'''
+  capacity = rng.randint(1, 40)
+  buf = FrameBuffer(capacity)
+  ref = ReferenceBuffer(capacity)
+
+  for step in range(50):
+    if rng.random() < 0.5:
+      data = ''.join([rng.choice('ab') for i in range(rng.randint(0, capacity))])
+      if buf.append(data) != ref.append(data):
+        return 'append results differ'
+    else:
+      count = rng.randint(0, capacity)
+      buf.consume(count)
+      ref.consume(count)
+
+    sub = ''.join([rng.choice('ab') for i in range(rng.randint(1, 4))])
+    offset = rng.randint(0, len(ref))
+    if buf.find(sub, offset) != ref.find(sub, offset):
+      return 'find(%r, %s) gave %s, expected %s' % (sub, offset, buf.find(sub, offset), ref.find(sub, offset))
+
+  return None
+
+def fuzz(secs, seed):
+  rng = random.Random(seed)
+  cases = [('samsung', SAMSUNG_FRAME, samsungFrame, None),
+           ('samsung with junk', SAMSUNG_FRAME, samsungFrame, samsungJunk),
+           ('modbus', MODBUS_TCP_FRAME, modbusFrame, None)]
+
+  rounds = 0
+  end = time.time() + secs
+  while time.time() < end:
+    roundSeed = rng.getrandbits(32)
+
+    for name, frameFormat, makeFrame, makeJunk in cases:
+      problem = fuzzRound(random.Random(roundSeed), frameFormat, makeFrame, makeJunk)
+      if problem != None:
+        print('FAILED (%s, round seed %s): %s' % (name, roundSeed, problem))
+        return False
+
+    problem = fuzzFind(random.Random(roundSeed))
+    if problem != None:
+      print('FAILED (find, round seed %s): %s' % (roundSeed, problem))
+      return False
+
+    rounds += 1
+
+  print('fuzz: %s rounds OK (seed %s)' % (rounds, seed))
+  return True
+
+def benchmark(megabytes, seed):
+  rng = random.Random(seed)
+
+  for name, frameFormat, makeFrame in [('samsung', SAMSUNG_FRAME, samsungFrame), ('modbus', MODBUS_TCP_FRAME, modbusFrame), ('bulk', BULK_FRAME, bulkFrame)]:
+    # (a pool of frames, repeated, keeps generating the stream cheap)
+    pool = ''.join([makeFrame(rng) for i in range(50)])
+    stream = pool * (megabytes * 1024 * 1024 // len(pool) + 1)
+    frameCount = len(stream) // len(pool) * 50
+
+    for size in [16, 256, 1460]:
+      chunks = [stream[i:i+size] for i in range(0, len(stream), size)]
+
+      line = '%-8s %5s byte fragments:' % (name, size)
+      for bufferClass in [FrameBuffer, ReferenceBuffer]:
+        scanner, result = makeScanner(frameFormat, DEFAULT_CAPACITY, bufferClass)
+        scanner.onFrame = lambda frame: None
+
+        start = time.time()
+        for chunk in chunks:
+          scanner.feed(chunk)
+        secs = time.time() - start
+
+        line += '  %s %.1f MB/s (%.0fk frames/s)' % ('ring' if bufferClass == FrameBuffer else 'reference', len(stream) / secs / 1024 / 1024, frameCount / secs / 1000)
+
+      print(line)
+
+def main():
+  parser = argparse.ArgumentParser(description='Fuzz and benchmark frameScanner.py')
+  parser.add_argument('--fuzz', type=float, default=20, help='secs of fuzzing (0 to skip)')
+  parser.add_argument('--megabytes', type=int, default=4, help='per benchmark run (0 to skip)')
+  parser.add_argument('--seed', type=int, default=None)
+  args = parser.parse_args()
+
+  seed = args.seed if args.seed != None else random.randint(0, 10**6)
+
+  if args.fuzz > 0 and not fuzz(args.fuzz, seed):
+    sys.exit(1)
+
+  if args.megabytes > 0:
+    benchmark(args.megabytes, seed)
+
+if __name__ == '__main__':
+  main()
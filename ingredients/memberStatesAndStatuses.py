@@ -2,6 +2,9 @@
 
 from nodetoolkit import *
 
+# (requires the shared aggregation engine, "memberAggregation.py", copied alongside this file)
+from memberAggregation import *
+
 # Use "from memberStatesAndStatuses import *" to expose Parameters OR
 # Use extend script.py directly:
 #
@@ -64,7 +67,7 @@ def initMember(memberInfo):
 membersBySignal = {}
     
 def initSignalSupport(name, mode, signalName, states):
-  members = getMembersInfoOrRegister(signalName, name)
+  getMembersInfoOrRegister(signalName, name)
   
   # establish local signals if haven't done so already
   localDesiredSignal = lookup_local_event('Desired %s' % signalName)
@@ -85,18 +88,10 @@ def initSignalSupport(name, mode, signalName, states):
   
   localMemberSignal = Event('Member %s %s' % (name, signalName), {'title': '"%s" %s' % (name, signalName), 'group': '(advanced)', 'order': 9999+next_seq(), 'schema': {'type': 'string', 'enum': resultantStates}})
   
-  def aggregateMemberSignals():
-    shouldBeState = localDesiredSignal.getArg()
-    partially = False
-    
-    for memberName in members:
-      if lookup_local_event('Member %s %s' % (memberName, signalName)).getArg() != shouldBeState:
-        partially = True
-        
-    localResultantSignal.emit('Partially %s' % shouldBeState if partially else shouldBeState)
+  aggregate = getSignalAggregate(signalName, localDesiredSignal, localResultantSignal)
+  aggregate.addMember(name, localMemberSignal.getArg())
     
-  localMemberSignal.addEmitHandler(lambda arg: aggregateMemberSignals())
-  localDesiredSignal.addEmitHandler(lambda arg: aggregateMemberSignals())
+  localMemberSignal.addEmitHandler(lambda arg: aggregate.memberChanged(name, arg))
   
   def handleRemoteEvent(arg):
     if arg == True or arg == 1:
@@ -160,11 +155,9 @@ STATUS_SCHEMA = { 'type': 'object', 'properties': {
                     'message': {'type': 'string', 'order': 2 }
                 } }
 
-EMPTY_SET = {}
-  
 def initStatusSupport(name):
-  # look up the members structure (assume
-  members = getMembersInfoOrRegister('Status', name)
+  # register the member
+  getMembersInfoOrRegister('Status', name)
   
   # check if this node has a status yet
   selfStatusSignal = lookup_local_event('Status')
@@ -179,53 +172,11 @@ def initStatusSupport(name):
   
   Action('Member %s Status Suppressed' % name, lambda arg: memberStatusSuppressedSignal.emit(arg), {'title': 'Suppress "%s" Status' % name, 'group': '(advanced)', 'order': 9999+next_seq(), 'schema': {'type': 'boolean'}})
   
-  def aggregateMemberStatus():
-    aggregateLevel = 0
-    aggregateMessage = 'OK'
-    
-    # for composing the aggegate message at the end
-    msgs = []
-    
-    activeSuppression = False
-    
-    for memberName in members:
-      suppressed = lookup_local_event('Member %s Status Suppressed' % memberName).getArg()
-      
-      memberStatus = lookup_local_event('Member %s Status' % memberName).getArg() or EMPTY_SET
-      
-      memberLevel = memberStatus.get('level')
-      if memberLevel == None: # as opposed to the value '0'
-        if suppressed:
-          activeSuppression = True
-          continue
-          
-        memberLevel = 99
-
-      if memberLevel > aggregateLevel:
-        # raise the level (if not suppressed)
-        if suppressed:
-          activeSuppression = True
-          continue
-        
-        aggregateLevel = memberLevel
-      
-      memberMessage = memberStatus.get('message') or 'Has never been seen'
-      if memberLevel > 0:
-        if isBlank(memberMessage):
-          msgs.append(memberName)
-        else:
-          msgs.append('%s: [%s]' % (memberName, memberMessage))
-          
-    if len(msgs) > 0:
-      aggregateMessage = ', '.join(msgs)
-      
-    if activeSuppression:
-      aggregateMessage = '%s (*)' % aggregateMessage
-      
-    selfStatusSignal.emitIfDifferent({'level': aggregateLevel, 'message': aggregateMessage})
+  aggregate = getStatusAggregate(selfStatusSignal)
+  aggregate.addMember(name, memberStatusSignal.getArg(), memberStatusSuppressedSignal.getArg())
       
-  memberStatusSignal.addEmitHandler(lambda arg: aggregateMemberStatus())
-  memberStatusSuppressedSignal.addEmitHandler(lambda arg: aggregateMemberStatus())
+  memberStatusSignal.addEmitHandler(lambda arg: aggregate.statusChanged(name, arg))
+  memberStatusSuppressedSignal.addEmitHandler(lambda arg: aggregate.suppressedChanged(name, arg))
   
   def handleRemoteEvent(arg):
     memberStatusSignal.emit(arg)
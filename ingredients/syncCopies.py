@@ -0,0 +1,61 @@
+'''Checks (or updates) the copies of shared ingredients that recipes carry alongside their script.py.'''
+
+# Runs under CPython (2.7 or 3) from anywhere in the repository, e.g.
+#
+#   python ingredients/syncCopies.py            lists any copy that differs from its original (exit code 1)
+#   python ingredients/syncCopies.py --update   overwrites the copies with the originals
+#
+# Nodel only loads modules from a recipe's own folder, so a recipe using a shared ingredient has to carry a
+# copy of it. The originals are the files in this folder; edit those, never the copies.
+
+import argparse
+import os
+import sys
+
+# original (in this folder) -> the recipe folders carrying a copy of it
+COPIES = {
+  'frameScanner.py': ['Samsung display', 'Advantech ADAM 6050 6060 relay module/Mk2'],
+  'memberAggregation.py': ['Group']
+}
+
+def main():
+  parser = argparse.ArgumentParser(description='Check or update the copies of shared ingredients')
+  parser.add_argument('--update', action='store_true', help='overwrite the copies with the originals')
+  args = parser.parse_args()
+
+  here = os.path.dirname(os.path.abspath(__file__))
+  root = os.path.dirname(here)
+
+  differing = 0
+
+  for name in sorted(COPIES):
+    with open(os.path.join(here, name), 'rb') as f:
+      original = f.read()
+
+    for folder in COPIES[name]:
+      path = os.path.join(root, folder, name)
+
+      if os.path.exists(path):
+        with open(path, 'rb') as f:
+          copy = f.read()
+      else:
+        copy = None
+
+      if copy == original:
+        continue
+
+      if args.update:
+        with open(path, 'wb') as f:
+          f.write(original)
+        print('updated %s' % os.path.join(folder, name))
+
+      else:
+        differing += 1
+        print('%s %s' % ('missing' if copy == None else 'differs', os.path.join(folder, name)))
+
+  if differing > 0:
+    print('%s copy(s) out of step, run with --update' % differing)
+    sys.exit(1)
+
+if __name__ == '__main__':
+  main()